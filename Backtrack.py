@@ -1,16 +1,160 @@
-
-
+import math
+import time
 import numpy as np
 from copy import deepcopy
 
+import Dancing_links
+import Strategies
+
+# Precomputed index tables. Cells are indexed row by row (index = y * size + x),
+# units hold size rows, then size columns, then size boxes.
+# Tables of every box size are built once, the 9x9 ones are also exported as module constants.
+
+
+class Tables:
+    def __init__(self, box_size):
+        size = box_size * box_size
+        cells_count = size * size
+
+        self.box_size = box_size
+        self.size = size
+        self.cells_count = cells_count
+        self.all_digits = (1 << size) - 1
+
+        self.row_of = tuple(index // size for index in range(cells_count))
+        self.col_of = tuple(index % size for index in range(cells_count))
+        self.box_of = tuple(
+            (self.row_of[index] // box_size) * box_size + self.col_of[index] // box_size
+            for index in range(cells_count)
+        )
+
+        self.units = (
+            tuple(tuple(y * size + x for x in range(size)) for y in range(size)) +
+            tuple(tuple(y * size + x for y in range(size)) for x in range(size)) +
+            tuple(
+                tuple(index for index in range(cells_count) if self.box_of[index] == box)
+                for box in range(size)
+            )
+        )
+        self.units_of_cell = tuple(
+            (self.row_of[index], size + self.col_of[index], 2 * size + self.box_of[index])
+            for index in range(cells_count)
+        )
+        self.peers = tuple(
+            tuple(sorted(set().union(*(self.units[unit] for unit in self.units_of_cell[index])) - {index}))
+            for index in range(cells_count)
+        )
+        # (segment, rest of the box, rest of the line) for every intersection of a box with a row or a column
+        self.intersections = tuple(
+            (
+                tuple(index for index in self.units[2 * size + box] if index in self.units[line]),
+                tuple(index for index in self.units[2 * size + box] if index not in self.units[line]),
+                tuple(index for index in self.units[line] if index not in self.units[2 * size + box]),
+            )
+            for box in range(size) for line in range(2 * size)
+            if set(self.units[2 * size + box]) & set(self.units[line])
+        )
+
+
+TABLES = dict()
+
+
+def get_tables(box_size):
+    if box_size not in TABLES:
+        TABLES[box_size] = Tables(box_size)
+    return TABLES[box_size]
+
+
+TABLES_9 = get_tables(3)
+ROW_OF = TABLES_9.row_of
+COL_OF = TABLES_9.col_of
+BOX_OF = TABLES_9.box_of
+UNITS = TABLES_9.units
+UNITS_OF_CELL = TABLES_9.units_of_cell
+PEERS = TABLES_9.peers
+INTERSECTIONS = TABLES_9.intersections
+
+
+def get_box_size(digits_grid):
+    """
+    :param digits_grid: 2D numpy array of shape (n, n) where n is a square number
+    :return: box size (3 for a usual 9x9 sudoku)
+    """
+    shape = np.shape(digits_grid)
+    if len(shape) == 2 and shape[0] == shape[1]:
+        box_size = math.isqrt(shape[0])
+        if box_size > 0 and box_size * box_size == shape[0]:
+            return box_size
+    raise ValueError('sudoku grid must have shape (n, n) where n is a square number, got {}'.format(shape))
+
 
 def solve_sudoku(digits_grid):
     """
-    Solves a sudoku puzzle.
+    Solves a sudoku puzzle. The box size is inferred from the shape (9x9, 16x16, 25x25, ...).
     
-    :param digits_grid: 2D numpy array of shape (9,9). 0 means empty.
+    :param digits_grid: 2D numpy array of shape (n,n). 0 means empty.
+    :return: Solved grid or None if unsolvable.
+        An ambiguous puzzle gets one of its solutions, use solve_unique to reject it.
+    """
+    return solve_with_bitmasks(digits_grid)
+
+
+def count_solutions(digits_grid, limit=2):
+    """
+    Counts solutions of a sudoku puzzle (exact cover with Dancing Links).
+
+    :param digits_grid: 2D numpy array of shape (n,n). 0 means empty.
+    :param limit: the search stops as soon as this number of solutions has been found, at least 1
+    :return: number of solutions, at most limit
+    """
+    count, _ = Dancing_links.count_sudoku_solutions(digits_grid, limit)
+    return count
+
+
+def solve_unique(digits_grid):
+    """
+    Solves a sudoku puzzle and checks that its solution is unique.
+
+    :param digits_grid: 2D numpy array of shape (n,n). 0 means empty.
     :return: Solved grid or None if unsolvable / ambiguous.
     """
+    count, solution = Dancing_links.count_sudoku_solutions(digits_grid, limit=2)
+    return solution if count == 1 else None
+
+
+def solve_unique_with_bitmasks(digits_grid):
+    """
+    Like solve_unique, with the bitmask engine and without counting solutions.
+    The search is run twice, trying the digits of every cell in ascending and in descending order.
+    Both runs branch on the same cells until they find the first solution, so they find the same one
+    only if there is no other: where two solutions differ first, the runs take different digits.
+
+    :param digits_grid: 2D numpy array of shape (n,n). 0 means empty.
+    :return: Solved grid (a new array) or None if unsolvable / ambiguous.
+    """
+    digits_grid = np.asarray(digits_grid)
+    state = SolverState.from_grid(digits_grid)
+    # the techniques only remove candidates that are in no solution, so they keep every solution
+    if state.broken or not Strategies.run_strategies(state):
+        return None
+
+    first = search_with_bitmasks(state.copy())
+    if first is None:
+        return None
+    if not state.is_filled():
+        last = search_with_bitmasks(state, descending=True)
+        if first.cells != last.cells:
+            return None
+    return np.array(first.cells, dtype=digits_grid.dtype).reshape(digits_grid.shape)
+
+
+def solve_with_human_techniques(digits_grid):
+    """
+    Solves a sudoku puzzle using only naked and hidden singles (no guessing).
+
+    :param digits_grid: 2D numpy array of shape (9,9). 0 means empty.
+    :return: Solved grid or None if the techniques are not enough.
+    """
     if not is_solvable(digits_grid):
         return None
 
@@ -26,29 +170,402 @@ def solve_sudoku(digits_grid):
     return digits_grid if is_solved_correctly(digits_grid) else None
 
 
+# Bitmask engine.
+# Candidates of a cell are an n-bit integer (bit d-1 is set when digit d still fits), placed cells have 0.
+# Placing a digit only touches the peers of the cell (20 in a 9x9 grid). Units whose candidates have changed
+# are remembered as dirty and only they are scanned for hidden singles.
+# The techniques of Strategies.STRATEGIES run first, depth-first search is the fallback.
+
+ALL_DIGITS = TABLES_9.all_digits
+
+
+def solve_with_bitmasks(digits_grid, strategies=None, stats=None):
+    """
+    Solves a sudoku puzzle of any box size using bitmask candidates, the strategy pipeline
+    and depth-first search with minimum-remaining-values ordering.
+
+    :param digits_grid: 2D numpy array of shape (n,n), n = 4, 9, 16, 25, ... 0 means empty.
+    :param strategies: list of Strategies.Strategy, Strategies.STRATEGIES by default
+    :param stats: Strategies.StrategyStats that gets the counters of every technique and 'search' for puzzles
+        that needed the search fallback, None counts nothing
+    :return: Solved grid (a new array) or None if the puzzle has no solution.
+    """
+    digits_grid = np.asarray(digits_grid)
+    state = SolverState.from_grid(digits_grid)
+
+    if state.broken or not Strategies.run_strategies(state, strategies, stats):
+        return None
+
+    if not state.is_filled():
+        start = time.perf_counter_ns()
+        solution = search_with_bitmasks(state)
+        if stats is not None:
+            placements = solution.count_filled() - state.count_filled() if solution is not None else 0
+            stats.add('search', 0, placements, time.perf_counter_ns() - start)
+        if solution is None:
+            return None
+        state = solution
+
+    return np.array(state.cells, dtype=digits_grid.dtype).reshape(digits_grid.shape)
+
+
+class SolverState:
+    """
+    Partially solved grid for the techniques of Strategies.
+    Naked singles are placed as soon as they appear; broken becomes True on a contradiction.
+    eliminations counts the candidates removed by eliminate (by the techniques), not the ones
+    removed from the peers of placed digits.
+    """
+
+    def __init__(self, tables, cells, candidates, dirty_units):
+        self.tables = tables
+        self.size = tables.size
+        self.all_digits = tables.all_digits
+        self.units = tables.units
+        self.units_of_cell = tables.units_of_cell
+        self.peers = tables.peers
+        self.intersections = tables.intersections
+
+        self.cells = cells
+        self.candidates = candidates
+        self.dirty_units = dirty_units
+        self.broken = False
+        self.eliminations = 0
+
+    @classmethod
+    def from_grid(cls, digits_grid):
+        tables = get_tables(get_box_size(digits_grid))
+        state = cls(
+            tables, [0] * tables.cells_count, [tables.all_digits] * tables.cells_count, set(range(3 * tables.size))
+        )
+        for index, digit in enumerate(np.asarray(digits_grid).ravel().tolist()):
+            if digit != 0 and (not 1 <= digit <= tables.size or not state.place(index, 1 << (digit - 1))):
+                state.broken = True
+                break
+        return state
+
+    def copy(self):
+        state = SolverState(self.tables, self.cells.copy(), self.candidates.copy(), set(self.dirty_units))
+        state.eliminations = self.eliminations
+        return state
+
+    def place(self, index, bit):
+        """
+        Places a digit and removes it from candidates of the peers.
+        Peers that are left with a single candidate (naked singles) are placed too.
+
+        :param index: index of the cell
+        :param bit: mask of the digit (1 << (digit - 1))
+        :return: False if a contradiction has been found
+        """
+        cells, candidates, peers, units_of_cell = self.cells, self.candidates, self.peers, self.units_of_cell
+        dirty_units = self.dirty_units
+
+        stack = [(index, bit)]
+        while stack and not self.broken:
+            index, bit = stack.pop()
+            if cells[index]:
+                if cells[index] != bit.bit_length():
+                    self.broken = True
+                continue
+            if not candidates[index] & bit:
+                self.broken = True
+                continue
+            cells[index] = bit.bit_length()
+            candidates[index] = 0
+            dirty_units.update(units_of_cell[index])
+
+            for peer in peers[index]:
+                peer_candidates = candidates[peer]
+                if peer_candidates & bit:
+                    peer_candidates ^= bit
+                    candidates[peer] = peer_candidates
+                    if peer_candidates == 0:
+                        self.broken = True
+                        break
+                    dirty_units.update(units_of_cell[peer])
+                    if peer_candidates & (peer_candidates - 1) == 0:
+                        stack.append((peer, peer_candidates))
+
+        return not self.broken
+
+    def place_hidden_singles(self):
+        """
+        Places digits that fit into only one cell of a unit, until no unit is dirty.
+
+        :return: False if a contradiction has been found (some digit fits nowhere in a unit)
+        """
+        cells, candidates, units, dirty_units = self.cells, self.candidates, self.units, self.dirty_units
+
+        while dirty_units and not self.broken:
+            unit = units[dirty_units.pop()]
+
+            once, twice, placed = 0, 0, 0
+            for index in unit:
+                cell_candidates = candidates[index]
+                twice |= once & cell_candidates
+                once |= cell_candidates
+                if cells[index]:
+                    placed |= 1 << (cells[index] - 1)
+
+            if once | placed != self.all_digits:
+                self.broken = True
+                break
+
+            singles = once & ~twice
+            while singles and not self.broken:
+                bit = singles & -singles
+                singles ^= bit
+                for index in unit:
+                    if candidates[index] & bit:
+                        self.place(index, bit)
+                        break
+
+        return not self.broken
+
+    def eliminate(self, index, mask):
+        """
+        Removes candidates of a cell, places the digit if only one is left.
+
+        :return: number of removed candidates
+        """
+        removed = self.candidates[index] & mask
+        if not removed or self.broken:
+            return 0
+
+        remaining = self.candidates[index] ^ removed
+        self.candidates[index] = remaining
+        self.eliminations += removed.bit_count()
+        if remaining == 0:
+            self.broken = True
+        else:
+            self.dirty_units.update(self.units_of_cell[index])
+            if remaining & (remaining - 1) == 0:
+                self.place(index, remaining)
+        return removed.bit_count()
+
+    def count_candidates(self):
+        return sum(candidates.bit_count() for candidates in self.candidates)
+
+    def count_filled(self):
+        return sum(1 for digit in self.cells if digit)
+
+    def is_filled(self):
+        return all(self.cells)
+
+
+def search_with_bitmasks(state, descending=False):
+    """
+    Depth-first search that always branches on the empty cell with the fewest candidates.
+    Every branch places naked and hidden singles before going deeper.
+
+    :param state: SolverState without contradictions
+    :param descending: try the digits of a cell from the highest one
+    :return: filled SolverState or None if there is no solution
+    """
+    cells, candidates = state.cells, state.candidates
+
+    best_index, best_count = -1, state.size + 1
+    for index in range(len(cells)):
+        if cells[index] == 0:
+            count = candidates[index].bit_count()
+            if count < best_count:
+                best_index, best_count = index, count
+                if count == 2:
+                    break
+
+    if best_index == -1:
+        return state
+
+    remaining = candidates[best_index]
+    while remaining:
+        bit = 1 << (remaining.bit_length() - 1) if descending else remaining & -remaining
+        remaining ^= bit
+
+        next_state = state.copy()
+        if next_state.place(best_index, bit) and next_state.place_hidden_singles():
+            solution = search_with_bitmasks(next_state, descending)
+            if solution is not None:
+                return solution
+
+    return None
+
+
+# Batch engine.
+# Statuses returned by solve_many for every puzzle of the stack.
+
+SOLVED = 0
+INVALID = 1
+UNSOLVABLE = 2
+
+DIGITS = np.arange(1, 10, dtype=np.uint8)
+
+
+def solve_many(grids):
+    """
+    Solves a whole stack of sudoku puzzles at once.
+
+    Validation and constraint propagation (naked and hidden singles) run on the whole stack
+    with boolean candidate tensors of shape (N, 9, 9, 9). Puzzles that are still unsolved
+    after propagation are finished one by one by solve_with_bitmasks.
+    Throughput target: at least 10 000 easy (singles-only) puzzles per second on one CPU core,
+    with hard puzzles bounded by the per-puzzle search.
+
+    :param grids: numpy array of shape (N, 9, 9). 0 means empty.
+    :return: (solved, status) where solved is a uint8 array of shape (N, 9, 9)
+        and status is a uint8 array of shape (N,) with SOLVED, INVALID or UNSOLVABLE.
+        Puzzles that are not SOLVED keep their input digits.
+    """
+    grids = np.asarray(grids)
+    if grids.ndim != 3 or grids.shape[1:] != (9, 9):
+        raise ValueError('grids must have shape (N, 9, 9), got {}'.format(grids.shape))
+
+    out_of_range = ((grids < 0) | (grids > 9)).any(axis=(1, 2))
+    grids = np.where(out_of_range[:, None, None], 0, grids).astype(np.uint8)
+
+    status = np.full(len(grids), UNSOLVABLE, dtype=np.uint8)
+    status[out_of_range | ~grids_are_consistent(grids)] = INVALID
+
+    solved = grids.copy()
+    candidates_left = np.flatnonzero(status != INVALID)
+    work = propagate_singles(grids[candidates_left])
+
+    filled = (work != 0).all(axis=(1, 2))
+    correct = filled & grids_are_consistent(work)
+    status[candidates_left[correct]] = SOLVED
+    solved[candidates_left[correct]] = work[correct]
+
+    for position in np.flatnonzero(~filled):
+        index = candidates_left[position]
+        solution = solve_with_bitmasks(work[position])
+        if solution is not None:
+            solved[index] = solution
+            status[index] = SOLVED
+
+    return solved, status
+
+
+def grids_are_consistent(grids):
+    """
+    :param grids: uint8 numpy array of shape (N, 9, 9)
+    :return: bool array of shape (N,), True if no digit repeats in any row, column or box
+    """
+    one_hot, rows, cols, boxes = count_digits_in_units(grids)
+    rows_ok = (rows <= 1).all(axis=(1, 2, 3))
+    cols_ok = (cols <= 1).all(axis=(1, 2, 3))
+    boxes_ok = (boxes <= 1).all(axis=(1, 2, 3, 4, 5))
+    return rows_ok & cols_ok & boxes_ok
+
+
+def get_conflicting_cells(grids):
+    """
+    :param grids: uint8 numpy array of shape (N, 9, 9)
+    :return: bool array of shape (N, 9, 9), True in cells whose digit repeats in their row, column or box
+    """
+    one_hot, rows, cols, boxes = count_digits_in_units(grids)
+    repeated = (rows > 1) | (cols > 1)
+    repeated = repeated | np.broadcast_to(boxes > 1, (len(grids), 3, 3, 3, 3, 9)).reshape((-1, 9, 9, 9))
+    return (one_hot.astype(bool) & repeated).any(axis=3)
+
+
+def count_digits_in_units(grids):
+    """
+    :param grids: uint8 numpy array of shape (N, 9, 9)
+    :return: (one_hot, rows, cols, boxes) where one_hot is a uint8 array of shape (N, 9, 9, 9)
+        and rows (N, 9, 1, 9), cols (N, 1, 9, 9) and boxes (N, 3, 1, 3, 1, 9) count every digit in its units
+    """
+    one_hot = (grids[..., None] == DIGITS).view(np.uint8)
+    rows = fold_axis(one_hot, 2)
+    cols = fold_axis(one_hot, 1)
+    boxes = fold_axis(fold_axis(one_hot.reshape((-1, 3, 3, 3, 3, 9)), 2), 4)
+    return one_hot, rows, cols, boxes
+
+
+def fold_axis(tensor, axis, operation=np.add):
+    """
+    Reduces a short axis slice by slice (keeping the axis with length 1).
+    For the 9-long axes of candidate tensors it is several times faster than ufunc.reduce.
+    """
+    slices = np.moveaxis(tensor, axis, 0)
+    result = slices[0].copy()
+    for item in slices[1:]:
+        operation(result, item, out=result)
+    return np.expand_dims(result, axis)
+
+
+def get_candidates_tensor(grids):
+    """
+    :param grids: uint8 numpy array of shape (N, 9, 9)
+    :return: bool array of shape (N, 9, 9, 9), [n, y, x, d] is True if digit d + 1 fits into the empty cell (y, x)
+    """
+    one_hot = grids[..., None] == DIGITS
+    in_rows = fold_axis(one_hot, 2, np.logical_or)
+    in_cols = fold_axis(one_hot, 1, np.logical_or)
+    in_boxes = fold_axis(fold_axis(one_hot.reshape((-1, 3, 3, 3, 3, 9)), 2, np.logical_or), 4, np.logical_or)
+    in_boxes = in_boxes.repeat(3, axis=2).repeat(3, axis=4).reshape(one_hot.shape)
+    return (grids == 0)[..., None] & ~(in_rows | in_cols | in_boxes)
+
+
+def propagate_singles(grids):
+    """
+    Places naked and hidden singles in all puzzles simultaneously until nothing changes.
+    Every placement is forced, so a puzzle with a solution keeps it.
+    Conflicting placements can only happen in puzzles without a solution.
+
+    :param grids: uint8 numpy array of shape (N, 9, 9)
+    :return: new uint8 array of shape (N, 9, 9)
+    """
+    grids = grids.copy()
+    active = np.arange(len(grids))
+
+    while len(active):
+        work = grids[active]
+        candidates = get_candidates_tensor(work)
+        counts = candidates.view(np.uint8)
+
+        naked = candidates & (fold_axis(counts, 3) == 1)
+        hidden_in_rows = candidates & (fold_axis(counts, 2) == 1)
+        hidden_in_cols = candidates & (fold_axis(counts, 1) == 1)
+        box_counts = fold_axis(fold_axis(counts.reshape((-1, 3, 3, 3, 3, 9)), 2), 4)
+        hidden_in_boxes = candidates & (box_counts == 1).repeat(3, axis=2).repeat(3, axis=4).reshape(candidates.shape)
+
+        placements = naked | hidden_in_rows | hidden_in_cols | hidden_in_boxes
+        placed = placements.any(axis=3)
+        stuck = (work == 0) & ~candidates.any(axis=3)
+
+        work = np.where(placed, placements.argmax(axis=3) + 1, work).astype(np.uint8)
+        grids[active] = work
+
+        changed = placed.any(axis=(1, 2)) & ~stuck.any(axis=(1, 2))
+        active = active[changed]
+
+    return grids
+
+
 def is_solvable(digits_grid):
-    for y in range(9):
-        for x in range(9):
-            if digits_grid[y, x]:
-                if not (check_row(x, y, digits_grid) and
-                        check_col(x, y, digits_grid) and
-                        check_square(x, y, digits_grid)):
-                    return False
+    for index in range(81):
+        if digits_grid.item(index):
+            if not (check_row(COL_OF[index], ROW_OF[index], digits_grid) and
+                    check_col(COL_OF[index], ROW_OF[index], digits_grid) and
+                    check_square(COL_OF[index], ROW_OF[index], digits_grid)):
+                return False
     return True
 
 
+def count_in_unit(digits_grid, unit, digit):
+    return sum(1 for index in unit if digits_grid.item(index) == digit)
+
+
 def check_row(x, y, digits_grid):
-    return np.count_nonzero(digits_grid[y, :] == digits_grid[y, x]) == 1
+    return count_in_unit(digits_grid, UNITS[y], digits_grid.item(y, x)) == 1
 
 
 def check_col(x, y, digits_grid):
-    return np.count_nonzero(digits_grid[:, x] == digits_grid[y, x]) == 1
+    return count_in_unit(digits_grid, UNITS[9 + x], digits_grid.item(y, x)) == 1
 
 
 def check_square(x, y, digits_grid):
-    x0, y0 = (x // 3) * 3, (y // 3) * 3
-    square = digits_grid[y0:y0+3, x0:x0+3]
-    return np.count_nonzero(square == digits_grid[y, x]) == 1
+    return count_in_unit(digits_grid, UNITS[18 + BOX_OF[y * 9 + x]], digits_grid.item(y, x)) == 1
 
 
 def get_full_human_notes(digits_grid):
@@ -63,26 +580,19 @@ def get_full_human_notes(digits_grid):
 
 
 def find_all_candidates(digits_grid, x, y):
-    candidates = set()
-    for digit in range(1, 10):
-        if (fits_in_row(digits_grid, y, digit) and
-            fits_in_col(digits_grid, x, digit) and
-            fits_in_square(digits_grid, x // 3, y // 3, digit)):
-            candidates.add(digit)
-    return candidates
+    return set(range(1, 10)).difference(digits_grid.item(peer) for peer in PEERS[y * 9 + x])
 
 
 def fits_in_row(digits_grid, y, digit):
-    return digit not in digits_grid[y, :]
+    return count_in_unit(digits_grid, UNITS[y], digit) == 0
 
 
 def fits_in_col(digits_grid, x, digit):
-    return digit not in digits_grid[:, x]
+    return count_in_unit(digits_grid, UNITS[9 + x], digit) == 0
 
 
 def fits_in_square(digits_grid, x_square, y_square, digit):
-    square = digits_grid[y_square * 3 : y_square * 3 + 3, x_square * 3 : x_square * 3 + 3]
-    return digit not in square
+    return count_in_unit(digits_grid, UNITS[18 + y_square * 3 + x_square], digit) == 0
 
 
 def remove_orphans_technique(digits_grid, human_notes):
@@ -99,72 +609,42 @@ def remove_orphans_technique(digits_grid, human_notes):
 
 
 def implications_of_removing_an_orphan(notes, x, y, digit):
-    for i in range(9):
-        notes[y, i].discard(digit)
-        notes[i, x].discard(digit)
-
-    x0, y0 = (x // 3) * 3, (y // 3) * 3
-    for dy in range(3):
-        for dx in range(3):
-            notes[y0 + dy, x0 + dx].discard(digit)
+    for peer in PEERS[y * 9 + x]:
+        notes.item(peer).discard(digit)
 
 
 def single_appearances_technique(digits_grid, human_notes):
     changed = False
-
-    # rows
-    for y in range(9):
-        changed |= single_appearance_axis(digits_grid, human_notes, y, axis="row")
-
-    # columns
-    for x in range(9):
-        changed |= single_appearance_axis(digits_grid, human_notes, x, axis="col")
-
-    # 3x3 boxes
-    for box_y in range(3):
-        for box_x in range(3):
-            changed |= single_appearance_box(digits_grid, human_notes, box_x, box_y)
-
+    for unit in UNITS:
+        changed |= single_appearance_unit(digits_grid, human_notes, unit)
     return changed
 
 
 def single_appearance_axis(digits_grid, human_notes, index, axis="row"):
-    changed = False
-    for digit in range(1, 10):
-        appearances = []
-        for i in range(9):
-            x, y = (i, index) if axis == "row" else (index, i)
-            if digit in human_notes[y, x]:
-                appearances.append((y, x))
-                if len(appearances) > 1:
-                    break
-        if len(appearances) == 1:
-            y, x = appearances[0]
-            digits_grid[y, x] = digit
-            human_notes[y, x] = set()
-            implications_of_removing_an_orphan(human_notes, x, y, digit)
-            changed = True
-    return changed
+    unit = UNITS[index] if axis == "row" else UNITS[9 + index]
+    return single_appearance_unit(digits_grid, human_notes, unit)
 
 
 def single_appearance_box(digits_grid, human_notes, box_x, box_y):
+    return single_appearance_unit(digits_grid, human_notes, UNITS[18 + box_y * 3 + box_x])
+
+
+def single_appearance_unit(digits_grid, human_notes, unit):
     changed = False
     for digit in range(1, 10):
-        appearances = []
-        for dy in range(3):
-            for dx in range(3):
-                y = box_y * 3 + dy
-                x = box_x * 3 + dx
-                if digit in human_notes[y, x]:
-                    appearances.append((y, x))
-                    if len(appearances) > 1:
-                        break
-        if len(appearances) == 1:
-            y, x = appearances[0]
-            digits_grid[y, x] = digit
-            human_notes[y, x] = set()
-            implications_of_removing_an_orphan(human_notes, x, y, digit)
-            changed = True
+        appearance = None
+        for index in unit:
+            if digit in human_notes.item(index):
+                if appearance is not None:
+                    break
+                appearance = index
+        else:
+            if appearance is not None:
+                y, x = ROW_OF[appearance], COL_OF[appearance]
+                digits_grid[y, x] = digit
+                human_notes[y, x] = set()
+                implications_of_removing_an_orphan(human_notes, x, y, digit)
+                changed = True
     return changed
 
 
@@ -0,0 +1,264 @@
+# Headless batch mode for photos and scans of boards.
+# Takes directories and / or glob patterns of images, runs detection, recognition and solving of
+# WebcamSudokuSolver on them in a pool of processes and writes one JSON line per image in input order:
+#   {"path": ..., "outcome": "solved", "digits_grid": "0402...", "solution": "5472...",
+#    "confidences": [[...], ...], "rotation_angle": 0, "seconds": 0.041, "stages": {"get_biggest_quadrangle": ...},
+#    "annotated": "out/000003_2.jpg"}
+# Grids are 81 characters like in Bulk_solve ('0' is empty), confidences are the probabilities of the
+# recognized digits (0 in empty cells), stages are seconds spent in every stage (see Metrics.py).
+# A board solved after misread digits have been replaced (see Webcam_preprocess.recover_digits_grid) has
+# the corrected grid and "recovered_cells", the number of replaced digits.
+# Outcomes: solved, unsolved, no_board, no_digits, unreadable (the file isn't an image) and error (OpenCV or
+# the solver has raised an exception, its type and message are in "error"); an error doesn't stop the batch.
+#
+# Every worker loads the model once (Inference.load_model) and runs OpenCV single-threaded,
+# so throughput grows with the number of workers instead of threads competing for the same cores.
+# Statistics (images / second, p50 / p99 latency, outcomes) go to stderr.
+#
+# Usage: python -m Batch_images scans/ -o results.jsonl --model models/new_model.npz
+#        python -m Batch_images 'pages/*.png' 'pages/*.jpg' --annotated annotated/ --workers 8
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import cv2 as cv
+
+import Inference
+import Metrics
+import Solution_cache
+import Webcam_preprocess
+
+IMAGE_EXTENSIONS = ('.bmp', '.jpeg', '.jpg', '.png', '.tif', '.tiff', '.webp')
+
+# solver of the worker process, created by init_worker
+solver = None
+annotated_directory = None
+# FrameRecord of the last solved image, filled by the metrics sink of the solver
+records = list()
+
+
+def find_images(sources):
+    """
+    :param sources: directories (their images are taken, not recursively) and glob patterns or paths
+    :return: sorted list of image paths of every source, in the order of sources
+    """
+    paths = list()
+    for source in sources:
+        if os.path.isdir(source):
+            names = sorted(os.listdir(source))
+            paths.extend(
+                os.path.join(source, name) for name in names if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+            )
+        else:
+            paths.extend(sorted(glob.glob(source)))
+    return paths
+
+
+def grid_to_string(digits_grid):
+    return ''.join(map(str, np.asarray(digits_grid).ravel())) if digits_grid is not None else None
+
+
+def init_worker(model_path, backend=None, annotated=None, multiscale_detection=False):
+    """
+    Runs once in every worker process: loads the model and creates the solver.
+    """
+    global solver, annotated_directory
+    cv.setNumThreads(1)
+
+    model = Inference.load_model(model_path, backend)
+    solver = Webcam_preprocess.WebcamSudokuSolver(
+        model, Solution_cache.SolutionCache(), metrics=Metrics.SolverMetrics([records.append]),
+        multiscale_detection=multiscale_detection
+    )
+    annotated_directory = annotated
+
+
+def get_error_result(path, error):
+    """
+    :return: dict that is written as the JSON line of an image whose processing has raised error
+        (seconds is None when the time isn't known)
+    """
+    return {'path': path, 'outcome': 'error', 'error': '{}: {}'.format(type(error).__name__, error), 'seconds': None}
+
+
+def solve_image(index, path):
+    """
+    Runs in a worker process.
+
+    :param index: position of the image in the batch, it prefixes the name of the annotated image
+    :return: dict that is written as one JSON line
+    """
+    start = time.perf_counter()
+    try:
+        result = recognize_and_solve(index, path)
+    except Exception as error:
+        # one image that makes OpenCV or the solver fail gets an error line, the batch goes on
+        result = get_error_result(path, error)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def recognize_and_solve(index, path):
+    """
+    :return: dict that is written as one JSON line, without seconds
+    """
+    result = {'path': path}
+
+    frame = cv.imread(path)
+    if frame is None:
+        result['outcome'] = 'unreadable'
+        return result
+
+    # pages have nothing in common, nothing is reused from the previous one
+    solver.reset()
+    records.clear()
+    output_frame = solver.solve(frame)
+    record = records[-1]
+
+    recognized = [fields for name, fields in record.events if name == 'board_recognized']
+    recovered = [fields for name, fields in record.events if name == 'digits_recovered']
+    solved = [fields for name, fields in record.events if name == 'board_solved']
+    if solved:
+        # the last recognized grid is the one that has been solved
+        best = recognized[-1] if recognized else None
+    else:
+        best = max(recognized, key=lambda fields: fields['confidences'].sum(), default=None)
+
+    result.update(
+        outcome=record.outcome,
+        digits_grid=grid_to_string(best['digits_grid']) if best else None,
+        solution=grid_to_string(solved[-1]['solution']) if solved else None,
+        confidences=np.round(best['confidences'].astype(float), 4).tolist() if best else None,
+        rotation_angle=best['rotation_angle'] if best else None,
+        stages={stage: round(seconds, 6) for stage, seconds in record.stages.items()},
+    )
+
+    if solved and recovered:
+        # the solved grid has some digits of the recognized one replaced by their next most probable digits
+        result.update(digits_grid=grid_to_string(recovered[-1]['digits_grid']),
+                      recovered_cells=recovered[-1]['changed_cells'])
+
+    if annotated_directory is not None:
+        annotated_path = os.path.join(annotated_directory, '{:06d}_{}'.format(index, os.path.basename(path)))
+        cv.imwrite(annotated_path, output_frame)
+        result['annotated'] = annotated_path
+
+    return result
+
+
+class BatchStats:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.images = 0
+        self.latencies = list()
+        self.outcomes = dict()
+
+    def add(self, result):
+        if result['seconds'] is not None:
+            self.latencies.append(result['seconds'])
+        self.images += 1
+        self.outcomes[result['outcome']] = self.outcomes.get(result['outcome'], 0) + 1
+
+    def get_latency_percentile(self, percentile):
+        if len(self.latencies) == 0:
+            return 0.0
+        return float(np.percentile(self.latencies, percentile))
+
+    def report(self, stream):
+        seconds = time.perf_counter() - self.start
+        print('images: {}  {}'.format(
+            self.images, '  '.join('{}: {}'.format(outcome, count) for outcome, count in sorted(self.outcomes.items()))
+        ), file=stream)
+        print('time: {:.2f} s  images / second: {:.1f}'.format(
+            seconds, self.images / seconds if seconds else 0
+        ), file=stream)
+        print('latency p50: {:.1f} ms  p99: {:.1f} ms'.format(
+            self.get_latency_percentile(50) * 1e3, self.get_latency_percentile(99) * 1e3
+        ), file=stream)
+
+
+def solve_images(paths, output_stream, model_path, backend=None, annotated=None, multiscale_detection=False,
+                 workers=None, max_pending=None):
+    """
+    Solves all images and writes their results to output_stream as JSON lines in input order.
+
+    :param annotated: directory for copies of the images with the solution drawn, None writes none
+    :param workers: number of worker processes (os.cpu_count() by default), 0 solves in this process
+    :param max_pending: maximal number of images in flight (4 per worker by default)
+    :return: BatchStats
+    """
+    stats = BatchStats()
+    if annotated is not None:
+        os.makedirs(annotated, exist_ok=True)
+    initargs = (model_path, backend, annotated, multiscale_detection)
+
+    def write(result):
+        stats.add(result)
+        output_stream.write(json.dumps(result) + '\n')
+
+    def get_result(path, future):
+        try:
+            return future.result()
+        except Exception as error:
+            # the worker itself has failed (e.g. it has been killed), the images after it still get their lines
+            return get_error_result(path, error)
+
+    if workers == 0:
+        init_worker(*initargs)
+        for index, path in enumerate(paths):
+            write(solve_image(index, path))
+        return stats
+
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 4 * workers
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=initargs) as executor:
+        # (path, future) in input order
+        pending = deque()
+        for index, path in enumerate(paths):
+            if len(pending) >= max_pending:
+                write(get_result(*pending.popleft()))
+            pending.append((path, executor.submit(solve_image, index, path)))
+        while pending:
+            write(get_result(*pending.popleft()))
+
+    return stats
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Recognize and solve sudoku boards on images in bulk.')
+    parser.add_argument('sources', nargs='+', help='directories, image paths or glob patterns')
+    parser.add_argument('-o', '--output', default='-', help='file for JSON lines, stdout by default')
+    parser.add_argument('--model', default=os.path.join('models', 'new_model.npz'),
+                        help='digit classifier (.npz, .onnx or .h5, see Inference.py)')
+    parser.add_argument('--backend', default=None, help='keras, numpy or opencv, by the model extension by default')
+    parser.add_argument('--annotated', default=None, help='directory for images with the solution drawn')
+    parser.add_argument('--multiscale', action='store_true', help='coarse to fine board detection (big scans)')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes, all cores by default, 0 = no pool')
+    parser.add_argument('--max-pending', type=int, default=None, help='images in flight, 4 per worker by default')
+    arguments = parser.parse_args(arguments)
+
+    paths = find_images(arguments.sources)
+    output_stream = sys.stdout if arguments.output == '-' else open(arguments.output, 'w')
+    try:
+        stats = solve_images(
+            paths, output_stream, arguments.model, arguments.backend, arguments.annotated, arguments.multiscale,
+            arguments.workers, arguments.max_pending
+        )
+    finally:
+        if output_stream is not sys.stdout:
+            output_stream.close()
+
+    stats.report(sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,453 @@
+# Benchmark suite of the solver and the vision pipeline, runs offline on CPU.
+#
+# Solver: average time per solve and the peak memory allocated by python during a single solve (tracemalloc)
+# on easy, hard and 17-clue puzzles, plus scaling from 9x9 to 16x16 and 25x25 grids
+# and the time Puzzle_generator needs to remove clues from a random grid.
+# Vision: median latency of every stage (get_biggest_quadrangle and its multiscale version,
+# check_digits_occurrence, prepare_inputs, inverse_warp_digits_on_frame and the whole WebcamSudokuSolver.solve)
+# on images/2.jpg and on synthetic warped renders of a board at 720p, 1080p and 4K.
+# Memory: peak bytes allocated by python and numpy / OpenCV arrays during one frame of a stream
+# (the same solver fed with the same frame), solve against solve_into with a Frame_workspace.
+# StubModel stands in for the CNN, so TensorFlow is not needed.
+# Recovery: how many boards with 1, 2 or 3 misread digits recover_digits_grid solves right and how long it takes.
+# That faster replacements of vision stages give the same results as the original ones is tested
+# in tests/test_webcam_preprocess.py, this suite only times them.
+#
+# Run: python Benchmark.py --output results.json
+#      python Benchmark.py --baseline baseline.json --threshold 20     (exit code 1 on a regression)
+#      python Benchmark.py --baseline baseline.json --save-baseline    (store the current results)
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2 as cv
+import numpy as np
+
+import Backtrack
+import Frame_workspace
+import Puzzle_generator
+import Solution_cache
+import Webcam_preprocess
+
+EASY_PUZZLES = [
+    '003020600900305001001806400008102900700000008006708200002609500800203009005010300',
+    '200080300060070084030500209000105408000000000402706000301007040720040060004010003',
+    '000000907000420180000705026100904000050000040000507009920108000034059000507000000',
+]
+
+HARD_PUZZLES = [
+    '800000000003600000070090200050007000000045700000100030001000068008500010090000400',
+    '000000012000000003002300400001800005060070800000009000008500000900040500470006000',
+    '000000039000001005003050800008090006070002000100400000009080050020000600400700000',
+]
+
+# 17 clues is the minimum for a uniquely solvable sudoku, these are the worst cases for uniqueness checks.
+SEVENTEEN_CLUE_PUZZLES = [
+    '000000010400000000020000000000050407008000300001090000300400200050100000000806000',
+    '000000012000035000000600070700000300000400800100000000000120000080000040050000600',
+    '000000012003600000000007000410020000000500300700000600280000040000300500000000000',
+    '000000012008030000000000040120500000000004700060000000507000300000620000000100000',
+]
+
+PUZZLE_SETS = {
+    'easy': EASY_PUZZLES,
+    'hard': HARD_PUZZLES,
+    '17-clue': SEVENTEEN_CLUE_PUZZLES,
+}
+
+SOLVERS = {
+    'solve_sudoku': Backtrack.solve_sudoku,
+    'solve_unique': Backtrack.solve_unique,
+    'solve_unique_with_bitmasks': Backtrack.solve_unique_with_bitmasks,
+    'human_techniques': Backtrack.solve_with_human_techniques,
+}
+
+# box size -> fraction of emptied cells of the generated puzzles.
+# Random 25x25 grids with about half of the cells emptied are in the hard (phase transition) region
+# of quasigroup completion, where the search time has a heavy tail, so they are emptied less.
+SCALING_BOX_SIZES = {3: 0.6, 4: 0.55, 5: 0.35}
+
+SAMPLE_IMAGE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'images', '2.jpg')
+# digits printed on images/2.jpg
+SAMPLE_IMAGE_PUZZLE = '040201060000000000905000307000000000507080104010000090001000600000705000608904503'
+
+FRAME_SIZES = {
+    '720p': (1280, 720),
+    '1080p': (1920, 1080),
+    '4K': (3840, 2160),
+}
+
+
+def get_scaling_puzzle(box_size, empty_fraction, rng):
+    """
+    Builds a shuffled solved grid of any box size and empties random cells of it.
+
+    :return: uint8 numpy array of shape (n, n), n = box_size ** 2
+    """
+    size = box_size * box_size
+    y, x = np.indices((size, size))
+    grid = (box_size * (y % box_size) + y // box_size + x) % size + 1
+
+    rows = [band * box_size + i for band in rng.permutation(box_size) for i in rng.permutation(box_size)]
+    cols = [stack * box_size + i for stack in rng.permutation(box_size) for i in rng.permutation(box_size)]
+    grid = np.concatenate(([0], rng.permutation(size) + 1))[grid[rows][:, cols]]
+
+    grid[rng.random((size, size)) < empty_fraction] = 0
+    return grid.astype(np.uint8)
+
+
+def parse_puzzle(line):
+    """
+    :param line: 81 characters, '0' or '.' means empty
+    :return: uint8 numpy array of shape (9,9)
+    """
+    line = line.strip().replace('.', '0')
+    return np.array([int(char) for char in line], dtype=np.uint8).reshape((9, 9))
+
+
+class StubModel:
+    """
+    Stands in for the Keras model: "recognizes" the digits of a known puzzle in row-major order
+    with full confidence, whatever the inputs are (a batch of several rotations gets them repeated).
+    """
+
+    def __init__(self, digits_grid):
+        digits_grid = np.asarray(digits_grid)
+        self.digits = digits_grid[digits_grid != 0]
+
+    def predict(self, inputs, **kwargs):
+        predictions = np.zeros((len(inputs), 10), dtype=np.float32)
+        digits = np.resize(self.digits.astype(np.intp), len(inputs)) if len(self.digits) else np.ones(len(inputs), np.intp)
+        predictions[np.arange(len(inputs)), digits] = 1.0
+        return predictions
+
+
+def render_board(digits_grid, side=900):
+    """
+    :return: BGR image of a printed-like sudoku board with the digits of digits_grid
+    """
+    board = np.full((side, side, 3), 255, dtype=np.uint8)
+    cell = side / 9
+    for i in range(10):
+        thickness = 6 if i % 3 == 0 else 2
+        position = int(round(i * cell)) - (thickness // 2 if i == 9 else 0)
+        cv.line(board, (position, 0), (position, side - 1), (0, 0, 0), thickness)
+        cv.line(board, (0, position), (side - 1, position), (0, 0, 0), thickness)
+
+    # digits take about 60% of the cell height, like on printed boards
+    font = cv.FONT_HERSHEY_SIMPLEX
+    scale = cell / 24
+    thickness = max(2, int(cell / 14))
+    for y in range(9):
+        for x in range(9):
+            if digits_grid[y, x]:
+                text = str(digits_grid[y, x])
+                (width, height), _ = cv.getTextSize(text, font, scale, thickness)
+                origin = (int(x * cell + (cell - width) / 2), int(y * cell + (cell + height) / 2))
+                cv.putText(board, text, origin, font, scale, (0, 0, 0), thickness, cv.LINE_AA)
+    return board
+
+
+def render_frame(digits_grid, frame_size):
+    """
+    :param frame_size: (width, height)
+    :return: BGR frame with the board slightly tilted in perspective in the middle of it
+    """
+    width, height = frame_size
+    board = render_board(digits_grid)
+    side = 0.7 * height
+    left, top = (width - side) / 2, (height - side) / 2
+    corners = np.float32([
+        [left + 0.04 * side, top],
+        [left + side, top + 0.02 * side],
+        [left, top + side],
+        [left + 0.97 * side, top + 0.98 * side],
+    ])
+    source = np.float32([[0, 0], [board.shape[1], 0], [0, board.shape[0]], [board.shape[1], board.shape[0]]])
+    matrix = cv.getPerspectiveTransform(source, corners)
+    return cv.warpPerspective(board, matrix, (width, height), borderValue=(120, 120, 120))
+
+
+def measure_solver(solve, grids, repeat=3):
+    """
+    :return: (average seconds per solve, average peak bytes allocated during one solve)
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for grid in grids:
+            solve(grid)
+    seconds = (time.perf_counter() - start) / (repeat * len(grids))
+
+    peaks = list()
+    tracemalloc.start()
+    for grid in grids:
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        solve(grid)
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - base)
+    tracemalloc.stop()
+
+    return seconds, sum(peaks) / len(peaks)
+
+
+def measure_median(function, repeat):
+    """
+    :return: median seconds of a call
+    """
+    times = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def run_solver_benchmarks(repeat=3):
+    results = dict()
+    for solver_name, solve in SOLVERS.items():
+        for set_name, puzzles in PUZZLE_SETS.items():
+            grids = [parse_puzzle(puzzle) for puzzle in puzzles]
+            seconds, peak = measure_solver(solve, grids, repeat)
+            results['solver/{}/{}'.format(solver_name, set_name)] = {'seconds': seconds, 'peak_kib': peak / 1024}
+
+    rng = np.random.default_rng(0)
+    for box_size, empty_fraction in SCALING_BOX_SIZES.items():
+        grids = [get_scaling_puzzle(box_size, empty_fraction, rng) for _ in range(5)]
+        seconds, peak = measure_solver(Backtrack.solve_sudoku, grids, repeat=1)
+        size = box_size * box_size
+        results['scaling/{}x{}'.format(size, size)] = {'seconds': seconds, 'peak_kib': peak / 1024}
+
+    # one minimal puzzle from a random grid, the uniqueness checks are most of it
+    rng = np.random.default_rng(0)
+    solutions = [Puzzle_generator.get_random_solution(rng) for _ in range(10)]
+    seconds, peak = measure_solver(lambda solution: Puzzle_generator.remove_clues(solution, rng), solutions, repeat=1)
+    results['generator/remove_clues'] = {'seconds': seconds, 'peak_kib': peak / 1024}
+
+    return results
+
+
+def run_vision_benchmarks(repeat=10):
+    digits_grid = parse_puzzle(SAMPLE_IMAGE_PUZZLE)
+    frames = {'2.jpg': cv.imread(SAMPLE_IMAGE_PATH)}
+    for name, frame_size in FRAME_SIZES.items():
+        frames[name] = render_frame(digits_grid, frame_size)
+
+    results = dict()
+    for name, frame in frames.items():
+        if frame is None:
+            continue
+
+        board, warp_matrix = Webcam_preprocess.get_biggest_quadrangle(frame, draw_vertices_on_frame=False)
+        stages = {
+            'get_biggest_quadrangle':
+                lambda: Webcam_preprocess.get_biggest_quadrangle(frame, draw_vertices_on_frame=False),
+            'get_biggest_quadrangle_multiscale':
+                lambda: Webcam_preprocess.get_biggest_quadrangle_multiscale(frame, draw_vertices_on_frame=False),
+        }
+        if board is not None:
+            boxes = Webcam_preprocess.get_boxes(board)
+            occurrence = Webcam_preprocess.check_digits_occurrence(boxes)
+            stages['check_digits_occurrence'] = lambda: Webcam_preprocess.check_digits_occurrence(
+                Webcam_preprocess.get_boxes(board)
+            )
+            stages['check_digits_occurrence_by_ink'] = lambda: Webcam_preprocess.check_digits_occurrence_by_ink(board)
+            stages['prepare_inputs'] = lambda: Webcam_preprocess.prepare_inputs(boxes, occurrence)
+            stages['prepare_inputs_vectorized'] = lambda: Webcam_preprocess.prepare_inputs_vectorized(board, occurrence)
+            solution = Backtrack.solve_unique(digits_grid.copy())
+            stages['inverse_warp_digits_on_frame'] = lambda: Webcam_preprocess.inverse_warp_digits_on_frame(
+                digits_grid, solution, frame, board.shape, warp_matrix, 0
+            )
+
+        # a new solver and cache every time, so neither the last solution nor the cache is reused
+        stages['solve'] = lambda: Webcam_preprocess.WebcamSudokuSolver(
+            StubModel(digits_grid), Solution_cache.SolutionCache()
+        ).solve(frame)
+
+        stages['solve_batch_rotations'] = lambda: Webcam_preprocess.WebcamSudokuSolver(
+            StubModel(digits_grid), Solution_cache.SolutionCache(), batch_rotations=True
+        ).solve(frame)
+
+        stages['solve_multiscale'] = lambda: Webcam_preprocess.WebcamSudokuSolver(
+            StubModel(digits_grid), Solution_cache.SolutionCache(), multiscale_detection=True
+        ).solve(frame)
+
+        for stage, function in stages.items():
+            results['vision/{}/{}'.format(name, stage)] = {'seconds': measure_median(function, repeat)}
+
+    return results
+
+
+def measure_stream(solve, frame, frames=10, warm_up=3):
+    """
+    Runs solve on the same frame over and over, like on a stream of a still board.
+
+    :return: (median seconds per frame, average peak bytes allocated during one frame after the warm-up)
+    """
+    for _ in range(warm_up):
+        solve(frame)
+
+    times = list()
+    peaks = list()
+    tracemalloc.start()
+    for _ in range(frames):
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        solve(frame)
+        times.append(time.perf_counter() - start)
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - base)
+    tracemalloc.stop()
+
+    return float(np.median(times)), sum(peaks) / len(peaks)
+
+
+def run_memory_benchmarks():
+    """
+    Steady-state allocation per frame of one solver fed with the same frame: solve allocates new arrays
+    on every frame, solve_into reuses a Frame_workspace and an output frame.
+    """
+    digits_grid = parse_puzzle(SAMPLE_IMAGE_PUZZLE)
+    results = dict()
+    for name, frame_size in FRAME_SIZES.items():
+        frame = render_frame(digits_grid, frame_size)
+
+        solver = Webcam_preprocess.WebcamSudokuSolver(StubModel(digits_grid), Solution_cache.SolutionCache())
+        seconds, peak = measure_stream(solver.solve, frame)
+        results['memory/{}/solve'.format(name)] = {'seconds': seconds, 'peak_kib': peak / 1024}
+
+        workspace = Frame_workspace.FrameWorkspace(frame.shape)
+        solver = Webcam_preprocess.WebcamSudokuSolver(
+            StubModel(digits_grid), Solution_cache.SolutionCache(), workspace=workspace
+        )
+        output_frame = np.empty_like(frame)
+        seconds, peak = measure_stream(lambda current_frame: solver.solve_into(current_frame, output_frame), frame)
+        results['memory/{}/solve_into'.format(name)] = {'seconds': seconds, 'peak_kib': peak / 1024}
+
+    return results
+
+
+def get_misread_predictions(digits_grid, misread, rng):
+    """
+    :return: (predictions, digits_occurrence) like the model would give for digits_grid, with misread digits
+        taken for another digit (probability 0.5 .. 0.8) and the right one as the second choice
+    """
+    digits_occurrence = digits_grid != 0
+    digits = digits_grid[digits_occurrence].astype(np.intp)
+    predictions = np.full((len(digits), 10), 0.002)
+    predictions[np.arange(len(digits)), digits] = 0.98
+    for i in rng.choice(len(digits), misread, replace=False):
+        wrong_digit = rng.choice([digit for digit in range(1, 10) if digit != digits[i]])
+        predictions[i] = 0.01
+        predictions[i, wrong_digit] = rng.uniform(0.5, 0.8)
+        predictions[i, digits[i]] = 0.92 - predictions[i, wrong_digit]
+    return predictions / predictions.sum(axis=1, keepdims=True), digits_occurrence
+
+
+def run_recovery_checks(misreads=(1, 2, 3)):
+    """
+    Boards with misread digits that can't be solved as they have been read are given to recover_digits_grid.
+
+    :return: (results, counts) where results has the median seconds of recover_digits_grid and counts is
+        a dict check name -> (number of boards recovered with the right solution, number of boards)
+    """
+    rng = np.random.default_rng(0)
+    results = dict()
+    counts = dict()
+    for misread in misreads:
+        name = 'recovery/{}_misread'.format(misread)
+        times = list()
+        recovered = 0
+        for puzzles in PUZZLE_SETS.values():
+            for puzzle in puzzles:
+                digits_grid = parse_puzzle(puzzle)
+                solution = Backtrack.solve_unique(digits_grid)
+                predictions, digits_occurrence = get_misread_predictions(digits_grid, misread, rng)
+                if Backtrack.solve_unique(Webcam_preprocess.get_digits_grid(predictions, digits_occurrence, 0)) is not None:
+                    continue
+
+                start = time.perf_counter()
+                result = Webcam_preprocess.recover_digits_grid(
+                    predictions, digits_occurrence, 0, Backtrack.solve_unique
+                )
+                times.append(time.perf_counter() - start)
+                recovered += result is not None and bool(np.array_equal(result[1], solution))
+
+        results[name] = {'seconds': float(np.median(times)) if times else 0.0}
+        counts[name] = (recovered, len(times))
+    return results, counts
+
+
+def find_regressions(results, baseline, threshold):
+    """
+    :param threshold: allowed slowdown in percent
+    :return: list of (name, baseline seconds, current seconds) of stages that are slower than allowed
+    """
+    regressions = list()
+    for name, result in results.items():
+        if name in baseline and result['seconds'] > baseline[name]['seconds'] * (1 + threshold / 100):
+            regressions.append((name, baseline[name]['seconds'], result['seconds']))
+    return regressions
+
+
+def print_results(results, baseline=None):
+    print('{:<44} {:>14} {:>10} {:>10}'.format('benchmark', 'us', 'peak KiB', 'change'))
+    for name, result in results.items():
+        change = ''
+        if baseline and name in baseline and baseline[name]['seconds']:
+            change = '{:+.0%}'.format(result['seconds'] / baseline[name]['seconds'] - 1)
+        peak = '{:.1f}'.format(result['peak_kib']) if 'peak_kib' in result else ''
+        print('{:<44} {:>14.1f} {:>10} {:>10}'.format(name, result['seconds'] * 1e6, peak, change))
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of the sudoku solver and the vision pipeline.')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='JSON file with stored results to compare with')
+    parser.add_argument('--threshold', type=float, default=25.0, help='allowed slowdown in percent (25 by default)')
+    parser.add_argument('--save-baseline', action='store_true', help='store the current results as the baseline')
+    parser.add_argument('--skip-vision', action='store_true', help='run only the solver benchmarks')
+    arguments = parser.parse_args(arguments)
+
+    results = run_solver_benchmarks()
+    recovery_results, recovery_counts = run_recovery_checks()
+    results.update(recovery_results)
+    if not arguments.skip_vision:
+        results.update(run_vision_benchmarks())
+        results.update(run_memory_benchmarks())
+
+    baseline = None
+    if arguments.baseline and os.path.exists(arguments.baseline) and not arguments.save_baseline:
+        with open(arguments.baseline) as file:
+            baseline = json.load(file)
+
+    print_results(results, baseline)
+
+    for name, (recovered, total) in recovery_counts.items():
+        print('{}: {} / {} boards solved right'.format(name, recovered, total))
+
+    if arguments.output:
+        with open(arguments.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    if arguments.save_baseline and arguments.baseline:
+        with open(arguments.baseline, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    regressions = list()
+    if baseline:
+        regressions = find_regressions(results, baseline, arguments.threshold)
+        for name, baseline_seconds, seconds in regressions:
+            print('REGRESSION {}: {:.1f} us -> {:.1f} us (more than {:.0f}% slower)'.format(
+                name, baseline_seconds * 1e6, seconds * 1e6, arguments.threshold
+            ), file=sys.stderr)
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,173 @@
+# Following a solved board from frame to frame without the full detection.
+# Once a board is solved, BoardTracker picks corner features inside it and follows them with
+# pyramidal Lucas-Kanade optical flow (checked forward and backward). A RANSAC homography between
+# the previous and the current positions of the features moves the warp matrix along with the paper,
+# so the previous digits grid, solution and mask of the solution digits are reused and only warped again.
+#
+# Tracking is lost (and WebcamSudokuSolver falls back to the full detection) when
+#   too few features survive or the homography has too few inliers,
+#   the board leaves the frame or shrinks / grows too much,
+#   the content of the board changes (a small warped copy of the board doesn't correlate with the one
+#   from the frame where the board was solved),
+#   redetect_interval frames have passed, so a slow drift never lasts long.
+
+import cv2 as cv
+import numpy as np
+
+# side of the small warped board that is compared to the reference to notice a change of content
+CHECK_SIZE = 144
+
+
+def get_gray(frame):
+    return cv.cvtColor(frame, cv.COLOR_BGR2GRAY) if len(frame.shape) == 3 else frame
+
+
+class BoardTracker:
+    def __init__(self, redetect_interval=30, max_features=200, min_features=12, min_correlation=0.8):
+        """
+        :param redetect_interval: after this many tracked frames the full detection runs again
+        :param max_features: maximal number of tracked corner features
+        :param min_features: tracking is lost when fewer features (or homography inliers) are left
+        :param min_correlation: tracking is lost when the board correlates less with the solved one
+        """
+        self.redetect_interval = redetect_interval
+        self.max_features = max_features
+        self.min_features = min_features
+        self.min_correlation = min_correlation
+        self.reset()
+
+    def reset(self):
+        self.previous_gray = None
+        self.features = None
+        self.warp_matrix = None
+        self.warp_dimensions = None
+        self.reference = None
+        self.tracked_frames = 0
+
+        # reused results of the last full detection
+        self.digits_grid = None
+        self.solution_digits_grid = None
+        self.rotation_angle = 0
+        self.digits_mask = None
+
+    def is_tracking(self):
+        return self.warp_matrix is not None
+
+    def start(self, frame, warp_matrix, warp_dimensions, digits_grid, solution_digits_grid, rotation_angle,
+              digits_mask):
+        """
+        Starts following a board that has just been solved on frame.
+
+        :param warp_dimensions: shape (height, width) of the warped board
+        :param digits_mask: mask of the solution digits in the warped board coordinates
+            (see Digit_overlay.get_digits_mask)
+        """
+        gray = get_gray(frame)
+        self.reset()
+        self.warp_matrix = np.asarray(warp_matrix, dtype=np.float64)
+        self.warp_dimensions = warp_dimensions[:2]
+        self.digits_grid = digits_grid
+        self.solution_digits_grid = solution_digits_grid
+        self.rotation_angle = rotation_angle
+        self.digits_mask = digits_mask
+
+        self.reference = self.get_check_board(gray, self.warp_matrix)
+        if not self.find_features(gray):
+            self.reset()
+            return
+        self.previous_gray = gray
+
+    def get_vertices(self, warp_matrix=None):
+        """
+        :return: float32 array of shape (4, 2), corners of the board in the frame (same order as the warp)
+        """
+        height, width = self.warp_dimensions
+        corners = np.float32([[[0, 0]], [[width, 0]], [[0, height]], [[width, height]]])
+        matrix = self.warp_matrix if warp_matrix is None else warp_matrix
+        return cv.perspectiveTransform(corners, np.linalg.inv(matrix)).reshape((4, 2))
+
+    def find_features(self, gray):
+        mask = np.zeros(gray.shape, dtype=np.uint8)
+        vertices = self.get_vertices()
+        cv.fillConvexPoly(mask, np.int32(vertices[[0, 1, 3, 2]]), 255)
+        self.features = cv.goodFeaturesToTrack(
+            gray, self.max_features, qualityLevel=0.01, minDistance=7, mask=mask, blockSize=7
+        )
+        return self.features is not None and len(self.features) >= self.min_features
+
+    def get_check_board(self, gray, warp_matrix):
+        height, width = self.warp_dimensions
+        scale = np.diag([CHECK_SIZE / width, CHECK_SIZE / height, 1.0])
+        check_board = cv.warpPerspective(gray, scale @ warp_matrix, (CHECK_SIZE, CHECK_SIZE)).astype(np.float32)
+        check_board -= check_board.mean()
+        norm = np.linalg.norm(check_board)
+        return check_board / norm if norm else check_board
+
+    def track(self, frame):
+        """
+        Moves the board to its position on frame.
+
+        :return: the new warp matrix or None if the tracking is lost (the tracker is reset then)
+        """
+        if not self.is_tracking():
+            return None
+        if self.tracked_frames >= self.redetect_interval:
+            self.reset()
+            return None
+
+        gray = get_gray(frame)
+        warp_matrix = self.get_new_warp_matrix(gray)
+        if warp_matrix is None:
+            self.reset()
+            return None
+
+        self.warp_matrix = warp_matrix
+        self.previous_gray = gray
+        self.tracked_frames += 1
+
+        if len(self.features) < 2 * self.min_features and not self.find_features(gray):
+            self.reset()
+            return None
+
+        return warp_matrix
+
+    def get_new_warp_matrix(self, gray):
+        if gray.shape != self.previous_gray.shape:
+            return None
+
+        lk_parameters = dict(
+            winSize=(21, 21), maxLevel=3, criteria=(cv.TERM_CRITERIA_EPS | cv.TERM_CRITERIA_COUNT, 20, 0.03)
+        )
+        new_features, status, _ = cv.calcOpticalFlowPyrLK(self.previous_gray, gray, self.features, None, **lk_parameters)
+        back_features, back_status, _ = cv.calcOpticalFlowPyrLK(gray, self.previous_gray, new_features, None, **lk_parameters)
+
+        # a feature is kept only if following it back lands where it started
+        error = np.linalg.norm((self.features - back_features).reshape((-1, 2)), axis=1)
+        good = (status.ravel() == 1) & (back_status.ravel() == 1) & (error < 1.0)
+        if np.count_nonzero(good) < self.min_features:
+            return None
+
+        homography, inliers = cv.findHomography(self.features[good], new_features[good], cv.RANSAC, 3.0)
+        if homography is None or np.count_nonzero(inliers) < self.min_features:
+            return None
+
+        self.features = new_features[good][inliers.ravel() == 1].reshape((-1, 1, 2))
+
+        # features move from the previous frame by the homography, so the board does too
+        warp_matrix = self.warp_matrix @ np.linalg.inv(homography)
+
+        vertices = self.get_vertices(warp_matrix)
+        height, width = gray.shape
+        if (vertices < 0).any() or (vertices[:, 0] >= width).any() or (vertices[:, 1] >= height).any():
+            return None
+
+        area = cv.contourArea(vertices[[0, 1, 3, 2]])
+        previous_area = cv.contourArea(self.get_vertices()[[0, 1, 3, 2]])
+        if not 0.8 < area / previous_area < 1.25:
+            return None
+
+        correlation = float((self.get_check_board(gray, warp_matrix) * self.reference).sum())
+        if correlation < self.min_correlation:
+            return None
+
+        return warp_matrix
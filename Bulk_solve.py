@@ -0,0 +1,180 @@
+# Headless bulk solver.
+# Streams puzzles (one per line, 81 characters, '0' or '.' means empty) from a file or stdin,
+# solves chunks of them in a pool of processes and writes solutions in input order
+# (an empty line for a puzzle that couldn't be solved).
+# At most max_pending chunks are in flight, so memory stays bounded for files of any length.
+# Statistics (puzzles / second, p50 / p99 latency of a single solve, unsolved count) go to stderr.
+#
+# Usage: python -m Bulk_solve puzzles.txt -o solutions.txt
+#        cat puzzles.txt | python -m Bulk_solve --workers 8 --chunk-size 2048
+
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import numpy as np
+
+import Backtrack
+
+# latencies are counted in a log-spaced histogram (1 us .. 100 s, 20 buckets per decade)
+LATENCY_BUCKETS = np.logspace(-6, 2, 161)
+
+
+def read_puzzles(stream):
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield line
+
+
+def get_chunks(iterable, chunk_size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parse_puzzle(line):
+    """
+    :param line: 81 characters, '0' or '.' means empty
+    :return: uint8 numpy array of shape (9,9) or None if the line is not a puzzle
+    """
+    line = line.replace('.', '0')
+    if len(line) != 81 or not line.isdigit():
+        return None
+    return np.frombuffer(line.encode(), dtype=np.uint8).reshape((9, 9)) - ord('0')
+
+
+def solve_chunk(lines):
+    """
+    Runs in a worker process.
+
+    :return: (solutions, latencies, invalid) where solutions is a list of 81-character strings
+        ('' for unsolved puzzles), latencies is a float array of seconds per solve
+        and invalid is the number of lines that are not puzzles
+    """
+    solutions = list()
+    latencies = np.zeros(len(lines))
+    invalid = 0
+
+    for i, line in enumerate(lines):
+        start = time.perf_counter()
+        digits_grid = parse_puzzle(line)
+        solution = Backtrack.solve_sudoku(digits_grid) if digits_grid is not None else None
+        latencies[i] = time.perf_counter() - start
+
+        if digits_grid is None:
+            invalid += 1
+        solutions.append(''.join(map(str, solution.ravel())) if solution is not None else '')
+
+    return solutions, latencies, invalid
+
+
+class BulkStats:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.puzzles = 0
+        self.unsolved = 0
+        self.invalid = 0
+        self.latency_histogram = np.zeros(len(LATENCY_BUCKETS) + 1, dtype=np.int64)
+
+    def add(self, solutions, latencies, invalid):
+        self.puzzles += len(solutions)
+        self.unsolved += sum(1 for solution in solutions if not solution)
+        self.invalid += invalid
+        self.latency_histogram += np.bincount(
+            np.searchsorted(LATENCY_BUCKETS, latencies), minlength=len(self.latency_histogram)
+        )
+
+    def get_latency_percentile(self, percentile):
+        """
+        :return: upper bound of the histogram bucket that holds the percentile, in seconds
+        """
+        if self.puzzles == 0:
+            return 0.0
+        position = np.searchsorted(np.cumsum(self.latency_histogram), percentile / 100 * self.puzzles)
+        return float(LATENCY_BUCKETS[min(position, len(LATENCY_BUCKETS) - 1)])
+
+    def report(self, stream):
+        seconds = time.perf_counter() - self.start
+        print('puzzles: {}  unsolved: {} (invalid lines: {})'.format(
+            self.puzzles, self.unsolved, self.invalid
+        ), file=stream)
+        print('time: {:.2f} s  puzzles / second: {:.0f}'.format(
+            seconds, self.puzzles / seconds if seconds else 0
+        ), file=stream)
+        print('latency p50: {:.1f} us  p99: {:.1f} us'.format(
+            self.get_latency_percentile(50) * 1e6, self.get_latency_percentile(99) * 1e6
+        ), file=stream)
+
+
+def solve_stream(input_stream, output_stream, workers=None, chunk_size=1024, max_pending=None):
+    """
+    Solves all puzzles of input_stream and writes solutions to output_stream in input order.
+
+    :param workers: number of worker processes (os.cpu_count() by default), 0 solves in this process
+    :param chunk_size: number of puzzles sent to a worker at once
+    :param max_pending: maximal number of chunks in flight (2 per worker by default)
+    :return: BulkStats
+    """
+    stats = BulkStats()
+    chunks = get_chunks(read_puzzles(input_stream), chunk_size)
+
+    def write(result):
+        solutions, latencies, invalid = result
+        stats.add(solutions, latencies, invalid)
+        output_stream.write('\n'.join(solutions) + '\n')
+
+    if workers == 0:
+        for chunk in chunks:
+            write(solve_chunk(chunk))
+        return stats
+
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            if len(pending) >= max_pending:
+                write(pending.popleft().result())
+            pending.append(executor.submit(solve_chunk, chunk))
+        while pending:
+            write(pending.popleft().result())
+
+    return stats
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Solve sudoku puzzles in bulk (one 81-character puzzle per line).')
+    parser.add_argument('input', nargs='?', default='-', help='file with puzzles, stdin by default')
+    parser.add_argument('-o', '--output', default='-', help='file for solutions, stdout by default')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes, all cores by default, 0 = no pool')
+    parser.add_argument('--chunk-size', type=int, default=1024, help='puzzles per chunk')
+    parser.add_argument('--max-pending', type=int, default=None, help='chunks in flight, 2 per worker by default')
+    arguments = parser.parse_args(arguments)
+
+    input_stream = sys.stdin if arguments.input == '-' else open(arguments.input)
+    output_stream = sys.stdout if arguments.output == '-' else open(arguments.output, 'w')
+    try:
+        stats = solve_stream(
+            input_stream, output_stream, arguments.workers, arguments.chunk_size, arguments.max_pending
+        )
+    finally:
+        if input_stream is not sys.stdin:
+            input_stream.close()
+        if output_stream is not sys.stdout:
+            output_stream.close()
+
+    stats.report(sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
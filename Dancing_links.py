@@ -0,0 +1,229 @@
+# Exact cover solver (Knuth's Algorithm X implemented with Dancing Links).
+# A 9x9 sudoku is an exact cover problem with 324 constraints (cell filled, digit in row, digit in column,
+# digit in box) and 729 possibilities (digit in cell). Every possibility covers exactly 4 constraints.
+# Bigger boxes work the same way (4 * n^2 constraints and n^3 possibilities for an n x n grid).
+# The links are kept in flat python lists, node 0 is the root and nodes 1..columns_count are column headers.
+
+import numpy as np
+
+import Backtrack
+
+
+class DancingLinks:
+    def __init__(self, columns_count, rows):
+        """
+        :param columns_count: number of constraints
+        :param rows: list of lists of column indexes (0-based) covered by every possibility
+        """
+        size = 1 + columns_count + sum(len(row) for row in rows)
+
+        self.left = list(range(size))
+        self.right = list(range(size))
+        self.up = list(range(size))
+        self.down = list(range(size))
+        self.column = list(range(size))
+        self.row_id = [-1] * size
+        self.size = [0] * (columns_count + 1)
+        self.first_node_of_row = [0] * len(rows)
+
+        for header in range(columns_count + 1):
+            self.left[header] = header - 1 if header > 0 else columns_count
+            self.right[header] = header + 1 if header < columns_count else 0
+
+        node = columns_count + 1
+        for row_id, row in enumerate(rows):
+            first = node
+            self.first_node_of_row[row_id] = first
+            for column_index in row:
+                header = column_index + 1
+                self.column[node] = header
+                self.row_id[node] = row_id
+                self.up[node] = self.up[header]
+                self.down[node] = header
+                self.down[self.up[header]] = node
+                self.up[header] = node
+                self.size[header] += 1
+
+                self.left[node] = node - 1 if node > first else first + len(row) - 1
+                self.right[node] = node + 1 if node < first + len(row) - 1 else first
+                node += 1
+
+    def copy(self):
+        other = DancingLinks.__new__(DancingLinks)
+        other.left = self.left.copy()
+        other.right = self.right.copy()
+        other.up = self.up.copy()
+        other.down = self.down.copy()
+        other.column = self.column
+        other.row_id = self.row_id
+        other.size = self.size.copy()
+        other.first_node_of_row = self.first_node_of_row
+        return other
+
+    def cover(self, header):
+        left, right, up, down, column, size = self.left, self.right, self.up, self.down, self.column, self.size
+        right[left[header]] = right[header]
+        left[right[header]] = left[header]
+        i = down[header]
+        while i != header:
+            j = right[i]
+            while j != i:
+                down[up[j]] = down[j]
+                up[down[j]] = up[j]
+                size[column[j]] -= 1
+                j = right[j]
+            i = down[i]
+
+    def uncover(self, header):
+        left, right, up, down, column, size = self.left, self.right, self.up, self.down, self.column, self.size
+        i = up[header]
+        while i != header:
+            j = left[i]
+            while j != i:
+                size[column[j]] += 1
+                down[up[j]] = j
+                up[down[j]] = j
+                j = left[j]
+            i = up[i]
+        right[left[header]] = header
+        left[right[header]] = header
+
+    def select_row(self, row_id):
+        """
+        Puts a row into the solution permanently (used for the clues).
+
+        :return: False if one of its columns is already covered (the row conflicts with previous ones)
+        """
+        first = self.first_node_of_row[row_id]
+        node = first
+        while True:
+            header = self.column[node]
+            if self.right[self.left[header]] != header:
+                return False
+            self.cover(header)
+            node = self.right[node]
+            if node == first:
+                return True
+
+    def count_solutions(self, limit, partial_solution=None, first_solution=None):
+        """
+        Counts exact covers, stops as soon as limit of them has been found.
+
+        :param limit: maximal number of solutions to look for
+        :param partial_solution: list of row ids chosen so far (used internally)
+        :param first_solution: list that receives row ids of the first found solution
+        :return: number of found solutions (not greater than limit)
+        """
+        if partial_solution is None:
+            partial_solution = []
+
+        right, down, size, column = self.right, self.down, self.size, self.column
+
+        if right[0] == 0:
+            if first_solution is not None and not first_solution:
+                first_solution.extend(partial_solution)
+            return 1
+
+        best_header, best_size = 0, None
+        header = right[0]
+        while header != 0:
+            if best_size is None or size[header] < best_size:
+                best_header, best_size = header, size[header]
+                if best_size <= 1:
+                    break
+            header = right[header]
+
+        if best_size == 0:
+            return 0
+
+        count = 0
+        self.cover(best_header)
+        node = down[best_header]
+        while node != best_header:
+            partial_solution.append(self.row_id[node])
+            j = right[node]
+            while j != node:
+                self.cover(column[j])
+                j = right[j]
+
+            count += self.count_solutions(limit - count, partial_solution, first_solution)
+
+            j = self.left[node]
+            while j != node:
+                self.uncover(column[j])
+                j = self.left[j]
+            partial_solution.pop()
+
+            if count >= limit:
+                break
+            node = down[node]
+        self.uncover(best_header)
+
+        return count
+
+
+def get_sudoku_exact_cover_rows(box_size=3):
+    """
+    :return: rows of the exact cover matrix, row (index * size + digit - 1) puts digit into cell index
+    """
+    size = box_size * box_size
+    cells_count = size * size
+    rows = list()
+    for index in range(cells_count):
+        y, x = divmod(index, size)
+        box = (y // box_size) * box_size + x // box_size
+        for digit in range(size):
+            rows.append([
+                index,
+                cells_count + y * size + digit,
+                2 * cells_count + x * size + digit,
+                3 * cells_count + box * size + digit,
+            ])
+    return rows
+
+
+SUDOKU_TEMPLATES = {3: DancingLinks(324, get_sudoku_exact_cover_rows(3))}
+
+
+def get_sudoku_template(box_size):
+    if box_size not in SUDOKU_TEMPLATES:
+        size = box_size * box_size
+        SUDOKU_TEMPLATES[box_size] = DancingLinks(4 * size * size, get_sudoku_exact_cover_rows(box_size))
+    return SUDOKU_TEMPLATES[box_size]
+
+
+def count_sudoku_solutions(digits_grid, limit=2):
+    """
+    Counts solutions of a sudoku puzzle with Dancing Links.
+
+    :param digits_grid: 2D numpy array of shape (n,n), n = 4, 9, 16, 25, ... 0 means empty.
+    :param limit: the search stops as soon as this number of solutions has been found, at least 1
+    :return: (count, solution) where count is at most limit and solution is the first found
+        solved grid (None if count is 0)
+    """
+    if limit < 1:
+        raise ValueError('limit must be at least 1, got {}'.format(limit))
+
+    digits_grid = np.asarray(digits_grid)
+    box_size = Backtrack.get_box_size(digits_grid)
+    size = box_size * box_size
+
+    links = get_sudoku_template(box_size).copy()
+
+    for index, digit in enumerate(digits_grid.ravel().tolist()):
+        if digit == 0:
+            continue
+        if not 1 <= digit <= size or not links.select_row(index * size + digit - 1):
+            return 0, None
+
+    first_solution = list()
+    count = links.count_solutions(limit, first_solution=first_solution)
+    if count == 0:
+        return 0, None
+
+    solution = digits_grid.copy()
+    solution_flat = solution.reshape(-1)
+    for row_id in first_solution:
+        index, digit = divmod(row_id, size)
+        solution_flat[index] = digit + 1
+    return count, solution
@@ -0,0 +1,153 @@
+# Drawing the solution digits onto the frame.
+# Digits 1-9 are rendered once per cell size and rotation into a GlyphAtlas: an array of single channel
+# masks (255 where the glyph fully covers a pixel, anti-aliased edges below). The overlay of a board is
+# put together by copying masks of the solved cells into a mask of the warped board.
+# Only the bounding rectangle of the board is warped back to the frame and composited, so the cost
+# depends on the size of the board, not on the resolution of the frame.
+#
+# A pixel is painted where the warped mask is fully covered, like the original renderer painted
+# pixels whose warped color stayed exactly (0, 200, 0).
+
+from collections import OrderedDict
+
+import numpy as np
+import cv2 as cv
+
+from Frame_workspace import get_buffer
+
+OVERLAY_COLOR = (0, 200, 0)
+
+ROTATIONS = {90: cv.ROTATE_90_COUNTERCLOCKWISE, 180: cv.ROTATE_180, 270: cv.ROTATE_90_CLOCKWISE}
+
+
+class GlyphAtlas:
+    def __init__(self, max_size=16):
+        """
+        :param max_size: maximal number of remembered (cell size, rotation) combinations, the least recently
+            used one is evicted (without the canonical warp the cell size changes with the board)
+        """
+        self.max_size = max_size
+        self.entries = OrderedDict()
+
+    def get_glyphs(self, box_height, box_width, rotation_angle):
+        """
+        :return: uint8 array of shape (10, dimension, dimension), mask of digit d is at index d (0 is blank),
+            dimension is min(box_height, box_width)
+        """
+        key = (box_height, box_width, rotation_angle % 360)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        glyphs = render_glyphs(*key)
+        self.entries[key] = glyphs
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return glyphs
+
+
+def render_glyphs(box_height, box_width, rotation_angle):
+    dimension = min(box_width, box_height)
+    glyphs = np.zeros((10, dimension, dimension), dtype=np.uint8)
+
+    font = cv.FONT_HERSHEY_DUPLEX
+    scale = dimension / 41
+    for digit in range(1, 10):
+        text = str(digit)
+        (text_height, text_width), _ = cv.getTextSize(text, font, fontScale=scale, thickness=3)
+
+        bottom_left_x = box_width // 2 - text_width // 2
+        bottom_left_y = box_height // 2 + text_height // 2
+
+        cv.putText(
+            glyphs[digit], text, (bottom_left_x, bottom_left_y), font, scale, 255, thickness=3, lineType=cv.LINE_AA
+        )
+        if rotation_angle in ROTATIONS:
+            glyphs[digit] = cv.rotate(glyphs[digit], ROTATIONS[rotation_angle])
+    return glyphs
+
+
+SHARED_ATLAS = GlyphAtlas()
+
+
+def get_digits_mask(digits_grid, solution_digits_grid, warp_dimensions, rotation_angle, atlas=SHARED_ATLAS, out=None):
+    """
+    :param warp_dimensions: shape (height, width) of the warped board
+    :param out: uint8 array of shape warp_dimensions the mask is drawn into, a new one by default
+    :return: uint8 mask of shape warp_dimensions with the digits of the solution in the empty cells
+    """
+    if out is None:
+        mask = np.zeros(warp_dimensions[:2], dtype=np.uint8)
+    else:
+        mask = out
+        mask.fill(0)
+
+    rotation_angle = rotation_angle % 360
+    digits_grid = np.rot90(digits_grid, k=int(rotation_angle // 90))
+    solution_digits_grid = np.rot90(solution_digits_grid, k=int(rotation_angle // 90))
+
+    box_height, box_width = warp_dimensions[0] // 9, warp_dimensions[1] // 9
+    glyphs = atlas.get_glyphs(box_height, box_width, rotation_angle)
+    dimension = glyphs.shape[1]
+
+    for y, x in zip(*np.nonzero(digits_grid == 0)):
+        start_y = y * box_height
+        start_x = x * box_width
+        mask[start_y:start_y + dimension, start_x:start_x + dimension] = glyphs[solution_digits_grid[y, x]]
+
+    return mask
+
+
+def get_board_rectangle(warp_matrix, warp_dimensions, frame_shape):
+    """
+    :return: (left, top, right, bottom) of the frame covered by the warped board, None if it is outside
+    """
+    height, width = warp_dimensions[:2]
+    corners = np.float32([[[0, 0]], [[width, 0]], [[0, height]], [[width, height]]])
+    corners = cv.perspectiveTransform(corners, np.linalg.inv(warp_matrix)).reshape((4, 2))
+
+    left, top = np.maximum(np.floor(corners.min(axis=0)).astype(int) - 1, 0)
+    right = min(int(np.ceil(corners[:, 0].max())) + 2, frame_shape[1])
+    bottom = min(int(np.ceil(corners[:, 1].max())) + 2, frame_shape[0])
+    if left >= right or top >= bottom:
+        return None
+    return int(left), int(top), right, bottom
+
+
+def draw_digits_mask(frame, mask, warp_matrix, color=OVERLAY_COLOR, workspace=None):
+    """
+    Paints the digits of mask (in the warped board coordinates) onto frame in place.
+    Only the bounding rectangle of the board is warped and composited.
+
+    :param workspace: Frame_workspace.FrameWorkspace, the warped mask is written into a view of its
+        frame-sized buffers (the rectangle changes its size as the board moves)
+    """
+    rectangle = get_board_rectangle(warp_matrix, mask.shape, frame.shape)
+    if rectangle is None:
+        return frame
+    left, top, right, bottom = rectangle
+
+    # frame pixel (left + u, top + v) is looked up in the mask by warp_matrix
+    shift = np.array([[1, 0, left], [0, 1, top], [0, 0, 1]], dtype=np.float64)
+    warped_mask = get_buffer(workspace, 'warped_digits_mask', frame.shape[:2])
+    if warped_mask is not None:
+        warped_mask = warped_mask[:bottom - top, :right - left]
+    warped_mask = cv.warpPerspective(
+        mask, warp_matrix @ shift, (right - left, bottom - top), dst=warped_mask, flags=cv.WARP_INVERSE_MAP
+    )
+
+    painted = get_buffer(workspace, 'painted_pixels', frame.shape[:2])
+    if painted is not None:
+        painted = painted[:bottom - top, :right - left]
+    painted = cv.compare(warped_mask, 255, cv.CMP_EQ, dst=painted)
+
+    roi = frame[top:bottom, left:right]
+    color_image = get_buffer(workspace, 'overlay_color', frame.shape, frame.dtype)
+    if color_image is None:
+        color_image = np.empty(roi.shape, dtype=frame.dtype)
+    else:
+        color_image = color_image[:bottom - top, :right - left]
+    color_image[:] = color
+    # a masked copy in OpenCV is several times faster than numpy boolean indexing
+    cv.copyTo(color_image, painted, roi)
+    return frame
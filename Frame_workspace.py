@@ -0,0 +1,50 @@
+# Reusable buffers of the vision pipeline.
+# A stream keeps its resolution, so the gray frame, the threshold images, the warped board and the overlay
+# masks have the same shapes on every frame. FrameWorkspace keeps one array per name and hands it out
+# again as long as the shape and type match, the functions of Webcam_preprocess pass it to OpenCV as dst.
+# Without a workspace (None) every call allocates new arrays like before.
+#
+# A buffer is overwritten by the next frame, so nothing taken from a workspace may be kept between frames.
+#
+# workspace = FrameWorkspace((1080, 1920, 3))
+# solver = WebcamSudokuSolver(model, workspace=workspace)
+# solver.solve_into(frame, output_frame)
+
+import numpy as np
+
+
+class FrameWorkspace:
+    def __init__(self, frame_shape=None):
+        """
+        :param frame_shape: shape of the frames of the stream, the frame-sized buffers are allocated
+            right away if it is given (otherwise on the first frame)
+        """
+        self.buffers = dict()
+        self.allocations = 0
+        if frame_shape is not None:
+            for name in ('gray_frame', 'blur_gray_frame', 'threshold_frame'):
+                self.get(name, tuple(frame_shape[:2]))
+
+    def get(self, name, shape, dtype=np.uint8):
+        """
+        :return: array of the given shape and type, the same one as the last time if they haven't changed
+            (its content is undefined)
+        """
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.shape != tuple(shape) or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype=dtype)
+            self.buffers[name] = buffer
+            self.allocations += 1
+        return buffer
+
+    def get_bytes(self):
+        return sum(buffer.nbytes for buffer in self.buffers.values())
+
+
+def get_buffer(workspace, name, shape, dtype=np.uint8):
+    """
+    :return: buffer of workspace or None if there is no workspace (OpenCV allocates a new array for dst=None)
+    """
+    if workspace is None:
+        return None
+    return workspace.get(name, shape, dtype)
@@ -0,0 +1,286 @@
+# Inference backends of the digit classifier.
+# WebcamSudokuSolver only needs an object with predict(inputs) -> (N, 10) probabilities,
+# inputs being a float array of shape (N, 28, 28, 1). Three backends provide it:
+#   'keras'  - the trained .h5 model loaded with TensorFlow (slow to import, hundreds of MB of RAM),
+#   'numpy'  - weights exported once to a plain .npz and a vectorized NumPy forward pass
+#              (Conv2D as im2col + matrix product, MaxPooling2D, Flatten, Dense), no TensorFlow at all,
+#   'opencv' - an ONNX export run by cv.dnn.
+# load_model picks the backend by file extension.
+#
+# Export:  python -m Inference export models/new_model.h5 models/new_model.npz   (needs TensorFlow once)
+# Compare: python -m Inference compare models/new_model.npz models/new_model.h5  (startup and latency)
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import cv2 as cv
+
+BACKENDS = {'.h5': 'keras', '.keras': 'keras', '.npz': 'numpy', '.onnx': 'opencv'}
+
+# layers that do nothing at inference time
+SKIPPED_LAYERS = ('Dropout', 'InputLayer')
+
+
+def load_model(path, backend=None):
+    """
+    :param path: .h5 / .keras (Keras), .npz (export_keras_weights) or .onnx (export_onnx)
+    :param backend: 'keras', 'numpy' or 'opencv', chosen by the extension of path by default
+    :return: model with predict(inputs) -> numpy array of shape (N, 10)
+    """
+    if backend is None:
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in BACKENDS:
+            raise ValueError('unknown model format {}, expected one of {}'.format(extension, ', '.join(BACKENDS)))
+        backend = BACKENDS[extension]
+
+    if backend == 'keras':
+        return load_keras_model(path)
+    if backend == 'numpy':
+        return NumpyModel(path)
+    if backend == 'opencv':
+        return OpenCvDnnModel(path)
+    raise ValueError('unknown backend {}'.format(backend))
+
+
+def load_keras_model(path):
+    # imported here, so the other backends never load TensorFlow
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '3')
+    import tensorflow as tf
+    return tf.keras.models.load_model(path)
+
+
+def export_keras_weights(model, path):
+    """
+    Saves the layers of a Sequential Keras model to a .npz file readable by NumpyModel.
+    """
+    layers = list()
+    arrays = dict()
+    for layer in model.layers:
+        kind = layer.__class__.__name__
+        if kind in SKIPPED_LAYERS:
+            continue
+
+        config = layer.get_config()
+        spec = {'type': kind, 'name': config.get('name', kind)}
+        if kind == 'Conv2D':
+            if tuple(config['strides']) != (1, 1) or config['padding'] != 'valid' or tuple(config['dilation_rate']) != (1, 1):
+                raise ValueError('only Conv2D with stride 1, no dilation and valid padding is supported')
+            spec['activation'] = get_activation(config)
+        elif kind == 'MaxPooling2D':
+            if config['padding'] != 'valid':
+                raise ValueError('only MaxPooling2D with valid padding is supported')
+            spec['pool_size'] = list(config['pool_size'])
+            spec['strides'] = list(config['strides'] or config['pool_size'])
+        elif kind == 'Dense':
+            spec['activation'] = get_activation(config)
+        elif kind == 'Flatten':
+            pass
+        else:
+            raise ValueError('layer {} is not supported by the numpy backend'.format(kind))
+
+        # a layer with use_bias=False has only the kernel, NumpyModel then adds no bias
+        for name, weights in zip(('kernel', 'bias'), layer.get_weights()):
+            arrays['{}_{}'.format(len(layers), name)] = np.asarray(weights, dtype=np.float32)
+        layers.append(spec)
+
+    np.savez(path, layers=np.array(json.dumps(layers)), **arrays)
+
+
+def get_activation(config):
+    """
+    :param config: get_config() of a Conv2D or Dense layer
+    :return: name of its activation, checked at export time so that the .npz never fails in predict
+    """
+    activation = config['activation']
+    if activation not in ACTIVATIONS:
+        raise ValueError('activation {} is not supported by the numpy backend, expected one of {}'.format(
+            activation, ', '.join(ACTIVATIONS)
+        ))
+    return activation
+
+
+def export_onnx(model, path):
+    """
+    Saves a Keras model as ONNX for OpenCvDnnModel (needs tf2onnx).
+    """
+    import tensorflow as tf
+    import tf2onnx
+
+    signature = (tf.TensorSpec((None, 28, 28, 1), tf.float32, name='input'),)
+    tf2onnx.convert.from_keras(model, input_signature=signature, output_path=path)
+
+
+def relu(x):
+    return np.maximum(x, 0, out=x)
+
+
+def softmax(x):
+    x = np.exp(x - x.max(axis=1, keepdims=True))
+    return x / x.sum(axis=1, keepdims=True)
+
+
+ACTIVATIONS = {'relu': relu, 'softmax': softmax, 'linear': lambda x: x}
+
+
+def conv2d(inputs, kernel, bias):
+    """
+    Valid convolution with stride 1 computed as one matrix product (im2col).
+
+    :param inputs: array of shape (N, H, W, C)
+    :param kernel: Keras kernel of shape (kh, kw, C, filters)
+    :param bias: array of shape (filters,) or 0
+    :return: array of shape (N, H - kh + 1, W - kw + 1, filters)
+    """
+    kernel_height, kernel_width, channels, filters = kernel.shape
+    # windows have shape (N, H', W', C, kh, kw), the kernel is ordered (kh, kw, C)
+    windows = np.lib.stride_tricks.sliding_window_view(inputs, (kernel_height, kernel_width), axis=(1, 2))
+    count, height, width = windows.shape[:3]
+    columns = windows.transpose((0, 1, 2, 4, 5, 3)).reshape((-1, kernel_height * kernel_width * channels))
+    outputs = columns @ kernel.reshape((-1, filters))
+    outputs += bias
+    return outputs.reshape((count, height, width, filters))
+
+
+def max_pooling2d(inputs, pool_size, strides):
+    pool_height, pool_width = pool_size
+    if tuple(strides) == tuple(pool_size):
+        count, height, width, channels = inputs.shape
+        height, width = height // pool_height, width // pool_width
+        inputs = inputs[:, :height * pool_height, :width * pool_width]
+        return inputs.reshape((count, height, pool_height, width, pool_width, channels)).max(axis=(2, 4))
+
+    windows = np.lib.stride_tricks.sliding_window_view(inputs, (pool_height, pool_width), axis=(1, 2))
+    return windows[:, ::strides[0], ::strides[1]].max(axis=(4, 5))
+
+
+class NumpyModel:
+    def __init__(self, path):
+        with np.load(path) as data:
+            self.layers = json.loads(str(data['layers']))
+            self.weights = {key: data[key] for key in data.files if key != 'layers'}
+
+    def predict(self, inputs, **kwargs):
+        x = np.asarray(inputs, dtype=np.float32)
+        if x.ndim == 3:
+            x = x[..., None]
+
+        for i, layer in enumerate(self.layers):
+            kind = layer['type']
+            if kind == 'Conv2D':
+                x = ACTIVATIONS[layer['activation']](conv2d(x, self.weights['{}_kernel'.format(i)], self.get_bias(i)))
+            elif kind == 'MaxPooling2D':
+                x = max_pooling2d(x, layer['pool_size'], layer['strides'])
+            elif kind == 'Flatten':
+                x = x.reshape((len(x), -1))
+            elif kind == 'Dense':
+                x = x @ self.weights['{}_kernel'.format(i)] + self.get_bias(i)
+                x = ACTIVATIONS[layer['activation']](x)
+        return x
+
+    def get_bias(self, i):
+        # layers exported with use_bias=False have no bias array
+        return self.weights.get('{}_bias'.format(i), 0)
+
+    def summary(self):
+        for i, layer in enumerate(self.layers):
+            shapes = [self.weights[key].shape for key in ('{}_kernel'.format(i), '{}_bias'.format(i)) if key in self.weights]
+            print('{:<16} {:<14} {}'.format(layer['name'], layer['type'], shapes))
+
+
+class OpenCvDnnModel:
+    def __init__(self, path, channels_last=True):
+        """
+        :param channels_last: True if the network takes (N, 28, 28, 1) like the Keras model (tf2onnx export),
+            False if it takes (N, 1, 28, 28)
+        """
+        self.net = cv.dnn.readNetFromONNX(path)
+        self.channels_last = channels_last
+
+    def predict(self, inputs, **kwargs):
+        x = np.asarray(inputs, dtype=np.float32).reshape((-1, 28, 28, 1))
+        if not self.channels_last:
+            x = x.transpose((0, 3, 1, 2))
+        self.net.setInput(np.ascontiguousarray(x))
+        return np.asarray(self.net.forward()).reshape((len(x), -1))
+
+
+def measure_startup(path, backend=None):
+    """
+    :return: seconds a fresh python process needs to import Inference, load the model and run one digit
+    """
+    code = 'import numpy as np, Inference; Inference.load_model({!r}, {!r}).predict(np.zeros((1, 28, 28, 1)))'.format(
+        path, backend
+    )
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, '-c', code], check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    return time.perf_counter() - start
+
+
+def measure_latency(model, batch_size, repeat=20):
+    """
+    :return: median seconds of one predict call on a batch of batch_size digits
+    """
+    inputs = np.random.default_rng(0).random((batch_size, 28, 28, 1), dtype=np.float32)
+    model.predict(inputs)
+    times = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        model.predict(inputs)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def compare(paths, batch_sizes=(1, 30, 120)):
+    """
+    Prints startup time and latency per batch of every model (batch 120 is 4 rotations of 30 digits).
+    """
+    reference = None
+    for path in paths:
+        model = load_model(path)
+        startup = measure_startup(path)
+        latencies = ['batch {}: {:.2f} ms'.format(size, measure_latency(model, size) * 1e3) for size in batch_sizes]
+
+        inputs = np.random.default_rng(1).random((64, 28, 28, 1), dtype=np.float32)
+        predictions = np.asarray(model.predict(inputs))
+        if reference is None:
+            reference = predictions
+            agreement = ''
+        else:
+            agreement = '  max difference to {}: {:.2e}'.format(
+                os.path.basename(paths[0]), float(np.abs(predictions - reference).max())
+            )
+
+        print('{}  startup: {:.2f} s  {}{}'.format(path, startup, '  '.join(latencies), agreement))
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Export and compare digit classifier backends.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    export_parser = commands.add_parser('export', help='export a Keras model to .npz (numpy) or .onnx (opencv)')
+    export_parser.add_argument('keras_model')
+    export_parser.add_argument('output')
+    compare_parser = commands.add_parser('compare', help='startup time and latency of models')
+    compare_parser.add_argument('models', nargs='+')
+    arguments = parser.parse_args(arguments)
+
+    if arguments.command == 'export':
+        model = load_keras_model(arguments.keras_model)
+        if arguments.output.lower().endswith('.onnx'):
+            export_onnx(model, arguments.output)
+        else:
+            export_keras_weights(model, arguments.output)
+    else:
+        compare(arguments.models)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
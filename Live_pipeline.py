@@ -0,0 +1,240 @@
+# Pipelined live mode: capture -> processing -> display run in separate threads.
+# Model inference runs in the processing thread, which is the worker of the solver: every step after the
+# model (rotations, solving, drawing) needs its predictions, so a thread of its own would only add a hand-off.
+# Stages are connected by LatestFrameQueue: a bounded queue that drops the oldest frame when it is full,
+# so a slow stage never makes the camera buffer (and the latency) grow, it just skips frames.
+# The runner reports end-to-end latency (capture -> display) and how many frames were dropped where.
+# Output frames are recycled: the processing thread solves into a frame that has been displayed
+# (or dropped) already, so a stream of one resolution stops allocating output frames after a few frames.
+#
+# Any iterable of frames works as a source, so it runs headless on a video file or synthetic frames:
+# pipeline = LivePipeline(WebcamSudokuSolver(model))
+# stats = pipeline.run(read_video(cv.VideoCapture('board.mp4')), frame_rate=30)
+# stats.report(sys.stdout)
+
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class LatestFrameQueue:
+    def __init__(self, max_size=1, on_drop=None):
+        """
+        :param on_drop: function called with every dropped item
+        """
+        self.max_size = max_size
+        self.on_drop = on_drop
+        self.items = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        """
+        Adds an item, the oldest one is dropped if the queue is full.
+        """
+        with self.condition:
+            dropped_item = None
+            if len(self.items) >= self.max_size:
+                dropped_item = self.items.popleft()
+                self.dropped += 1
+            self.items.append(item)
+            self.condition.notify()
+        if dropped_item is not None and self.on_drop is not None:
+            self.on_drop(dropped_item)
+
+    def get(self):
+        """
+        Waits for an item.
+
+        :return: the oldest item or None if the queue has been closed and is empty
+        """
+        with self.condition:
+            while not self.items and not self.closed:
+                self.condition.wait()
+            if not self.items:
+                return None
+            return self.items.popleft()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+def read_video(capture):
+    """
+    :param capture: cv.VideoCapture of a camera, stream or video file
+    :return: generator of frames, the capture is released when it ends
+    """
+    try:
+        while capture.isOpened():
+            successful_frame_read, frame = capture.read()
+            if not successful_frame_read:
+                break
+            yield frame
+    finally:
+        capture.release()
+
+
+class PipelineStats:
+    def __init__(self, window_size=1000):
+        self.start = time.perf_counter()
+        self.seconds = 0.0
+        self.captured = 0
+        self.processed = 0
+        self.displayed = 0
+        self.dropped_before_processing = 0
+        self.dropped_before_display = 0
+        self.latencies = deque(maxlen=window_size)
+        self.processing_times = deque(maxlen=window_size)
+
+    def get_latency_percentile(self, percentile):
+        """
+        :return: percentile of the end-to-end latency (capture -> display) over the last frames in seconds
+        """
+        if len(self.latencies) == 0:
+            return 0.0
+        return float(np.percentile(self.latencies, percentile))
+
+    def report(self, stream):
+        seconds = self.seconds or time.perf_counter() - self.start
+        print('frames captured: {}  processed: {}  displayed: {}'.format(
+            self.captured, self.processed, self.displayed
+        ), file=stream)
+        print('dropped before processing: {}  before display: {}'.format(
+            self.dropped_before_processing, self.dropped_before_display
+        ), file=stream)
+        print('displayed frames / second: {:.1f}'.format(self.displayed / seconds if seconds else 0), file=stream)
+        print('latency p50: {:.1f} ms  p99: {:.1f} ms  processing p50: {:.1f} ms'.format(
+            self.get_latency_percentile(50) * 1e3, self.get_latency_percentile(99) * 1e3,
+            float(np.median(self.processing_times)) * 1e3 if self.processing_times else 0.0
+        ), file=stream)
+
+
+class LivePipeline:
+    def __init__(self, webcam_sudoku_solver, queue_size=1):
+        """
+        :param webcam_sudoku_solver: WebcamSudokuSolver, it (and its model) is used by the processing thread only
+        :param queue_size: capacity of the queues between stages, 1 means always the latest frame
+        """
+        self.solver = webcam_sudoku_solver
+        self.queue_size = queue_size
+        self.stop_event = threading.Event()
+        self.errors = list()
+        # output frames that can be written again (deque is thread-safe for append and pop)
+        self.free_frames = deque()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def capture(self, frames, capture_queue, stats, frame_rate):
+        try:
+            frame_interval = 1 / frame_rate if frame_rate else 0
+            next_frame_time = time.perf_counter()
+            for frame in frames:
+                if self.stop_event.is_set():
+                    break
+                if frame is None:
+                    continue
+                stats.captured += 1
+                capture_queue.put((time.perf_counter(), frame))
+
+                if frame_interval:
+                    # a file or a generator would be read as fast as possible, pace it like a camera
+                    next_frame_time += frame_interval
+                    delay = next_frame_time - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+        except Exception as error:
+            self.errors.append(error)
+        finally:
+            # a generator (e.g. read_video) releases its source right away
+            if hasattr(frames, 'close'):
+                frames.close()
+            capture_queue.close()
+
+    def process(self, capture_queue, output_queue, stats):
+        try:
+            while not self.stop_event.is_set():
+                item = capture_queue.get()
+                if item is None:
+                    break
+                capture_time, frame = item
+
+                output_frame = self.free_frames.pop() if self.free_frames else None
+                if output_frame is None or output_frame.shape != frame.shape or output_frame.dtype != frame.dtype:
+                    output_frame = np.empty_like(frame)
+
+                start = time.perf_counter()
+                self.solver.solve_into(frame, output_frame)
+                stats.processing_times.append(time.perf_counter() - start)
+                stats.processed += 1
+
+                output_queue.put((capture_time, output_frame))
+        except Exception as error:
+            self.errors.append(error)
+            self.stop_event.set()
+        finally:
+            output_queue.close()
+
+    def run(self, frames, display=None, frame_rate=None):
+        """
+        Runs until frames end, display returns False or stop is called.
+        Display runs in the calling thread (cv.imshow has to stay in the main thread).
+
+        :param frames: iterable of BGR frames (None items are skipped)
+        :param display: function that takes an output frame and returns False to stop, None runs headless
+            (the frame is written again later, a display that keeps it has to copy it)
+        :param frame_rate: if given, frames are taken from the iterable at most this many times per second
+        :return: PipelineStats
+        """
+        self.stop_event.clear()
+        self.errors = list()
+        stats = PipelineStats()
+        capture_queue = LatestFrameQueue(self.queue_size)
+        output_queue = LatestFrameQueue(self.queue_size, on_drop=lambda item: self.free_frames.append(item[1]))
+
+        threads = [
+            threading.Thread(
+                target=self.capture, args=(frames, capture_queue, stats, frame_rate), name='capture', daemon=True
+            ),
+            threading.Thread(target=self.process, args=(capture_queue, output_queue, stats), name='process', daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                item = output_queue.get()
+                if item is None:
+                    break
+                capture_time, output_frame = item
+
+                if display is not None and display(output_frame) is False:
+                    self.stop()
+                stats.latencies.append(time.perf_counter() - capture_time)
+                stats.displayed += 1
+                # display is done with the frame, the processing thread may write the next result into it
+                self.free_frames.append(output_frame)
+
+                if self.stop_event.is_set():
+                    break
+        finally:
+            self.stop()
+            # unblock the processing thread if it waits for a frame
+            capture_queue.close()
+            for thread in threads:
+                thread.join()
+            # e.g. PrometheusTextFile writes the frames of its last interval
+            self.solver.metrics.close()
+
+        stats.seconds = time.perf_counter() - stats.start
+        stats.dropped_before_processing = capture_queue.dropped
+        stats.dropped_before_display = output_queue.dropped
+
+        if self.errors:
+            raise self.errors[0]
+        return stats
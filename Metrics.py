@@ -0,0 +1,268 @@
+# Per-frame instrumentation of WebcamSudokuSolver.
+# Every call of solve fills a FrameRecord: time spent in each stage (seconds), counters
+# (rotation attempts, cache hits, solve failures, ...), structured events (e.g. a digit recognized
+# with low probability) and the outcome of the frame. Finished records are passed to sinks,
+# a sink is any callable that takes a FrameRecord:
+#   a plain function (callback),
+#   RollingHistogram - keeps the last frames in memory and gives percentiles of every stage,
+#   PrometheusTextFile - writes counters and latency histograms in the Prometheus text format
+#                        (for node_exporter's textfile collector).
+# SolverMetrics.close closes the sinks that need it (LivePipeline calls it when it stops).
+#
+# Metrics are disabled by default. Then start_frame returns NULL_RECORD whose methods do nothing,
+# so the solver pays one method call per stage.
+#
+# metrics = Metrics.SolverMetrics([Metrics.RollingHistogram(), Metrics.PrometheusTextFile('sudoku.prom')])
+# solver = WebcamSudokuSolver(model, metrics=metrics)
+
+import os
+import time
+from collections import deque
+
+import numpy as np
+
+# upper bounds (seconds) of the latency histogram buckets written to the Prometheus file
+PROMETHEUS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# counters of WebcamSudokuSolver, exported as 0 before they happen for the first time
+COUNTERS = (
+    'model_calls', 'rotation_attempts', 'rejected_predictions', 'cache_hits', 'cache_misses', 'solve_failures',
+    'last_solution_reused', 'tracked_frames', 'tracking_lost', 'recovered_boards', 'recovery_failures',
+)
+
+
+class FrameRecord:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.last_lap = self.start
+        self.total = 0.0
+        self.stages = dict()
+        self.counters = dict()
+        self.events = list()
+        self.outcome = None
+
+    def lap(self, stage):
+        """
+        Adds the time passed since the previous lap (or the start of the frame) to the stage.
+        Stages that run several times per frame (e.g. predict) are summed up.
+        """
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self.last_lap
+        self.last_lap = now
+
+    def count(self, counter, value=1):
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def event(self, name, **fields):
+        self.events.append((name, fields))
+
+    def finish(self):
+        self.total = time.perf_counter() - self.start
+
+
+class NullFrameRecord:
+    """
+    Record used when metrics are disabled, everything it is told is forgotten.
+    NULL_RECORD is shared by all solvers and threads, so it has no state at all: setting outcome does nothing.
+    """
+    __slots__ = ()
+
+    @property
+    def outcome(self):
+        return None
+
+    @outcome.setter
+    def outcome(self, outcome):
+        pass
+
+    def lap(self, stage):
+        pass
+
+    def count(self, counter, value=1):
+        pass
+
+    def event(self, name, **fields):
+        pass
+
+    def finish(self):
+        pass
+
+
+NULL_RECORD = NullFrameRecord()
+
+
+class SolverMetrics:
+    def __init__(self, sinks=None, enabled=True):
+        """
+        :param sinks: list of callables that receive every finished FrameRecord
+        :param enabled: if False, solver pays (almost) nothing and sinks are never called
+        """
+        self.sinks = list(sinks) if sinks is not None else list()
+        self.enabled = enabled
+        self.frames = 0
+        self.counters = dict()
+        self.outcomes = dict()
+
+    def start_frame(self):
+        return FrameRecord() if self.enabled else NULL_RECORD
+
+    def finish_frame(self, record):
+        if record is NULL_RECORD:
+            return
+        record.finish()
+
+        self.frames += 1
+        for counter, value in record.counters.items():
+            self.counters[counter] = self.counters.get(counter, 0) + value
+        self.outcomes[record.outcome] = self.outcomes.get(record.outcome, 0) + 1
+
+        for sink in self.sinks:
+            sink(record)
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def close(self):
+        """
+        Closes the sinks that have a close method (PrometheusTextFile writes what it hasn't written yet).
+        """
+        for sink in self.sinks:
+            if hasattr(sink, 'close'):
+                sink.close()
+
+    def get_stats(self):
+        return {'frames': self.frames, 'counters': dict(self.counters), 'outcomes': dict(self.outcomes)}
+
+
+DISABLED = SolverMetrics(enabled=False)
+
+
+class RollingHistogram:
+    """
+    Sink that remembers stage timings of the last window_size frames.
+    """
+
+    def __init__(self, window_size=300):
+        self.window_size = window_size
+        self.stages = dict()
+        self.totals = deque(maxlen=window_size)
+
+    def __call__(self, record):
+        self.totals.append(record.total)
+        for stage, seconds in record.stages.items():
+            if stage not in self.stages:
+                self.stages[stage] = deque(maxlen=self.window_size)
+            self.stages[stage].append(seconds)
+
+    def get_percentile(self, percentile, stage=None):
+        """
+        :param stage: name of a stage, None means the whole frame
+        :return: percentile of the stage time over the window in seconds (0.0 if the stage hasn't run)
+        """
+        values = self.totals if stage is None else self.stages.get(stage, ())
+        if len(values) == 0:
+            return 0.0
+        return float(np.percentile(values, percentile))
+
+    def get_summary(self, percentiles=(50, 90, 99)):
+        """
+        :return: dict stage -> dict percentile -> seconds, the whole frame is under 'total'
+        """
+        summary = {'total': {p: self.get_percentile(p) for p in percentiles}}
+        for stage in self.stages:
+            summary[stage] = {p: self.get_percentile(p, stage) for p in percentiles}
+        return summary
+
+
+class PrometheusTextFile:
+    """
+    Sink that keeps cumulative counters and stage latency histograms and rewrites a file in the
+    Prometheus text exposition format at most once per interval seconds.
+    The file is replaced atomically, so a scraper never reads half of it.
+    """
+
+    def __init__(self, path, interval=5.0, prefix='sudoku_solver'):
+        self.path = path
+        self.interval = interval
+        self.prefix = prefix
+        self.last_write = None
+
+        self.frames = 0
+        # frames in the file when it has been written last
+        self.written_frames = None
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.events = dict()
+        self.outcomes = dict()
+        # stage -> (bucket counts, sum, count)
+        self.histograms = dict()
+
+    def __call__(self, record):
+        self.frames += 1
+        for counter, value in record.counters.items():
+            self.counters[counter] = self.counters.get(counter, 0) + value
+        for name, _ in record.events:
+            self.events[name] = self.events.get(name, 0) + 1
+        self.outcomes[record.outcome] = self.outcomes.get(record.outcome, 0) + 1
+
+        self.observe('total', record.total)
+        for stage, seconds in record.stages.items():
+            self.observe(stage, seconds)
+
+        now = time.monotonic()
+        if self.last_write is None or now - self.last_write >= self.interval:
+            self.write()
+            self.last_write = now
+
+    def observe(self, stage, seconds):
+        if stage not in self.histograms:
+            self.histograms[stage] = [[0] * len(PROMETHEUS_BUCKETS), 0.0, 0]
+        histogram = self.histograms[stage]
+        for i, bound in enumerate(PROMETHEUS_BUCKETS):
+            if seconds <= bound:
+                histogram[0][i] += 1
+        histogram[1] += seconds
+        histogram[2] += 1
+
+    def get_text(self):
+        prefix = self.prefix
+        lines = [
+            '# TYPE {}_frames_total counter'.format(prefix),
+            '{}_frames_total {}'.format(prefix, self.frames),
+        ]
+
+        for counter in sorted(self.counters):
+            lines.append('# TYPE {}_{}_total counter'.format(prefix, counter))
+            lines.append('{}_{}_total {}'.format(prefix, counter, self.counters[counter]))
+
+        lines.append('# TYPE {}_outcomes_total counter'.format(prefix))
+        for outcome in sorted(self.outcomes, key=str):
+            lines.append('{}_outcomes_total{{outcome="{}"}} {}'.format(prefix, outcome, self.outcomes[outcome]))
+
+        lines.append('# TYPE {}_events_total counter'.format(prefix))
+        for name in sorted(self.events):
+            lines.append('{}_events_total{{event="{}"}} {}'.format(prefix, name, self.events[name]))
+
+        lines.append('# TYPE {}_stage_seconds histogram'.format(prefix))
+        for stage in sorted(self.histograms):
+            buckets, seconds_sum, count = self.histograms[stage]
+            for bound, bucket_count in zip(PROMETHEUS_BUCKETS, buckets):
+                lines.append('{}_stage_seconds_bucket{{stage="{}",le="{}"}} {}'.format(prefix, stage, bound, bucket_count))
+            lines.append('{}_stage_seconds_bucket{{stage="{}",le="+Inf"}} {}'.format(prefix, stage, count))
+            lines.append('{}_stage_seconds_sum{{stage="{}"}} {:.9f}'.format(prefix, stage, seconds_sum))
+            lines.append('{}_stage_seconds_count{{stage="{}"}} {}'.format(prefix, stage, count))
+
+        return '\n'.join(lines) + '\n'
+
+    def close(self):
+        """
+        Writes the file once more if frames came after the last write, so the last interval isn't lost on shutdown.
+        """
+        if self.frames != self.written_frames:
+            self.write()
+
+    def write(self):
+        self.written_frames = self.frames
+        temporary_path = self.path + '.tmp'
+        with open(temporary_path, 'w') as file:
+            file.write(self.get_text())
+        os.replace(temporary_path, self.path)
@@ -0,0 +1,261 @@
+# Offline processing of recorded video files, faster than real time.
+# The video is split into chunks of consecutive frames that worker processes solve in parallel, every worker
+# with its own model and WebcamSudokuSolver. A worker opens the file itself and seeks to its chunk, so only
+# the annotated frames travel between processes.
+# Warm start: before its chunk a worker solves the warm_up frames preceding it (without output), so the state
+# the solver carries from frame to frame (last_sudoku_solution and its rotation, the board region of
+# multiscale detection, the tracker) is there at the chunk boundary like in one long sequential run.
+# The annotated chunks go to a cv.VideoWriter in order: chunks finished early wait in the reorder buffer
+# (the futures of the chunks in flight), at most max_pending chunks are in flight, so memory stays bounded
+# by about max_pending * chunk_size frames (by default (workers + 2) * 32, 2 GB of 1080p frames on 8 cores).
+# The output is the same for any number of workers (it depends on chunk_size and warm_up).
+# Statistics (frames, outcomes, frames / second, speed against real time) go to stderr.
+#
+# Usage: python -m Offline_video session.mp4 -o annotated.mp4 --model models/new_model.npz
+#        python -m Offline_video session.mp4 -o annotated.avi --fourcc MJPG --workers 8 --chunk-size 64 --track
+
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import cv2 as cv
+
+import Board_tracking
+import Frame_workspace
+import Inference
+import Metrics
+import Solution_cache
+import Webcam_preprocess
+
+# state of the worker process, created by init_worker
+solver = None
+capture = None
+video_path = None
+warm_up_frames = 0
+# FrameRecords of the frames of the current chunk, filled by the metrics sink of the solver
+records = list()
+
+
+def init_worker(path, model_path, backend=None, warm_up=4, multiscale_detection=False, track=False):
+    """
+    Runs once in every worker process: loads the model, creates the solver and opens the video.
+    """
+    global solver, capture, video_path, warm_up_frames
+    cv.setNumThreads(1)
+
+    model = Inference.load_model(model_path, backend)
+    solver = Webcam_preprocess.WebcamSudokuSolver(
+        model, Solution_cache.SolutionCache(), metrics=Metrics.SolverMetrics([records.append]),
+        tracker=Board_tracking.BoardTracker() if track else None, multiscale_detection=multiscale_detection,
+        workspace=Frame_workspace.FrameWorkspace()
+    )
+    video_path = path
+    capture = cv.VideoCapture(path)
+    warm_up_frames = warm_up
+
+
+def seek(index):
+    """
+    Moves the capture of the worker to frame index. Seeking isn't frame-exact with every codec,
+    so if the capture ends up elsewhere the file is read from the beginning.
+    """
+    global capture
+    if int(capture.get(cv.CAP_PROP_POS_FRAMES)) == index:
+        return
+    capture.set(cv.CAP_PROP_POS_FRAMES, index)
+    if int(capture.get(cv.CAP_PROP_POS_FRAMES)) == index:
+        return
+
+    capture.release()
+    capture = cv.VideoCapture(video_path)
+    for _ in range(index):
+        if not capture.grab():
+            break
+
+
+def process_chunk(start, count):
+    """
+    Runs in a worker process.
+
+    :return: (frames, outcomes, counters) where frames is a uint8 array of shape (n, height, width, 3) with the
+        annotated frames start .. start + n - 1 (n < count at the end of the video), outcomes is a dict
+        outcome -> number of frames and counters are the summed counters of the solver (see Metrics.py)
+    """
+    first = max(0, start - warm_up_frames)
+    seek(first)
+
+    # every chunk starts from scratch, only its own warm-up frames may teach the solver anything
+    solver.reset()
+    warm_up_frame = None
+    frames = None
+    solved = 0
+    for index in range(first, start + count):
+        successful_frame_read, frame = capture.read()
+        if not successful_frame_read:
+            break
+        if index < start:
+            if warm_up_frame is None or warm_up_frame.shape != frame.shape:
+                warm_up_frame = np.empty_like(frame)
+            solver.solve_into(frame, warm_up_frame)
+            continue
+
+        if frames is None:
+            records.clear()
+            frames = np.empty((count,) + frame.shape, dtype=frame.dtype)
+        solver.solve_into(frame, frames[solved])
+        solved += 1
+
+    outcomes = dict()
+    counters = dict()
+    if frames is not None:
+        for record in records:
+            outcomes[record.outcome] = outcomes.get(record.outcome, 0) + 1
+            for counter, value in record.counters.items():
+                counters[counter] = counters.get(counter, 0) + value
+    records.clear()
+
+    frames = frames[:solved] if frames is not None else np.zeros((0, 0, 0, 3), dtype=np.uint8)
+    return frames, outcomes, counters
+
+
+class VideoStats:
+    def __init__(self, frame_rate):
+        self.start = time.perf_counter()
+        self.frame_rate = frame_rate
+        self.frames = 0
+        self.outcomes = dict()
+        self.counters = dict()
+        self.max_buffered_frames = 0
+
+    def add(self, frames, outcomes, counters):
+        self.frames += len(frames)
+        for outcome, count in outcomes.items():
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + count
+        for counter, value in counters.items():
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def report(self, stream):
+        seconds = time.perf_counter() - self.start
+        print('frames: {}  {}'.format(
+            self.frames, '  '.join('{}: {}'.format(outcome, count) for outcome, count in sorted(self.outcomes.items(), key=str))
+        ), file=stream)
+        print('last solution reused: {}  tracked frames: {}  model calls: {}'.format(
+            self.counters.get('last_solution_reused', 0), self.counters.get('tracked_frames', 0),
+            self.counters.get('model_calls', 0)
+        ), file=stream)
+        frames_per_second = self.frames / seconds if seconds else 0
+        print('time: {:.2f} s  frames / second: {:.1f}  {:.1f}x real time  max buffered frames: {}'.format(
+            seconds, frames_per_second, frames_per_second / self.frame_rate if self.frame_rate else 0,
+            self.max_buffered_frames
+        ), file=stream)
+
+
+def get_video_properties(path):
+    """
+    :return: (frame rate, (width, height), frame count), the count is 0 if the container doesn't know it
+    """
+    video = cv.VideoCapture(path)
+    if not video.isOpened():
+        raise ValueError('cannot open video {}'.format(path))
+    properties = (
+        video.get(cv.CAP_PROP_FPS) or 30.0,
+        (int(video.get(cv.CAP_PROP_FRAME_WIDTH)), int(video.get(cv.CAP_PROP_FRAME_HEIGHT))),
+        max(int(video.get(cv.CAP_PROP_FRAME_COUNT)), 0),
+    )
+    video.release()
+    return properties
+
+
+def process_video(path, output_path, model_path, backend=None, fourcc='mp4v', warm_up=4, multiscale_detection=False,
+                  track=False, workers=None, chunk_size=32, max_pending=None):
+    """
+    Solves every frame of the video at path and writes the annotated frames to output_path in order.
+
+    :param fourcc: four character code of the codec of the output
+    :param warm_up: number of frames solved without output before every chunk
+    :param workers: number of worker processes (os.cpu_count() by default), 0 solves in this process
+    :param chunk_size: number of consecutive frames a worker solves at once
+    :param max_pending: maximal number of chunks in flight (workers + 2 by default: one chunk per worker and
+        two more, so the writer always has the next chunk ready)
+    :return: VideoStats
+    """
+    frame_rate, frame_size, frame_count = get_video_properties(path)
+    writer = cv.VideoWriter(output_path, cv.VideoWriter_fourcc(*fourcc), frame_rate, frame_size)
+    if not writer.isOpened():
+        raise ValueError('cannot write video {} with codec {}'.format(output_path, fourcc))
+
+    stats = VideoStats(frame_rate)
+    initargs = (path, model_path, backend, warm_up, multiscale_detection, track)
+
+    def write(result):
+        """
+        :return: True if the chunk is the last one (shorter than chunk_size)
+        """
+        frames, outcomes, counters = result
+        stats.add(frames, outcomes, counters)
+        for frame in frames:
+            writer.write(frame)
+        return len(frames) < chunk_size
+
+    try:
+        if workers == 0:
+            init_worker(*initargs)
+            stats.max_buffered_frames = chunk_size
+            start = 0
+            while not write(process_chunk(start, chunk_size)):
+                start += chunk_size
+            return stats
+
+        workers = workers or os.cpu_count() or 1
+        max_pending = max_pending or workers + 2
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=initargs) as executor:
+            pending = deque()
+            start = 0
+            ended = False
+            while not ended:
+                # the frame count of the container is only a hint: past it, one more chunk at a time is
+                # asked for until a chunk comes back short
+                while len(pending) < max_pending and (frame_count == 0 or start < frame_count or not pending):
+                    pending.append(executor.submit(process_chunk, start, chunk_size))
+                    start += chunk_size
+                stats.max_buffered_frames = max(stats.max_buffered_frames, len(pending) * chunk_size)
+                ended = write(pending.popleft().result())
+            for future in pending:
+                future.cancel()
+    finally:
+        writer.release()
+
+    return stats
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Solve sudoku boards in a recorded video, faster than real time.')
+    parser.add_argument('input', help='video file')
+    parser.add_argument('-o', '--output', required=True, help='annotated video file')
+    parser.add_argument('--model', default=os.path.join('models', 'new_model.npz'),
+                        help='digit classifier (.npz, .onnx or .h5, see Inference.py)')
+    parser.add_argument('--backend', default=None, help='keras, numpy or opencv, by the model extension by default')
+    parser.add_argument('--fourcc', default='mp4v', help='codec of the output (mp4v by default)')
+    parser.add_argument('--warm-up', type=int, default=4, help='frames solved without output before every chunk')
+    parser.add_argument('--multiscale', action='store_true', help='coarse to fine board detection (high resolutions)')
+    parser.add_argument('--track', action='store_true', help='follow a solved board with Board_tracking')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes, all cores by default, 0 = no pool')
+    parser.add_argument('--chunk-size', type=int, default=32, help='consecutive frames per chunk')
+    parser.add_argument('--max-pending', type=int, default=None, help='chunks in flight, workers + 2 by default')
+    arguments = parser.parse_args(arguments)
+
+    stats = process_video(
+        arguments.input, arguments.output, arguments.model, arguments.backend, arguments.fourcc, arguments.warm_up,
+        arguments.multiscale, arguments.track, arguments.workers, arguments.chunk_size, arguments.max_pending
+    )
+    stats.report(sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,208 @@
+# Compact binary format for big corpora of 9x9 puzzles.
+#
+# Layout (little-endian):
+#   header, 32 bytes: magic b'SUDOKUPK', version (uint16), flags (uint16), reserved (uint32),
+#                     count (uint64), 8 reserved bytes
+#   puzzles:      count * 41 bytes, 81 cells packed 4 bits each (even cell in the high nibble), last nibble is 0
+#   solutions:    count * 41 bytes, the same packing (only if flags & HAS_SOLUTIONS)
+#   difficulties: count * 1 byte (only if flags & HAS_DIFFICULTIES)
+#
+# Columns are stored one after another, so the reader maps the file with np.memmap
+# and unpacks only the slices that are asked for.
+
+import os
+import shutil
+import struct
+import tempfile
+
+import numpy as np
+
+MAGIC = b'SUDOKUPK'
+VERSION = 1
+HEADER = struct.Struct('<8sHHIQ8x')
+PACKED_SIZE = 41
+
+HAS_SOLUTIONS = 1
+HAS_DIFFICULTIES = 2
+
+
+def pack_grids(grids):
+    """
+    :param grids: numpy array of shape (N, 9, 9) with digits 0..9
+    :return: uint8 array of shape (N, 41)
+    """
+    grids = np.asarray(grids, dtype=np.uint8).reshape((-1, 81))
+    nibbles = np.zeros((len(grids), 2 * PACKED_SIZE), dtype=np.uint8)
+    nibbles[:, :81] = grids
+    return (nibbles[:, 0::2] << 4) | nibbles[:, 1::2]
+
+
+def unpack_grids(packed):
+    """
+    :param packed: uint8 array of shape (N, 41)
+    :return: uint8 array of shape (N, 9, 9)
+    """
+    packed = np.asarray(packed, dtype=np.uint8)
+    nibbles = np.empty((len(packed), 2 * PACKED_SIZE), dtype=np.uint8)
+    nibbles[:, 0::2] = packed >> 4
+    nibbles[:, 1::2] = packed & 0x0F
+    return nibbles[:, :81].reshape((-1, 9, 9))
+
+
+def unpack_selection(packed, key):
+    if isinstance(key, slice):
+        return unpack_grids(packed[key])
+    index = range(len(packed))[key]
+    return unpack_grids(packed[index:index + 1])[0]
+
+
+class CorpusWriter:
+    """
+    Writes a corpus chunk by chunk, so it doesn't have to fit in memory.
+    Solutions and difficulties are kept in temporary files and appended on close.
+
+    with CorpusWriter('puzzles.sdk', with_solutions=True) as writer:
+        writer.write(puzzles, solutions)
+    """
+
+    def __init__(self, path, with_solutions=False, with_difficulties=False):
+        self.path = path
+        self.flags = (HAS_SOLUTIONS if with_solutions else 0) | (HAS_DIFFICULTIES if with_difficulties else 0)
+        self.count = 0
+
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, self.flags, 0, 0))
+        self.solutions_file = tempfile.TemporaryFile() if with_solutions else None
+        self.difficulties_file = tempfile.TemporaryFile() if with_difficulties else None
+
+    def write(self, puzzles, solutions=None, difficulties=None):
+        """
+        :param puzzles: numpy array of shape (N, 9, 9)
+        :param solutions: numpy array of shape (N, 9, 9), required if the corpus has solutions
+        :param difficulties: numpy array of shape (N,) with values 0..255, required if the corpus has difficulties
+        """
+        puzzles = np.asarray(puzzles).reshape((-1, 9, 9))
+        if (solutions is None) == bool(self.flags & HAS_SOLUTIONS):
+            raise ValueError('solutions must be given if and only if the corpus has solutions')
+        if (difficulties is None) == bool(self.flags & HAS_DIFFICULTIES):
+            raise ValueError('difficulties must be given if and only if the corpus has difficulties')
+
+        # everything is converted before the first byte is written, so a bad chunk leaves the columns aligned
+        packed_puzzles = pack_grids(puzzles).tobytes()
+        if solutions is not None:
+            packed_solutions = pack_grids(np.asarray(solutions).reshape(puzzles.shape)).tobytes()
+        if difficulties is not None:
+            difficulties = np.asarray(difficulties, dtype=np.uint8).reshape(len(puzzles)).tobytes()
+
+        self.file.write(packed_puzzles)
+        if solutions is not None:
+            self.solutions_file.write(packed_solutions)
+        if difficulties is not None:
+            self.difficulties_file.write(difficulties)
+        self.count += len(puzzles)
+
+    def close(self):
+        if self.file.closed:
+            return
+        for column in (self.solutions_file, self.difficulties_file):
+            if column is not None:
+                column.seek(0)
+                shutil.copyfileobj(column, self.file)
+                column.close()
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, self.flags, 0, self.count))
+        self.file.close()
+
+    def abort(self):
+        """
+        Closes the files without writing the header and removes the corpus, for a writer that has failed.
+        The count in the header stays 0 until close, so a corpus left behind by a crash is never read as complete.
+        """
+        if self.file.closed:
+            return
+        for column in (self.solutions_file, self.difficulties_file):
+            if column is not None:
+                column.close()
+        self.file.close()
+        os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def write_corpus(path, puzzles, solutions=None, difficulties=None):
+    with CorpusWriter(path, solutions is not None, difficulties is not None) as writer:
+        writer.write(puzzles, solutions, difficulties)
+
+
+class Corpus:
+    """
+    Memory-mapped reader. Indexing unpacks only the requested puzzles:
+    corpus[i] is a (9, 9) uint8 grid for Backtrack.solve_sudoku,
+    corpus[start:stop] is an (N, 9, 9) uint8 stack for Backtrack.solve_many.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            header = file.read(HEADER.size)
+        if len(header) != HEADER.size:
+            raise ValueError('{} is not a puzzle corpus (too short)'.format(path))
+
+        magic, version, flags, _, count = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError('{} is not a puzzle corpus'.format(path))
+        if version != VERSION:
+            raise ValueError('unsupported puzzle corpus version {}'.format(version))
+
+        expected_size = HEADER.size + count * PACKED_SIZE
+        expected_size += count * PACKED_SIZE if flags & HAS_SOLUTIONS else 0
+        expected_size += count if flags & HAS_DIFFICULTIES else 0
+        if os.path.getsize(path) != expected_size:
+            raise ValueError('{} is truncated or corrupted'.format(path))
+
+        self.path = path
+        self.count = count
+        self.flags = flags
+
+        data = np.memmap(path, dtype=np.uint8, mode='r') if count else np.zeros(expected_size, dtype=np.uint8)
+        offset = HEADER.size
+        self.packed_puzzles = data[offset:offset + count * PACKED_SIZE].reshape((count, PACKED_SIZE))
+        offset += count * PACKED_SIZE
+
+        self.packed_solutions = None
+        if flags & HAS_SOLUTIONS:
+            self.packed_solutions = data[offset:offset + count * PACKED_SIZE].reshape((count, PACKED_SIZE))
+            offset += count * PACKED_SIZE
+
+        self.difficulties = data[offset:offset + count] if flags & HAS_DIFFICULTIES else None
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, key):
+        return self.get_puzzles(key)
+
+    def get_puzzles(self, key):
+        """
+        :param key: index or slice
+        :return: uint8 array of shape (9, 9) for an index, (N, 9, 9) for a slice
+        """
+        return unpack_selection(self.packed_puzzles, key)
+
+    def get_solutions(self, key):
+        if self.packed_solutions is None:
+            raise ValueError('{} has no solutions'.format(self.path))
+        return unpack_selection(self.packed_solutions, key)
+
+    def iter_chunks(self, chunk_size=65536):
+        """
+        :return: generator of (start, puzzles) where puzzles is an (N, 9, 9) stack of at most chunk_size puzzles
+        """
+        for start in range(0, self.count, chunk_size):
+            yield start, self.get_puzzles(slice(start, start + chunk_size))
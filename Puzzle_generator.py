@@ -0,0 +1,358 @@
+# Generator of uniquely solvable 9x9 puzzles graded by difficulty.
+# A random complete grid is made by filling the three diagonal boxes with random permutations (they don't
+# see each other), completing the grid with the bitmask engine of Backtrack and shuffling the result by a random
+# transformation of Solution_cache (rotation / reflection, bands, stacks) and a random relabeling of digits.
+# Clues are then removed in random order, a removal is undone if the puzzle stops being unique.
+# Uniqueness is checked with early exit: the removed clue is forbidden in its cell and the search stops
+# at the first solution of the rest (there is another solution iff it finds one), which is cheaper than
+# counting two solutions. The resulting puzzles are minimal (no clue can be removed).
+#
+# The difficulty is the hardest technique of Strategies.STRATEGIES the solver needs (techniques run
+# cheapest-first, so a technique that eliminates anything was needed), the level is its position in the
+# pipeline + 1, 0 means naked singles are enough and the last level means the search was needed.
+# Levels are grouped into classes, see DIFFICULTY_CLASSES. Random minimal puzzles are mostly easy or expert,
+# hard ones are rare (about 2 %), so a mix with many of them takes longer.
+#
+# Puzzles are generated in chunks, the random generator of chunk i is seeded by (seed, i) and the class of
+# puzzle i is given by the mix alone, so the output is the same for any number of workers.
+#
+# Usage: python -m Puzzle_generator 100000 -o puzzles.txt --seed 1                    (81 characters per line)
+#        python -m Puzzle_generator 1000000 -o corpus.sdk --mix easy=2,medium=1,expert=1  (Puzzle_corpus format
+#        with solutions and difficulty levels)
+
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import Backtrack
+import Puzzle_corpus
+import Solution_cache
+import Strategies
+
+# class -> names of the hardest techniques of its puzzles, techniques registered later are 'hard'
+DIFFICULTY_CLASSES = {
+    'easy': ('naked_singles', 'hidden_singles'),
+    'medium': ('locked_candidates', 'naked_pairs', 'hidden_pairs'),
+    'hard': (),
+    'expert': ('search',),
+}
+
+TABLES = Backtrack.TABLES_9
+
+# golden ratio conjugate, consecutive multiples of it modulo 1 are spread evenly over [0, 1)
+GOLDEN_RATIO = (5 ** 0.5 - 1) / 2
+
+
+def get_random_solution(rng):
+    """
+    :param rng: numpy.random.Generator
+    :return: uint8 numpy array of shape (9,9), a random complete grid
+    """
+    digits_grid = np.zeros((9, 9), dtype=np.uint8)
+    for box in range(3):
+        digits_grid[3 * box:3 * box + 3, 3 * box:3 * box + 3] = (rng.permutation(9) + 1).reshape((3, 3))
+    # a grid with only the diagonal boxes filled is always solvable
+    solution = Backtrack.solve_with_bitmasks(digits_grid, strategies=[])
+
+    transformation = Solution_cache.TRANSFORMATIONS[rng.integers(len(Solution_cache.TRANSFORMATIONS))]
+    labels = np.concatenate(([0], rng.permutation(9) + 1)).astype(np.uint8)
+    return labels[solution.ravel()[transformation]].reshape((9, 9))
+
+
+def has_other_solution(cells, removed):
+    """
+    :param cells: list of 81 digits of a puzzle that has a solution, the removed clues are 0 already
+    :param removed: list of (index, digit) of clues removed from a uniquely solvable puzzle
+    :return: True if the puzzle without them has another solution (one with a different digit in a removed cell)
+    """
+    for forbidden_index, forbidden_digit in removed:
+        if has_solution_without(cells, forbidden_index, forbidden_digit):
+            return True
+    return False
+
+
+def has_solution_without(cells, forbidden_index, forbidden_digit):
+    """
+    :return: True if the puzzle has a solution with another digit than forbidden_digit in forbidden_index
+    """
+    row_of, col_of, box_of = TABLES.row_of, TABLES.col_of, TABLES.box_of
+    rows, cols, boxes = [0] * 9, [0] * 9, [0] * 9
+    for index, digit in enumerate(cells):
+        if digit:
+            bit = 1 << (digit - 1)
+            rows[row_of[index]] |= bit
+            cols[col_of[index]] |= bit
+            boxes[box_of[index]] |= bit
+
+    # candidates are computed from the units at once, placing 60 clues one by one costs several times more
+    candidates = [0] * 81
+    singles = list()
+    for index, digit in enumerate(cells):
+        if digit:
+            continue
+        cell_candidates = TABLES.all_digits & ~(rows[row_of[index]] | cols[col_of[index]] | boxes[box_of[index]])
+        if index == forbidden_index:
+            cell_candidates &= ~(1 << (forbidden_digit - 1))
+        if cell_candidates == 0:
+            return False
+        candidates[index] = cell_candidates
+        if cell_candidates & (cell_candidates - 1) == 0:
+            singles.append(index)
+
+    state = Backtrack.SolverState(TABLES, list(cells), candidates, set(range(27)))
+    for index in singles:
+        if not state.cells[index] and not state.place(index, state.candidates[index]):
+            return False
+    if not state.place_hidden_singles():
+        return False
+    return Backtrack.search_with_bitmasks(state) is not None
+
+
+def remove_clues(solution, rng, symmetric=False):
+    """
+    :param solution: complete grid of shape (9,9)
+    :param symmetric: clues are removed in pairs symmetric around the center (like in printed puzzles)
+    :return: uint8 numpy array of shape (9,9), a minimal uniquely solvable puzzle with the solution
+    """
+    cells = [int(digit) for digit in np.asarray(solution).ravel()]
+    for index in rng.permutation(81).tolist():
+        if symmetric and index > 80 - index:
+            continue
+        indexes = (index, 80 - index) if symmetric and index != 80 - index else (index,)
+        removed = [(removed_index, cells[removed_index]) for removed_index in indexes if cells[removed_index]]
+        for removed_index, _ in removed:
+            cells[removed_index] = 0
+        if has_other_solution(cells, removed):
+            for removed_index, digit in removed:
+                cells[removed_index] = digit
+    return np.array(cells, dtype=np.uint8).reshape((9, 9))
+
+
+def get_difficulty_names():
+    """
+    :return: list of names, the name of level i at index i
+    """
+    return ['naked_singles'] + [strategy.name for strategy in Strategies.STRATEGIES] + ['search']
+
+
+def grade_puzzle(digits_grid):
+    """
+    :param digits_grid: uniquely solvable puzzle of shape (9,9)
+    :return: difficulty level, see get_difficulty_names
+    """
+    # the stats of this run count only the eliminations of this puzzle, whatever else is solved
+    # in the process at the same time
+    stats = Strategies.StrategyStats()
+    state = Backtrack.SolverState.from_grid(digits_grid)
+    Strategies.run_strategies(state, Strategies.STRATEGIES, stats)
+    if not state.is_filled():
+        return len(Strategies.STRATEGIES) + 1
+
+    level = 0
+    for position, strategy in enumerate(Strategies.STRATEGIES):
+        if stats.get_eliminations(strategy.name) or stats.get_placements(strategy.name):
+            level = position + 1
+    return level
+
+
+def get_difficulty_class(level):
+    name = get_difficulty_names()[level]
+    for difficulty_class, names in DIFFICULTY_CLASSES.items():
+        if name in names:
+            return difficulty_class
+    return 'hard'
+
+
+def parse_mix(text):
+    """
+    :param text: e.g. 'easy=2,medium=1,expert=1' (weights of classes of DIFFICULTY_CLASSES), None means any
+    :return: dict class -> fraction of puzzles or None
+    """
+    if text is None:
+        return None
+    weights = dict()
+    for item in text.split(','):
+        difficulty_class, _, weight = item.partition('=')
+        difficulty_class = difficulty_class.strip()
+        if difficulty_class not in DIFFICULTY_CLASSES:
+            raise ValueError('unknown difficulty class {}, expected one of {}'.format(
+                difficulty_class, ', '.join(DIFFICULTY_CLASSES)
+            ))
+        weights[difficulty_class] = float(weight) if weight else 1.0
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError('weights of the mix must have a positive sum')
+    return {difficulty_class: weight / total for difficulty_class, weight in weights.items() if weight > 0}
+
+
+def get_target_classes(start, stop, mix):
+    """
+    :return: list of classes of puzzles start .. stop - 1 (None for any class), the fractions of the mix
+        are kept in every range of puzzles, not only in the whole output
+    """
+    if mix is None:
+        return [None] * (stop - start)
+    classes = list(mix)
+    bounds = np.cumsum([mix[difficulty_class] for difficulty_class in classes])
+    positions = (np.arange(start, stop) * GOLDEN_RATIO) % 1.0
+    choices = np.minimum(np.searchsorted(bounds, positions, side='right'), len(classes) - 1)
+    return [classes[choice] for choice in choices]
+
+
+def generate_chunk(seed, chunk_index, start, stop, mix=None, symmetric=False):
+    """
+    Runs in a worker process.
+
+    :return: (puzzles, solutions, levels, attempts) where puzzles and solutions are uint8 arrays of shape
+        (stop - start, 9, 9), levels is a uint8 array of difficulty levels and attempts is the number of
+        generated puzzles (the ones of an unwanted class are thrown away)
+    """
+    rng = np.random.default_rng([seed, chunk_index])
+    targets = get_target_classes(start, stop, mix)
+    # class -> positions in the chunk still waiting for a puzzle of it
+    waiting = dict()
+    for position, difficulty_class in enumerate(targets):
+        waiting.setdefault(difficulty_class, deque()).append(position)
+
+    count = stop - start
+    puzzles = np.zeros((count, 9, 9), dtype=np.uint8)
+    solutions = np.zeros((count, 9, 9), dtype=np.uint8)
+    levels = np.zeros(count, dtype=np.uint8)
+    attempts = 0
+
+    remaining = count
+    while remaining:
+        attempts += 1
+        solution = get_random_solution(rng)
+        puzzle = remove_clues(solution, rng, symmetric)
+        level = grade_puzzle(puzzle)
+
+        positions = waiting.get(None) or waiting.get(get_difficulty_class(level))
+        if not positions:
+            continue
+        position = positions.popleft()
+        puzzles[position], solutions[position], levels[position] = puzzle, solution, level
+        remaining -= 1
+
+    return puzzles, solutions, levels, attempts
+
+
+def get_chunk_ranges(count, chunk_size):
+    for chunk_index, start in enumerate(range(0, count, chunk_size)):
+        yield chunk_index, start, min(start + chunk_size, count)
+
+
+class GeneratorStats:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.puzzles = 0
+        self.attempts = 0
+        self.clues = 0
+        self.levels = np.zeros(len(get_difficulty_names()), dtype=np.int64)
+
+    def add(self, puzzles, levels, attempts):
+        self.puzzles += len(puzzles)
+        self.attempts += attempts
+        self.clues += int(np.count_nonzero(puzzles))
+        self.levels += np.bincount(levels, minlength=len(self.levels))[:len(self.levels)]
+
+    def report(self, stream):
+        seconds = time.perf_counter() - self.start
+        print('puzzles: {}  generated: {}  mean clues: {:.1f}'.format(
+            self.puzzles, self.attempts, self.clues / self.puzzles if self.puzzles else 0
+        ), file=stream)
+        print('time: {:.2f} s  puzzles / second: {:.1f}'.format(
+            seconds, self.puzzles / seconds if seconds else 0
+        ), file=stream)
+        names = get_difficulty_names()
+        print('hardest technique: {}'.format('  '.join(
+            '{}: {}'.format(names[level], count) for level, count in enumerate(self.levels) if count
+        )), file=stream)
+
+
+def generate(count, write, seed=0, mix=None, symmetric=False, workers=None, chunk_size=256, max_pending=None):
+    """
+    Generates count puzzles and passes them to write(puzzles, solutions, levels) chunk by chunk in order.
+
+    :param mix: dict class -> fraction (see parse_mix), None takes puzzles of any difficulty
+    :param workers: number of worker processes (os.cpu_count() by default), 0 generates in this process
+    :param chunk_size: number of puzzles generated by a worker at once, the output depends on it
+    :param max_pending: maximal number of chunks in flight (2 per worker by default)
+    :return: GeneratorStats
+    """
+    stats = GeneratorStats()
+    chunks = get_chunk_ranges(count, chunk_size)
+
+    def add(result):
+        puzzles, solutions, levels, attempts = result
+        stats.add(puzzles, levels, attempts)
+        write(puzzles, solutions, levels)
+
+    if workers == 0:
+        for chunk_index, start, stop in chunks:
+            add(generate_chunk(seed, chunk_index, start, stop, mix, symmetric))
+        return stats
+
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk_index, start, stop in chunks:
+            if len(pending) >= max_pending:
+                add(pending.popleft().result())
+            pending.append(executor.submit(generate_chunk, seed, chunk_index, start, stop, mix, symmetric))
+        while pending:
+            add(pending.popleft().result())
+
+    return stats
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Generate uniquely solvable sudoku puzzles graded by difficulty.')
+    parser.add_argument('count', type=int, help='number of puzzles')
+    parser.add_argument('-o', '--output', default='-',
+                        help='file for puzzles (81 characters per line), a .sdk file is written in the '
+                             'Puzzle_corpus format with solutions and difficulty levels, stdout by default')
+    parser.add_argument('--seed', type=int, default=0, help='the same seed and chunk size give the same puzzles')
+    parser.add_argument('--mix', default=None,
+                        help='weights of difficulty classes ({}), e.g. easy=2,expert=1, any by default'.format(
+                            ', '.join(DIFFICULTY_CLASSES)))
+    parser.add_argument('--symmetric', action='store_true', help='clues symmetric around the center')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes, all cores by default, 0 = no pool')
+    parser.add_argument('--chunk-size', type=int, default=256, help='puzzles per chunk')
+    parser.add_argument('--max-pending', type=int, default=None, help='chunks in flight, 2 per worker by default')
+    arguments = parser.parse_args(arguments)
+
+    mix = parse_mix(arguments.mix)
+    options = dict(
+        seed=arguments.seed, mix=mix, symmetric=arguments.symmetric, workers=arguments.workers,
+        chunk_size=arguments.chunk_size, max_pending=arguments.max_pending
+    )
+
+    if arguments.output.endswith('.sdk'):
+        with Puzzle_corpus.CorpusWriter(arguments.output, with_solutions=True, with_difficulties=True) as writer:
+            stats = generate(arguments.count, writer.write, **options)
+    else:
+        output_stream = sys.stdout if arguments.output == '-' else open(arguments.output, 'w')
+
+        def write(puzzles, solutions, levels):
+            output_stream.write('\n'.join(''.join(map(str, puzzle.ravel())) for puzzle in puzzles) + '\n')
+
+        try:
+            stats = generate(arguments.count, write, **options)
+        finally:
+            if output_stream is not sys.stdout:
+                output_stream.close()
+
+    stats.report(sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,162 @@
+# Bounded LRU cache of sudoku solutions keyed on a canonical form of the given clues.
+# Two boards are equivalent if one can be turned into the other by a rotation / reflection,
+# a permutation of bands (groups of 3 rows) and stacks (groups of 3 columns) and relabeling of digits.
+# The canonical form is the lexicographically smallest grid among all 8 * 6 * 6 = 288 such transformations,
+# with digits relabeled in order of their first appearance. Equivalent boards share one cache entry,
+# the cached solution is mapped back to the orientation and digits of the board that has been asked for.
+# A cache can be shared by several threads (WebcamSudokuSolver instances, the processing thread of
+# Live_pipeline): the entries are guarded by a lock, boards are solved outside of it.
+
+import threading
+from collections import OrderedDict
+from itertools import permutations
+
+import numpy as np
+
+import Backtrack
+
+
+def get_transformations():
+    """
+    :return: int array of shape (288, 81), row t says which cell of the original grid lands on every cell
+    """
+    indexes = np.arange(81).reshape((9, 9))
+    dihedral = list()
+    for grid in (indexes, indexes.T):
+        for k in range(4):
+            dihedral.append(np.rot90(grid, k))
+
+    transformations = list()
+    for grid in dihedral:
+        for bands in permutations(range(3)):
+            rows = [band * 3 + i for band in bands for i in range(3)]
+            for stacks in permutations(range(3)):
+                cols = [stack * 3 + i for stack in stacks for i in range(3)]
+                transformations.append(grid[rows][:, cols].ravel())
+    return np.array(transformations)
+
+
+TRANSFORMATIONS = get_transformations()
+# INVERSE_TRANSFORMATIONS[t, i] is the cell where cell i of the original grid lands
+INVERSE_TRANSFORMATIONS = np.argsort(TRANSFORMATIONS, axis=1)
+
+
+def get_canonical_form(digits_grid):
+    """
+    :param digits_grid: 2D numpy array of shape (9,9). 0 means empty.
+    :return: (key, transformation, labels) where key is bytes of the canonical grid,
+        transformation is the row of TRANSFORMATIONS that produced it
+        and labels[d] is the canonical label of digit d (labels[0] == 0)
+    """
+    flat = np.asarray(digits_grid, dtype=np.uint8).ravel()
+    clues = np.flatnonzero(flat)
+    digits = flat[clues]
+
+    # only the clues are moved around, their order in every transformed grid decides the relabeling
+    positions = INVERSE_TRANSFORMATIONS[:, clues]
+    ordered_digits = digits[np.argsort(positions, axis=1)]
+
+    appearances = ordered_digits[:, :, None] == np.arange(1, 10, dtype=np.uint8)
+    first_appearance = np.where(appearances.any(axis=1), appearances.argmax(axis=1), len(clues) + np.arange(9))
+    order = np.argsort(first_appearance, axis=1, kind='stable')
+
+    labels = np.zeros((len(TRANSFORMATIONS), 10), dtype=np.uint8)
+    np.put_along_axis(labels[:, 1:], order, np.arange(1, 10, dtype=np.uint8)[None], axis=1)
+
+    canonical_grids = np.zeros((len(TRANSFORMATIONS), 81), dtype=np.uint8)
+    canonical_grids[np.arange(len(TRANSFORMATIONS))[:, None], positions] = labels[:, digits]
+
+    keys = [grid.tobytes() for grid in canonical_grids]
+    best = min(range(len(keys)), key=keys.__getitem__)
+
+    return keys[best], TRANSFORMATIONS[best], labels[best]
+
+
+class SolutionCache:
+    def __init__(self, max_size=1024, solver=Backtrack.solve_unique_with_bitmasks):
+        """
+        :param max_size: maximal number of remembered boards, the least recently used one is evicted
+        :param solver: function that takes a (9,9) grid and returns the solution or None
+        """
+        self.max_size = max_size
+        self.solver = solver
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def solve(self, digits_grid):
+        """
+        Returns the cached solution of an equivalent board or solves the board and remembers the result.
+
+        :param digits_grid: 2D numpy array of shape (9,9). 0 means empty.
+        :return: Solved grid (a new array) or None, exactly as the solver returns it
+        """
+        solution, _ = self.solve_with_status(digits_grid)
+        return solution
+
+    def solve_with_status(self, digits_grid):
+        """
+        Like solve, and also tells whether the answer came from the cache. Counting hits per call this way
+        stays correct when several threads share the cache (the hits counter is shared by all of them).
+
+        :param digits_grid: 2D numpy array of shape (9,9). 0 means empty.
+        :return: (solution, cached) where solution is the solved grid or None
+            and cached is True for a hit, False if the solver ran
+        """
+        digits_grid = np.asarray(digits_grid)
+        # other box sizes have no canonical form here, they go to the solver (which also checks the shape)
+        if digits_grid.shape != (9, 9):
+            return self.solver(digits_grid), False
+        # the solver rejects digits out of range too, such boards are not worth an entry
+        if ((digits_grid < 0) | (digits_grid > 9)).any():
+            return None, False
+
+        key, transformation, labels = get_canonical_form(digits_grid)
+
+        with self.lock:
+            cached = key in self.entries
+            if cached:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                canonical_solution = self.entries[key]
+            else:
+                self.misses += 1
+
+        if cached:
+            if canonical_solution is None:
+                return None, True
+
+            original_digits = np.zeros(10, dtype=np.uint8)
+            original_digits[labels] = np.arange(10, dtype=np.uint8)
+            solution = np.zeros(81, dtype=digits_grid.dtype)
+            solution[transformation] = original_digits[canonical_solution]
+            return solution.reshape((9, 9)), True
+
+        solution = self.solver(digits_grid)
+
+        canonical_solution = None
+        if solution is not None:
+            canonical_solution = labels[np.asarray(solution, dtype=np.intp).ravel()[transformation]]
+
+        with self.lock:
+            self.entries[key] = canonical_solution
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+        return solution, False
+
+    def get_stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'size': len(self.entries)}
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+# One cache for the image, webcam and batch paths (every WebcamSudokuSolver uses it by default).
+SHARED_CACHE = SolutionCache()
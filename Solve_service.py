@@ -0,0 +1,696 @@
+# Local HTTP service for recognizing and solving boards, for several clients on one machine.
+# An asyncio front end takes the requests, the vision preprocessing of Webcam_preprocess (decoding, board
+# detection, digit crops) runs in a pool of processes and the digit classifier runs in one inference thread.
+# The crops of concurrent requests are coalesced by MicroBatcher: a batch is sent to the model as soon as it
+# has max_batch_size crops or max_wait seconds after its first crop has arrived, whichever comes first.
+# While the model runs, new crops wait for the next batch, so batches grow with the load by themselves.
+# A board is tried upright first like WebcamSudokuSolver does, the other 3 rotations are batched only
+# if the upright one isn't recognized or solved.
+#
+# Endpoints:
+#   POST /solve/image  body: an encoded image (JPEG, PNG, ...)
+#                      -> {"outcome": "solved", "digits_grid": "0402...", "solution": "5472...",
+#                          "confidences": [[...], ...], "rotation_angle": 0, "stages": {...}, "seconds": 0.03}
+#   POST /solve/grid   body: 81 characters ('0' or '.' means empty) like in Bulk_solve
+#                      -> {"outcome": "solved", "solution": "5472...", "seconds": 0.001}
+#   GET  /metrics      -> queue depths, batch sizes, latencies and outcomes as JSON
+# Outcomes are the ones of Batch_images plus 'invalid' for a body that is not a puzzle. A board with misread
+# digits is recovered from the same predictions like in WebcamSudokuSolver ("recovered_cells" in the result).
+#
+# It listens on localhost only. Load test against a running service or one started in the same process:
+# Usage: python -m Solve_service serve --model models/new_model.npz --port 8765 --workers 4
+#        python -m Solve_service load images/2.jpg --port 8765 --requests 500 --concurrency 32
+#        python -m Solve_service load images/2.jpg --model models/new_model.npz --requests 500
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import numpy as np
+import cv2 as cv
+
+import Bulk_solve
+import Inference
+import Solution_cache
+import Webcam_preprocess
+from Batch_images import grid_to_string
+
+HOST = '127.0.0.1'
+PORT = 8765
+
+# bodies over this size are refused (413)
+MAX_BODY_SIZE = 32 * 1024 * 1024
+
+# upper bounds of the batch size histogram, in crops
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+# a request line longer than this is refused (400), so is a longer header line or more of them (431)
+MAX_LINE_SIZE = 64 * 1024
+MAX_HEADERS = 100
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+           431: 'Request Header Fields Too Large', 500: 'Internal Server Error'}
+
+
+def init_worker():
+    # the pool has a process per core already
+    cv.setNumThreads(1)
+
+
+def preprocess_image(data, multiscale_detection=False):
+    """
+    Runs in a worker process: everything of WebcamSudokuSolver.solve_frame before the model.
+
+    :param data: bytes of an encoded image
+    :return: dict with outcome (None if the board has digits), inputs (float array of shape (k, 28, 28, 1)),
+        digits_occurrence and stages (seconds)
+    """
+    stages = dict()
+    start = time.perf_counter()
+
+    frame = cv.imdecode(np.frombuffer(data, dtype=np.uint8), cv.IMREAD_COLOR)
+    stages['decode'] = time.perf_counter() - start
+    if frame is None:
+        return {'outcome': 'unreadable', 'stages': stages}
+
+    start = time.perf_counter()
+    if multiscale_detection:
+        warp_sudoku_board, _ = Webcam_preprocess.get_biggest_quadrangle_multiscale(frame, draw_vertices_on_frame=False)
+    else:
+        warp_sudoku_board, _ = Webcam_preprocess.get_biggest_quadrangle(frame, draw_vertices_on_frame=False)
+    stages['get_biggest_quadrangle'] = time.perf_counter() - start
+    if warp_sudoku_board is None:
+        return {'outcome': 'no_board', 'stages': stages}
+
+    start = time.perf_counter()
+    digits_occurrence = Webcam_preprocess.check_digits_occurrence_by_ink(warp_sudoku_board)
+    inputs = Webcam_preprocess.prepare_inputs_vectorized(warp_sudoku_board, digits_occurrence)
+    stages['prepare_inputs'] = time.perf_counter() - start
+    if inputs is None:
+        return {'outcome': 'no_digits', 'stages': stages}
+
+    return {'outcome': None, 'inputs': inputs.astype(np.float32), 'digits_occurrence': digits_occurrence,
+            'stages': stages}
+
+
+class MicroBatcher:
+    def __init__(self, model, max_batch_size=256, max_wait=0.005, executor=None):
+        """
+        :param model: model with predict(inputs) -> (N, 10) probabilities, it is called from one thread only
+        :param max_batch_size: a batch is sent as soon as it has this many crops (a larger single request
+            makes a batch of its own)
+        :param max_wait: seconds the first crop of a batch waits for others
+        :param executor: executor running the model, a single thread by default
+        """
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.executor = executor if executor is not None else ThreadPoolExecutor(1, thread_name_prefix='inference')
+
+        # (inputs, future, time of arrival)
+        self.pending = deque()
+        self.pending_crops = 0
+        self.arrived = None
+        self.task = None
+
+        self.batches = 0
+        self.crops = 0
+        self.max_pending_crops = 0
+        self.batch_sizes = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+        self.waits = deque(maxlen=1000)
+        self.inference_seconds = deque(maxlen=1000)
+
+    def start(self):
+        self.arrived = asyncio.Event()
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        for _, future, _ in self.pending:
+            future.cancel()
+        self.pending.clear()
+        self.pending_crops = 0
+
+    async def predict(self, inputs):
+        """
+        :param inputs: float array of shape (k, 28, 28, 1)
+        :return: numpy array of shape (k, 10), predictions of the crops of this request
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((inputs, future, time.perf_counter()))
+        self.pending_crops += len(inputs)
+        self.max_pending_crops = max(self.max_pending_crops, self.pending_crops)
+        self.arrived.set()
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self.pending:
+                await self.arrived.wait()
+                self.arrived.clear()
+                continue
+
+            deadline = self.pending[0][2] + self.max_wait
+            while self.pending_crops < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self.arrived.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                self.arrived.clear()
+
+            requests = self.take_batch()
+            # requests cancelled while waiting (the client went away) don't need their predictions
+            requests = [request for request in requests if not request[1].cancelled()]
+            if not requests:
+                continue
+
+            batch = np.concatenate([inputs for inputs, _, _ in requests])
+            start = time.perf_counter()
+            for _, _, arrival in requests:
+                self.waits.append(start - arrival)
+            try:
+                predictions = await loop.run_in_executor(
+                    self.executor, Webcam_preprocess.predict_batch, self.model, batch
+                )
+            except Exception as error:
+                for _, future, _ in requests:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            self.inference_seconds.append(time.perf_counter() - start)
+            self.observe(len(batch))
+
+            offset = 0
+            for inputs, future, _ in requests:
+                if not future.done():
+                    future.set_result(predictions[offset:offset + len(inputs)])
+                offset += len(inputs)
+
+    def take_batch(self):
+        """
+        :return: the oldest pending requests with at most max_batch_size crops together (at least one request)
+        """
+        requests = [self.pending.popleft()]
+        crops = len(requests[0][0])
+        while self.pending and crops + len(self.pending[0][0]) <= self.max_batch_size:
+            requests.append(self.pending.popleft())
+            crops += len(requests[-1][0])
+        self.pending_crops -= crops
+        return requests
+
+    def observe(self, batch_size):
+        self.batches += 1
+        self.crops += batch_size
+        for i, bound in enumerate(BATCH_SIZE_BUCKETS):
+            if batch_size <= bound:
+                self.batch_sizes[i] += 1
+                break
+        else:
+            self.batch_sizes[-1] += 1
+
+    def get_stats(self):
+        bounds = [str(bound) for bound in BATCH_SIZE_BUCKETS] + ['+Inf']
+        return {
+            'pending_requests': len(self.pending),
+            'pending_crops': self.pending_crops,
+            'max_pending_crops': self.max_pending_crops,
+            'batches': self.batches,
+            'crops': self.crops,
+            'mean_batch_size': self.crops / self.batches if self.batches else 0.0,
+            'batch_sizes': dict(zip(bounds, self.batch_sizes)),
+            'wait_p50': get_percentile(self.waits, 50),
+            'wait_p99': get_percentile(self.waits, 99),
+            'inference_p50': get_percentile(self.inference_seconds, 50),
+            'inference_p99': get_percentile(self.inference_seconds, 99),
+        }
+
+
+def get_percentile(values, percentile):
+    if len(values) == 0:
+        return 0.0
+    return float(np.percentile(values, percentile))
+
+
+class SolveService:
+    def __init__(self, model, workers=None, max_pending=None, max_batch_size=256, max_wait=0.005,
+                 multiscale_detection=False, solution_cache=None):
+        """
+        :param workers: number of preprocessing processes (os.cpu_count() by default), 0 preprocesses
+            in a thread of this process
+        :param max_pending: maximal number of images in the pool at once (4 per worker by default),
+            the others wait in the front end
+        :param max_batch_size: see MicroBatcher
+        :param max_wait: see MicroBatcher
+        :param solution_cache: Solution_cache.SolutionCache shared by all requests
+        """
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_pending = max_pending or 4 * max(self.workers, 1)
+        self.multiscale_detection = multiscale_detection
+        self.solution_cache = solution_cache if solution_cache is not None else Solution_cache.SolutionCache()
+        self.batcher = MicroBatcher(model, max_batch_size, max_wait)
+
+        self.pool = None
+        # solving runs in one thread, next to the event loop and the inference thread
+        self.solver_executor = ThreadPoolExecutor(1, thread_name_prefix='solver')
+        self.pool_slots = None
+        self.server = None
+        # tasks of the open connections, closed by stop
+        self.connections = set()
+
+        self.waiting_images = 0
+        self.preprocessing_images = 0
+        self.active_requests = 0
+        self.requests = dict()
+        self.outcomes = dict()
+        # status -> number of responses, including the ones to requests that couldn't be read
+        self.statuses = dict()
+        self.latencies = deque(maxlen=1000)
+
+    async def start(self, host=HOST, port=PORT):
+        """
+        :param port: 0 picks a free port, see self.port
+        """
+        if self.workers == 0:
+            self.pool = ThreadPoolExecutor(1, thread_name_prefix='preprocess')
+        else:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker)
+        self.pool_slots = asyncio.Semaphore(self.max_pending)
+        self.batcher.start()
+        self.server = await asyncio.start_server(self.accept_connection, host, port, limit=MAX_LINE_SIZE)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        for connection in self.connections:
+            connection.cancel()
+        await asyncio.gather(*self.connections, return_exceptions=True)
+        await self.server.wait_closed()
+        await self.batcher.stop()
+        self.pool.shutdown()
+        self.solver_executor.shutdown()
+
+    async def solve_image(self, data):
+        loop = asyncio.get_running_loop()
+        self.waiting_images += 1
+        async with self.pool_slots:
+            self.waiting_images -= 1
+            self.preprocessing_images += 1
+            try:
+                preprocessed = await loop.run_in_executor(
+                    self.pool, preprocess_image, data, self.multiscale_detection
+                )
+            finally:
+                self.preprocessing_images -= 1
+
+        stages = preprocessed['stages']
+        result = {'outcome': preprocessed['outcome']}
+        if preprocessed['outcome'] is not None:
+            result['stages'] = {stage: round(seconds, 6) for stage, seconds in stages.items()}
+            return result
+
+        inputs = preprocessed['inputs']
+        digits_occurrence = preprocessed['digits_occurrence']
+
+        start = time.perf_counter()
+        attempts = [(0, await self.batcher.predict(inputs))]
+        stages['predict'] = time.perf_counter() - start
+
+        best = None
+        recovery_tried = False
+        result['outcome'] = 'unsolved'
+        while attempts:
+            rotation_angle, predictions = attempts.pop(0)
+            if Webcam_preprocess.probabilities_are_good(predictions):
+                digits_grid = Webcam_preprocess.get_digits_grid(predictions, digits_occurrence, rotation_angle)
+                confidences = Webcam_preprocess.get_confidence_grid(predictions, digits_occurrence, rotation_angle)
+                best = best or (digits_grid, confidences, rotation_angle)
+
+                start = time.perf_counter()
+                solution = await loop.run_in_executor(self.solver_executor, self.solution_cache.solve, digits_grid)
+                if solution is None and not recovery_tried:
+                    # a misread digit, no extra model call (see Webcam_preprocess.recover_digits_grid),
+                    # tried for one rotation only so that a bad image costs one time limit
+                    recovery_tried = True
+                    recovered = await loop.run_in_executor(
+                        self.solver_executor, Webcam_preprocess.recover_digits_grid, predictions, digits_occurrence,
+                        rotation_angle, self.solution_cache.solver
+                    )
+                    if recovered is not None:
+                        digits_grid, solution, result['recovered_cells'] = recovered
+                stages['solve_sudoku'] = stages.get('solve_sudoku', 0.0) + time.perf_counter() - start
+                if solution is not None:
+                    best = (digits_grid, confidences, rotation_angle)
+                    result.update(outcome='solved', solution=grid_to_string(solution))
+                    break
+
+            if rotation_angle == 0:
+                # the upright board failed, the other rotations go to the model together
+                start = time.perf_counter()
+                rotation_angles = [90, 180, 270]
+                all_predictions = await self.batcher.predict(
+                    Webcam_preprocess.rotate_inputs_batch(inputs, rotation_angles)
+                )
+                attempts = list(zip(rotation_angles, np.split(all_predictions, 3)))
+                attempts.sort(key=lambda attempt: -Webcam_preprocess.get_probability_score(attempt[1]))
+                stages['predict'] += time.perf_counter() - start
+
+        if best is not None:
+            digits_grid, confidences, rotation_angle = best
+            result.update(
+                digits_grid=grid_to_string(digits_grid),
+                confidences=np.round(confidences.astype(float), 4).tolist(),
+                rotation_angle=rotation_angle,
+            )
+        result['stages'] = {stage: round(seconds, 6) for stage, seconds in stages.items()}
+        return result
+
+    async def solve_grid(self, body):
+        digits_grid = Bulk_solve.parse_puzzle(body.decode(errors='replace').strip())
+        if digits_grid is None:
+            return {'outcome': 'invalid'}
+
+        loop = asyncio.get_running_loop()
+        solution = await loop.run_in_executor(self.solver_executor, self.solution_cache.solve, digits_grid)
+        if solution is None:
+            return {'outcome': 'unsolved'}
+        return {'outcome': 'solved', 'solution': grid_to_string(solution)}
+
+    def get_stats(self):
+        return {
+            'active_requests': self.active_requests,
+            'waiting_images': self.waiting_images,
+            'preprocessing_images': self.preprocessing_images,
+            'workers': self.workers,
+            'requests': dict(self.requests),
+            'outcomes': dict(self.outcomes),
+            'statuses': dict(self.statuses),
+            'latency_p50': get_percentile(self.latencies, 50),
+            'latency_p99': get_percentile(self.latencies, 99),
+            'batcher': self.batcher.get_stats(),
+            'cache': self.solution_cache.get_stats(),
+        }
+
+    def accept_connection(self, reader, writer):
+        # the task is created here and not by start_server, so a connection cancelled by stop ends cleanly
+        # (the callback of start_server would ask the cancelled task for its exception)
+        connection = asyncio.get_running_loop().create_task(self.handle_connection(reader, writer))
+        self.connections.add(connection)
+        connection.add_done_callback(self.connections.discard)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except RequestError as error:
+                    # the rest of the stream can't be parsed, the connection is closed after the answer
+                    await self.send_response(writer, error.status, {'error': str(error)}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, response = await self.respond(method, path, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self.send_response(writer, status, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            # the client went away
+            pass
+        finally:
+            writer.close()
+
+    async def send_response(self, writer, status, response, keep_alive):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        writer.write(format_response(status, response, keep_alive))
+        await writer.drain()
+
+    async def respond(self, method, path, body):
+        """
+        :return: (status, dict sent as JSON)
+        """
+        path = urlsplit(path).path
+        if path == '/metrics':
+            if method != 'GET':
+                return 405, {'error': 'use GET'}
+            return 200, self.get_stats()
+
+        handlers = {'/solve/image': self.solve_image, '/solve/grid': self.solve_grid}
+        if path not in handlers:
+            return 404, {'error': 'unknown path {}'.format(path)}
+        if method != 'POST':
+            return 405, {'error': 'use POST'}
+
+        start = time.perf_counter()
+        self.active_requests += 1
+        status = 200
+        try:
+            result = await handlers[path](body)
+        except Exception as error:
+            status, result = 500, {'outcome': 'error', 'error': repr(error)}
+        finally:
+            self.active_requests -= 1
+        result['seconds'] = time.perf_counter() - start
+
+        self.latencies.append(result['seconds'])
+        self.requests[path] = self.requests.get(path, 0) + 1
+        self.outcomes[result['outcome']] = self.outcomes.get(result['outcome'], 0) + 1
+        return status, result
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+async def read_request(reader):
+    """
+    Reads one HTTP/1.1 request, only what the endpoints need (no chunked bodies).
+
+    :return: (method, path, headers with lowercase names, body) or None if the connection has been closed
+    """
+    request_line = await read_line(reader, 400, 'request line')
+    if not request_line:
+        return None
+    parts = request_line.decode('latin-1').split()
+    if len(parts) != 3:
+        raise RequestError(400, 'malformed request line')
+    method, path, _ = parts
+
+    headers = dict()
+    for header_count in range(MAX_HEADERS + 1):
+        line = await read_line(reader, 431, 'header line')
+        if line in (b'\r\n', b'\n', b''):
+            break
+        if header_count == MAX_HEADERS:
+            raise RequestError(431, 'more than {} header lines'.format(MAX_HEADERS))
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        raise RequestError(400, 'chunked bodies are not supported, send Content-Length')
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise RequestError(400, 'bad Content-Length')
+    if length > MAX_BODY_SIZE:
+        raise RequestError(413, 'body over {} bytes'.format(MAX_BODY_SIZE))
+    body = await reader.readexactly(length) if length else b''
+    return method, path, headers, body
+
+
+async def read_line(reader, status, what):
+    """
+    :param status: status of the answer to a line over MAX_LINE_SIZE (the limit of the stream)
+    :return: the line with its end of line, b'' at the end of the stream
+    """
+    try:
+        return await reader.readline()
+    except ValueError:
+        # readline turns asyncio.LimitOverrunError into ValueError
+        raise RequestError(status, '{} over {} bytes'.format(what, MAX_LINE_SIZE))
+
+
+def format_response(status, response, keep_alive=True):
+    body = json.dumps(response).encode()
+    head = 'HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\nConnection: {}\r\n\r\n'.format(
+        status, REASONS.get(status, ''), len(body), 'keep-alive' if keep_alive else 'close'
+    )
+    return head.encode('latin-1') + body
+
+
+async def send_request(reader, writer, method, path, body=b''):
+    """
+    Client side of one request on a kept-alive connection.
+
+    :return: (status, dict of the JSON response)
+    """
+    writer.write('{} {} HTTP/1.1\r\nHost: {}\r\nContent-Length: {}\r\n\r\n'.format(
+        method, path, HOST, len(body)
+    ).encode('latin-1') + body)
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def load_test(bodies, port, requests=200, concurrency=16, path='/solve/image'):
+    """
+    Sends requests bodies (taken round robin) over concurrency kept-alive connections.
+
+    :return: dict with throughput, latency percentiles, outcomes and the /metrics of the service afterwards
+    """
+    latencies = list()
+    outcomes = dict()
+    counter = iter(range(requests))
+
+    async def client():
+        reader, writer = await asyncio.open_connection(HOST, port)
+        try:
+            for i in counter:
+                start = time.perf_counter()
+                status, response = await send_request(reader, writer, 'POST', path, bodies[i % len(bodies)])
+                latencies.append(time.perf_counter() - start)
+                outcome = response.get('outcome', status)
+                outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    seconds = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection(HOST, port)
+    _, metrics = await send_request(reader, writer, 'GET', '/metrics')
+    writer.close()
+    await writer.wait_closed()
+
+    return {
+        'requests': len(latencies),
+        'seconds': seconds,
+        'requests_per_second': len(latencies) / seconds if seconds else 0.0,
+        'latency_p50': get_percentile(latencies, 50),
+        'latency_p99': get_percentile(latencies, 99),
+        'outcomes': outcomes,
+        'metrics': metrics,
+    }
+
+
+def report_load_test(stats, stream):
+    batcher = stats['metrics']['batcher']
+    print('requests: {}  {}'.format(
+        stats['requests'], '  '.join('{}: {}'.format(outcome, count) for outcome, count in sorted(stats['outcomes'].items(), key=str))
+    ), file=stream)
+    print('time: {:.2f} s  requests / second: {:.1f}'.format(stats['seconds'], stats['requests_per_second']), file=stream)
+    print('latency p50: {:.1f} ms  p99: {:.1f} ms'.format(stats['latency_p50'] * 1e3, stats['latency_p99'] * 1e3),
+          file=stream)
+    print('batches: {}  mean batch size: {:.1f} crops  max pending crops: {}'.format(
+        batcher['batches'], batcher['mean_batch_size'], batcher['max_pending_crops']
+    ), file=stream)
+    print('batch wait p50: {:.2f} ms  p99: {:.2f} ms  inference p50: {:.2f} ms  p99: {:.2f} ms'.format(
+        batcher['wait_p50'] * 1e3, batcher['wait_p99'] * 1e3,
+        batcher['inference_p50'] * 1e3, batcher['inference_p99'] * 1e3
+    ), file=stream)
+
+
+def create_service(arguments):
+    model = Inference.load_model(arguments.model, arguments.backend)
+    return SolveService(
+        model, arguments.workers, arguments.max_pending, arguments.max_batch_size, arguments.max_wait / 1e3,
+        arguments.multiscale
+    )
+
+
+async def serve(arguments):
+    service = create_service(arguments)
+    await service.start(HOST, arguments.port)
+    print('listening on http://{}:{}'.format(HOST, service.port), file=sys.stderr)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await service.stop()
+
+
+async def run_load_test(arguments):
+    bodies = list()
+    for path in arguments.images:
+        with open(path, 'rb') as file:
+            bodies.append(file.read())
+
+    service = None
+    port = arguments.port
+    if arguments.model is not None:
+        # the service runs in this process, on a free port
+        service = create_service(arguments)
+        await service.start(HOST, 0)
+        port = service.port
+    try:
+        stats = await load_test(bodies, port, arguments.requests, arguments.concurrency)
+    finally:
+        if service is not None:
+            await service.stop()
+    report_load_test(stats, sys.stderr)
+    return stats
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Local service that recognizes and solves sudoku boards.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve', help='run the service')
+    load_parser = commands.add_parser('load', help='load test a running service (or one started here with --model)')
+    load_parser.add_argument('images', nargs='+', help='images sent round robin')
+    load_parser.add_argument('--requests', type=int, default=200)
+    load_parser.add_argument('--concurrency', type=int, default=16, help='number of kept-alive connections')
+
+    for command_parser, model_default in ((serve_parser, os.path.join('models', 'new_model.npz')), (load_parser, None)):
+        command_parser.add_argument('--port', type=int, default=PORT)
+        command_parser.add_argument('--model', default=model_default,
+                                    help='digit classifier (.npz, .onnx or .h5, see Inference.py)')
+        command_parser.add_argument('--backend', default=None, help='keras, numpy or opencv, by the model extension by default')
+        command_parser.add_argument('--workers', type=int, default=None,
+                                    help='preprocessing processes, all cores by default, 0 = a thread')
+        command_parser.add_argument('--max-pending', type=int, default=None,
+                                    help='images in the preprocessing pool, 4 per worker by default')
+        command_parser.add_argument('--max-batch-size', type=int, default=256, help='crops per inference batch')
+        command_parser.add_argument('--max-wait', type=float, default=5.0,
+                                    help='milliseconds a crop waits for others to share its batch')
+        command_parser.add_argument('--multiscale', action='store_true', help='coarse to fine board detection (big images)')
+    arguments = parser.parse_args(arguments)
+
+    try:
+        if arguments.command == 'serve':
+            asyncio.run(serve(arguments))
+        else:
+            asyncio.run(run_load_test(arguments))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
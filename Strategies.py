@@ -0,0 +1,279 @@
+# Human-style solving techniques used by the bitmask engine of Backtrack.
+# Every technique is a class with apply(state) method that returns True if it has changed something.
+# The state (Backtrack.SolverState) keeps a candidate mask per cell and places naked singles by itself.
+# STRATEGIES is the registry: techniques are run cheapest-first and after every change
+# the pipeline starts again from the cheapest one, until no technique can change anything.
+# The more expensive techniques return as soon as they have changed something,
+# because their remaining findings may be stale after eliminations.
+# Statistics (calls, eliminations, placements and time of every technique) are kept only when run_strategies
+# gets a StrategyStats, so the solver doesn't pay for them and concurrent runs don't share counters.
+
+import time
+from abc import ABC, abstractmethod
+from itertools import combinations
+
+
+class Strategy(ABC):
+    name = 'strategy'
+
+    @abstractmethod
+    def apply(self, state):
+        """
+        :param state: Backtrack.SolverState, changed in place
+        :return: True if some candidate has been removed or some digit placed
+        """
+
+
+class HiddenSingles(Strategy):
+    """A digit that fits into only one cell of a unit goes there. Only units with changed candidates are checked."""
+    name = 'hidden_singles'
+
+    def apply(self, state):
+        filled_before = state.count_filled()
+        state.place_hidden_singles()
+        return state.count_filled() != filled_before
+
+
+class LockedCandidates(Strategy):
+    """
+    Pointing: a digit of a box fits only into its intersection with a line, so it goes away from the rest of the line.
+    Claiming: a digit of a line fits only into its intersection with a box, so it goes away from the rest of the box.
+    """
+    name = 'locked_candidates'
+
+    def apply(self, state):
+        candidates = state.candidates
+        changed = False
+
+        for segment, rest_of_box, rest_of_line in state.intersections:
+            in_segment = 0
+            for index in segment:
+                in_segment |= candidates[index]
+            if not in_segment:
+                continue
+
+            in_rest_of_box = 0
+            for index in rest_of_box:
+                in_rest_of_box |= candidates[index]
+            in_rest_of_line = 0
+            for index in rest_of_line:
+                in_rest_of_line |= candidates[index]
+
+            pointing = in_segment & ~in_rest_of_box & in_rest_of_line
+            claiming = in_segment & ~in_rest_of_line & in_rest_of_box
+
+            if pointing:
+                for index in rest_of_line:
+                    changed |= state.eliminate(index, pointing) > 0
+            if claiming:
+                for index in rest_of_box:
+                    changed |= state.eliminate(index, claiming) > 0
+
+            if state.broken:
+                return True
+
+        return changed
+
+
+class NakedSubset(Strategy):
+    """k cells of a unit that together have only k candidates remove those candidates from the rest of the unit."""
+
+    def __init__(self, size):
+        self.size = size
+        self.name = 'naked_{}'.format({2: 'pairs', 3: 'triples', 4: 'quads'}.get(size, size))
+
+    def apply(self, state):
+        candidates = state.candidates
+        changed = False
+
+        for unit in state.units:
+            small = [index for index in unit if 2 <= candidates[index].bit_count() <= self.size]
+            if len(small) < self.size:
+                continue
+
+            for subset in combinations(small, self.size):
+                union = 0
+                for index in subset:
+                    union |= candidates[index]
+                if union.bit_count() != self.size:
+                    continue
+
+                for index in unit:
+                    if index not in subset:
+                        changed |= state.eliminate(index, union) > 0
+                if changed:
+                    return True
+
+        return False
+
+
+class HiddenSubset(Strategy):
+    """k digits that fit into only k cells of a unit remove all other candidates from those cells."""
+
+    def __init__(self, size):
+        self.size = size
+        self.name = 'hidden_{}'.format({2: 'pairs', 3: 'triples', 4: 'quads'}.get(size, size))
+
+    def apply(self, state):
+        candidates = state.candidates
+        changed = False
+
+        for unit in state.units:
+            cells_of_digit = dict()
+            for index in unit:
+                remaining = candidates[index]
+                while remaining:
+                    bit = remaining & -remaining
+                    remaining ^= bit
+                    cells_of_digit.setdefault(bit, []).append(index)
+
+            digits = [bit for bit, cells in cells_of_digit.items() if 2 <= len(cells) <= self.size]
+            if len(digits) < self.size:
+                continue
+
+            for subset in combinations(digits, self.size):
+                cells = set()
+                for bit in subset:
+                    cells.update(cells_of_digit[bit])
+                if len(cells) != self.size:
+                    continue
+
+                mask = 0
+                for bit in subset:
+                    mask |= bit
+                for index in cells:
+                    changed |= state.eliminate(index, ~mask) > 0
+                if changed:
+                    return True
+
+        return False
+
+
+class XWing(Strategy):
+    """
+    A digit that fits into exactly the same two columns in two rows can't be anywhere else in those columns
+    (and the same with rows and columns swapped).
+    """
+    name = 'x_wing'
+
+    def apply(self, state):
+        candidates = state.candidates
+        size = state.size
+        rows, cols = state.units[:size], state.units[size:2 * size]
+        changed = False
+
+        for lines, crossing_lines in ((rows, cols), (cols, rows)):
+            for digit in range(size):
+                bit = 1 << digit
+                positions = dict()
+                for line_index, line in enumerate(lines):
+                    found = [position for position, index in enumerate(line) if candidates[index] & bit]
+                    if len(found) == 2:
+                        positions.setdefault(tuple(found), []).append(line_index)
+
+                for (first, second), line_indexes in positions.items():
+                    if len(line_indexes) != 2:
+                        continue
+                    for crossing_index in (first, second):
+                        for line_index, index in enumerate(crossing_lines[crossing_index]):
+                            if line_index not in line_indexes:
+                                changed |= state.eliminate(index, bit) > 0
+                    if changed:
+                        return True
+
+        return False
+
+
+STRATEGIES = [
+    HiddenSingles(),
+    LockedCandidates(),
+    NakedSubset(2),
+    HiddenSubset(2),
+    NakedSubset(3),
+    HiddenSubset(3),
+    XWing(),
+]
+
+
+def register_strategy(strategy, before=None):
+    """
+    Adds a technique to the pipeline.
+
+    :param strategy: Strategy instance
+    :param before: name of a registered technique to insert in front of, None appends at the end (most expensive)
+    """
+    names = [registered.name for registered in STRATEGIES]
+    if strategy.name in names:
+        raise ValueError('strategy {} is already registered'.format(strategy.name))
+    position = names.index(before) if before is not None else len(STRATEGIES)
+    STRATEGIES.insert(position, strategy)
+
+
+class StrategyStats:
+    """
+    Calls, eliminations, placements and time of every technique during the runs of run_strategies
+    it has been passed to. Eliminations are the candidates the technique has removed itself
+    (SolverState.eliminations), placements are the cells filled during its call, including the naked singles
+    that followed its eliminations.
+    """
+
+    def __init__(self):
+        # name -> {'calls', 'eliminations', 'placements', 'nanoseconds'}
+        self.techniques = dict()
+
+    def add(self, name, eliminations, placements, nanoseconds):
+        technique = self.techniques.setdefault(
+            name, {'calls': 0, 'eliminations': 0, 'placements': 0, 'nanoseconds': 0}
+        )
+        technique['calls'] += 1
+        technique['eliminations'] += eliminations
+        technique['placements'] += placements
+        technique['nanoseconds'] += nanoseconds
+
+    def get_eliminations(self, name):
+        return self.techniques[name]['eliminations'] if name in self.techniques else 0
+
+    def get_placements(self, name):
+        return self.techniques[name]['placements'] if name in self.techniques else 0
+
+    def get_stats(self):
+        """
+        :return: dict name -> {'calls', 'eliminations', 'placements', 'nanoseconds'}
+            for every technique that has been called
+        """
+        return {name: dict(technique) for name, technique in self.techniques.items()}
+
+
+def run_strategies(state, strategies=None, stats=None):
+    """
+    Runs techniques cheapest-first until none of them changes anything.
+
+    :param state: Backtrack.SolverState, changed in place
+    :param strategies: list of Strategy instances, STRATEGIES by default
+    :param stats: StrategyStats that gets the calls, eliminations, placements and time of every technique,
+        None counts nothing
+    :return: False if a contradiction has been found
+    """
+    if strategies is None:
+        strategies = STRATEGIES
+
+    position = 0
+    while position < len(strategies) and not state.is_filled():
+        strategy = strategies[position]
+
+        if stats is None:
+            changed = strategy.apply(state)
+        else:
+            eliminations_before, filled_before = state.eliminations, state.count_filled()
+            start = time.perf_counter_ns()
+            changed = strategy.apply(state)
+            nanoseconds = time.perf_counter_ns() - start
+            stats.add(
+                strategy.name, state.eliminations - eliminations_before, state.count_filled() - filled_before, nanoseconds
+            )
+
+        if state.broken:
+            return False
+        position = 0 if changed else position + 1
+
+    return not state.broken
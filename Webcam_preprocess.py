@@ -6,71 +6,271 @@
 # the solution is drawn on the returned image.
 
 import Backtrack
+import Metrics
+import Solution_cache
+from Digit_overlay import get_digits_mask, draw_digits_mask
+from Frame_workspace import get_buffer
 
 from copy import deepcopy
+import time
 import numpy as np
 import cv2 as cv
 from scipy import ndimage
 
+# get_biggest_quadrangle_multiscale searches for the board on a copy of the frame this wide
+DETECTION_WIDTH = 640
+# and warps it to a square of this side (50 x 50 pixels per cell) whatever the camera resolution is
+CANONICAL_WARP_SIZE = 450
+
+# recover_digits_grid changes at most RECOVERY_MAX_CHANGES of the RECOVERY_MAX_CELLS least confident digits
+# to their 2nd .. RECOVERY_TOP_K-th choices or to an empty cell and gives up after RECOVERY_TIME_LIMIT seconds
+RECOVERY_MAX_CELLS = 6
+RECOVERY_MAX_CHANGES = 3
+RECOVERY_TOP_K = 3
+RECOVERY_TIME_LIMIT = 0.02
+# a choice less probable than this is never tried (the model is sure it isn't that digit)
+RECOVERY_MIN_PROBABILITY = 0.01
+# probability given to "this is no digit at all" (a noise blob read as a clue) when the model says less
+RECOVERY_BLANK_PROBABILITY = 0.02
+
+
 class WebcamSudokuSolver:
-    def __init__(self, model):
+    def __init__(self, model, solution_cache=None, metrics=None, tracker=None, batch_rotations=False,
+                 multiscale_detection=False, workspace=None, recover_digits=True):
         self.model = model
+        # solutions of equivalent boards are shared between all solvers unless a separate cache is given
+        self.solution_cache = solution_cache if solution_cache is not None else Solution_cache.SHARED_CACHE
+        # per-stage timings, counters and events of every frame (see Metrics.py), disabled by default
+        self.metrics = metrics if metrics is not None else Metrics.DISABLED
+        # Board_tracking.BoardTracker that follows a solved board instead of detecting it again, None disables it
+        self.tracker = tracker
+        # recognize all 4 rotations in one model call and try them from the most confident one
+        self.batch_rotations = batch_rotations
+        # find the board on a downscaled frame (around the last board first) and warp it to a canonical size
+        self.multiscale_detection = multiscale_detection
+        # Frame_workspace.FrameWorkspace with buffers reused on every frame, None allocates new arrays
+        self.workspace = workspace
+        # when the recognized digits can't be solved, try the next most probable digits of the least confident
+        # cells before the next rotation (see recover_digits_grid), no extra model calls, once per frame
+        self.recover_digits = recover_digits
+        self.last_board_region = None
         self.last_sudoku_solution = None
         self.last_solved_sudoku_rotation = 0
 
     def solve(self, frame):
+        return self.solve_into(frame, None)
+
+    def solve_into(self, frame, out):
+        """
+        Like solve, but the returned frame is written into out instead of a new array.
+
+        :param out: array of the shape and type of frame (e.g. one array reused for a whole stream),
+            None means a new array
+        :return: out with the vertices of the board (and the solution) drawn on frame, None if frame is None
+        """
+        record = self.metrics.start_frame()
+        result = self.solve_frame(frame, record, out)
+        self.metrics.finish_frame(record)
+        return result
+
+    def solve_frame(self, frame, record, out=None):
         if frame is None:
+            record.outcome = 'no_frame'
             return frame
 
-        frame = deepcopy(frame)
-        warp_sudoku_board, warp_matrix = get_biggest_quadrangle(frame)
+        # everything is drawn on a copy, the frame of the caller stays as it is
+        if out is None:
+            out = frame.copy()
+        else:
+            np.copyto(out, frame)
+        frame = out
+        record.lap('copy_frame')
+
+        if self.tracker is not None and self.tracker.is_tracking():
+            if self.solve_tracked_frame(frame, record):
+                return frame
+
+        if self.multiscale_detection:
+            warp_sudoku_board, warp_matrix = self.find_board_multiscale(frame)
+        else:
+            warp_sudoku_board, warp_matrix = get_biggest_quadrangle(frame, workspace=self.workspace)
+        record.lap('get_biggest_quadrangle')
 
         if warp_sudoku_board is None:
+            record.outcome = 'no_board'
             return frame
 
-        boxes = get_boxes(warp_sudoku_board)
-        digits_occurrence = check_digits_occurrence(boxes)
-        inputs = prepare_inputs(boxes, digits_occurrence)
+        digits_occurrence = check_digits_occurrence_by_ink(warp_sudoku_board)
+        record.lap('check_digits_occurrence')
+        inputs = prepare_inputs_vectorized(warp_sudoku_board, digits_occurrence, self.workspace)
+        record.lap('prepare_inputs')
 
         if inputs is None:
+            record.outcome = 'no_digits'
             return frame
 
-        current_attempt = 1
-        while current_attempt <= 4:
-            rotation_angle = self.last_solved_sudoku_rotation + 90 * (current_attempt - 1)
-
-            rotated_inputs = rotate_inputs(inputs, rotation_angle)
+        if self.batch_rotations:
+            attempts = self.predict_all_rotations(inputs, record)
+        else:
+            attempts = self.predict_rotations_one_by_one(inputs, record)
 
-            # Compatibility: recent Keras → don't wrap in list
-            predictions = self.model.predict(rotated_inputs)
+        # recovery runs once per frame, for the first rotation that is good enough (with batch_rotations
+        # the most confident one), so a bad frame costs at most one RECOVERY_TIME_LIMIT
+        recovery_tried = False
+        for rotation_angle, predictions in attempts:
+            record.count('rotation_attempts')
 
             if not probabilities_are_good(predictions):
-                current_attempt += 1
+                record.count('rejected_predictions')
                 continue
 
-            digits_grid = get_digits_grid(predictions, digits_occurrence, rotation_angle)
+            digits_grid = get_digits_grid(predictions, digits_occurrence, rotation_angle, record)
+            record.event(
+                'board_recognized', digits_grid=digits_grid, rotation_angle=rotation_angle % 360,
+                confidences=get_confidence_grid(predictions, digits_occurrence, rotation_angle)
+            )
+            record.lap('get_digits_grid')
 
             if self.new_sudoku_solution_may_be_last_solution(digits_grid):
-                result = inverse_warp_digits_on_frame(
-                    digits_grid, self.last_sudoku_solution, frame, warp_sudoku_board.shape, warp_matrix, rotation_angle
+                record.count('last_solution_reused')
+                return self.draw_solution(
+                    digits_grid, self.last_sudoku_solution, frame, warp_sudoku_board.shape, warp_matrix, rotation_angle,
+                    record
                 )
-                return result
 
-            solved_digits_grid = Backtrack.solve_sudoku(digits_grid)
+            solved_digits_grid, cached = self.solution_cache.solve_with_status(digits_grid)
+            record.count('cache_hits' if cached else 'cache_misses')
+            record.lap('solve_sudoku')
             if solved_digits_grid is None:
-                current_attempt += 1
-                continue
+                record.count('solve_failures')
+                if not self.recover_digits or recovery_tried:
+                    continue
+
+                recovery_tried = True
+                recovered = recover_digits_grid(
+                    predictions, digits_occurrence, rotation_angle, self.solution_cache.solver, self.last_sudoku_solution
+                )
+                record.lap('recover_digits')
+                if recovered is None:
+                    record.count('recovery_failures')
+                    continue
+                digits_grid, solved_digits_grid, changed_cells = recovered
+                record.count('recovered_boards')
+                record.event('digits_recovered', digits_grid=digits_grid, changed_cells=changed_cells)
 
             self.last_sudoku_solution = solved_digits_grid
             self.last_solved_sudoku_rotation = rotation_angle
 
-            result = inverse_warp_digits_on_frame(
-                digits_grid, solved_digits_grid, frame, warp_sudoku_board.shape, warp_matrix, rotation_angle
+            return self.draw_solution(
+                digits_grid, solved_digits_grid, frame, warp_sudoku_board.shape, warp_matrix, rotation_angle, record
             )
-            return result
 
+        record.outcome = 'unsolved'
         return frame
 
+    def reset(self):
+        """
+        Forgets everything learned from the previous frames (for images that have nothing in common).
+        """
+        self.last_board_region = None
+        self.last_sudoku_solution = None
+        self.last_solved_sudoku_rotation = 0
+        if self.tracker is not None:
+            self.tracker.reset()
+
+    def find_board_multiscale(self, frame):
+        warp_sudoku_board, warp_matrix = None, None
+        if self.last_board_region is not None:
+            warp_sudoku_board, warp_matrix = get_biggest_quadrangle_multiscale(
+                frame, region=self.last_board_region, workspace=self.workspace
+            )
+        if warp_sudoku_board is None:
+            warp_sudoku_board, warp_matrix = get_biggest_quadrangle_multiscale(frame, workspace=self.workspace)
+
+        self.last_board_region = None
+        if warp_sudoku_board is not None:
+            self.last_board_region = get_board_region(warp_matrix, warp_sudoku_board.shape, frame.shape)
+        return warp_sudoku_board, warp_matrix
+
+    def predict_rotations_one_by_one(self, inputs, record):
+        """
+        :return: generator of (rotation_angle, predictions), the model runs only when the next rotation is needed
+        """
+        for current_attempt in range(4):
+            rotation_angle = self.last_solved_sudoku_rotation + 90 * current_attempt
+
+            rotated_inputs = rotate_inputs(inputs, rotation_angle)
+            record.lap('rotate_inputs')
+
+            # Compatibility: recent Keras → don't wrap in list
+            predictions = self.model.predict(rotated_inputs)
+            record.count('model_calls')
+            record.lap('predict')
+
+            yield rotation_angle, predictions
+
+    def predict_all_rotations(self, inputs, record):
+        """
+        Runs the model once on a (4 * k, 28, 28, 1) batch of all rotations.
+
+        :return: list of (rotation_angle, predictions), the most confident rotation first
+            (the last solved rotation first among equally confident ones)
+        """
+        rotation_angles = [self.last_solved_sudoku_rotation + 90 * i for i in range(4)]
+        batch = rotate_inputs_batch(inputs, rotation_angles)
+        record.lap('rotate_inputs')
+
+        all_predictions = predict_batch(self.model, batch)
+        record.count('model_calls')
+        record.lap('predict')
+
+        attempts = list(zip(rotation_angles, np.split(np.asarray(all_predictions), 4)))
+        attempts.sort(key=lambda attempt: -get_probability_score(attempt[1]))
+        return attempts
+
+    def draw_solution(self, digits_grid, solution_digits_grid, frame, warp_dimensions, warp_matrix, rotation_angle,
+                      record):
+        digits_mask = get_digits_mask(
+            digits_grid, solution_digits_grid, warp_dimensions, rotation_angle,
+            out=get_buffer(self.workspace, 'digits_mask', warp_dimensions[:2])
+        )
+        if self.tracker is not None:
+            # the tracker looks for features on the frame without the digits and keeps the mask between frames
+            self.tracker.start(
+                frame, warp_matrix, warp_dimensions, digits_grid, solution_digits_grid, rotation_angle,
+                digits_mask if self.workspace is None else digits_mask.copy()
+            )
+            record.lap('track_board')
+
+        # frame is a copy already, the digits are drawn in place
+        draw_digits_mask(frame, digits_mask, warp_matrix, workspace=self.workspace)
+        record.lap('inverse_warp_digits_on_frame')
+        record.event('board_solved', solution=solution_digits_grid)
+
+        record.outcome = 'solved'
+        return frame
+
+    def solve_tracked_frame(self, frame, record):
+        """
+        Draws the last solution on the board followed by the tracker, frame is changed in place.
+
+        :return: False if the tracking has been lost (frame is left as it is then)
+        """
+        warp_matrix = self.tracker.track(frame)
+        record.lap('track_board')
+        if warp_matrix is None:
+            record.count('tracking_lost')
+            return False
+
+        record.count('tracked_frames')
+        draw_digits_mask(frame, self.tracker.digits_mask, warp_matrix, workspace=self.workspace)
+        for x, y in np.int32(np.round(self.tracker.get_vertices())):
+            cv.circle(frame, (int(x), int(y)), radius=5, color=(0, 0, 255), thickness=-1)
+        record.lap('inverse_warp_digits_on_frame')
+
+        record.outcome = 'tracked'
+        return True
+
     def new_sudoku_solution_may_be_last_solution(self, digits_grid):
         if self.last_sudoku_solution is None:
             return False
@@ -83,26 +283,68 @@ class WebcamSudokuSolver:
         return True
 
 
-def get_biggest_quadrangle(frame, draw_vertices_on_frame=True):
+def get_biggest_quadrangle(frame, draw_vertices_on_frame=True, workspace=None):
+    """
+    :param workspace: Frame_workspace.FrameWorkspace whose buffers are used instead of new arrays,
+        the returned board is one of them then
+    """
+    frame_dimensions = frame.shape[:2]
     if len(frame.shape) == 3:
-        gray = cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
+        gray = cv.cvtColor(frame, cv.COLOR_BGR2GRAY, dst=get_buffer(workspace, 'gray_frame', frame_dimensions))
     else:
         gray = frame
 
-    blur_gray_frame = cv.GaussianBlur(gray, (7, 7), 0)
+    blur_gray_frame = cv.GaussianBlur(gray, (7, 7), 0, dst=get_buffer(workspace, 'blur_gray_frame', frame_dimensions))
     threshold_frame = cv.adaptiveThreshold(
-        blur_gray_frame, 255, cv.ADAPTIVE_THRESH_MEAN_C, cv.THRESH_BINARY_INV, 11, 2
+        blur_gray_frame, 255, cv.ADAPTIVE_THRESH_MEAN_C, cv.THRESH_BINARY_INV, 11, 2,
+        dst=get_buffer(workspace, 'threshold_frame', frame_dimensions)
+    )
+
+    vertices = find_biggest_quadrangle(threshold_frame)
+    if vertices is None:
+        return None, None
+
+    warp_width, warp_height = get_quadrangle_dimensions(vertices)
+
+    if draw_vertices_on_frame:
+        # Draw red dots at vertices
+        for pt in vertices:
+            x, y = pt[0]
+            cv.circle(frame, (x, y), radius=5, color=(0, 0, 255), thickness=-1)
+
+    pts1 = np.float32(vertices)
+    pts2 = np.float32([[0, 0], [warp_width, 0], [0, warp_height], [warp_width, warp_height]])
+
+    warp_matrix = cv.getPerspectiveTransform(pts1, pts2)
+    warp_sudoku_board = cv.warpPerspective(
+        threshold_frame, warp_matrix, (warp_width, warp_height),
+        dst=get_buffer(workspace, 'warp_sudoku_board', (warp_height, warp_width))
     )
 
+    if warp_sudoku_board.shape[0] < 28 * 9 or warp_sudoku_board.shape[1] < 28 * 9:
+        return None, None
+
+    return warp_sudoku_board, warp_matrix
+
+
+def find_biggest_quadrangle(threshold_frame, convex_hulls=False):
+    """
+    :param convex_hulls: approximate convex hulls of contours (on a downscaled frame digits merge
+        with the border of the board and dent its contour)
+    :return: vertices of the biggest contour that approximates to 4 points (int32 array of shape (4, 1, 2)
+        ordered by reorder_quadrangle_vertices) or None
+    """
     contours, _ = cv.findContours(threshold_frame, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
 
     if len(contours) == 0:
-        return None, None
+        return None
 
     max_area = 0
     vertices = np.array([])
 
     for contour in contours:
+        if convex_hulls:
+            contour = cv.convexHull(contour)
         area = cv.contourArea(contour)
         perimeter = cv.arcLength(contour, True)
         approx = cv.approxPolyDP(contour, 0.02 * perimeter, True)
@@ -112,29 +354,163 @@ def get_biggest_quadrangle(frame, draw_vertices_on_frame=True):
             max_area = area
 
     if vertices.size == 0:
+        return None
+
+    return reorder_quadrangle_vertices(vertices)
+
+
+def get_biggest_quadrangle_multiscale(frame, draw_vertices_on_frame=True, region=None,
+                                      detection_width=DETECTION_WIDTH, warp_size=CANONICAL_WARP_SIZE, workspace=None):
+    """
+    Coarse to fine version of get_biggest_quadrangle whose cost hardly depends on the camera resolution.
+    The quadrangle is searched on a copy of the frame (or of region of it) downscaled to detection_width.
+    Only the board region is then converted to gray and shrunk to about 1.5 * warp_size, the quadrangle is
+    searched again there and its corners are refined with cornerSubPix on the full resolution board.
+    The board is warped to a square of warp_size pixels, which is thresholded afterwards.
+
+    :param region: (x, y, width, height) of the frame to search in (e.g. around the previous board, see
+        get_board_region), the whole frame by default
+    :param workspace: Frame_workspace.FrameWorkspace whose buffers are used instead of new arrays
+    :return: (warp_sudoku_board, warp_matrix) like get_biggest_quadrangle, warp_sudoku_board has shape
+        (warp_size, warp_size) and warp_matrix maps full resolution frame coordinates onto it
+    """
+    frame_height, frame_width = frame.shape[:2]
+    region_x, region_y, region_width, region_height = region if region is not None else (0, 0, frame_width, frame_height)
+    searched = frame[region_y:region_y + region_height, region_x:region_x + region_width]
+
+    # the scale depends on the frame only, so a board is searched at the same size inside or outside of region
+    if frame_width > detection_width:
+        small = get_pyramid_level(searched, detection_width / frame_width, workspace, 'small_frame')
+    else:
+        small = searched
+
+    vertices = find_biggest_quadrangle(get_threshold_frame(small, workspace, 'small_frame'), convex_hulls=True)
+    if vertices is None:
         return None, None
+    corners = scale_vertices(vertices, region_width / small.shape[1], region_height / small.shape[0])
+    corners += (region_x, region_y)
 
-    vertices = reorder_quadrangle_vertices(vertices)
-    warp_width, warp_height = get_quadrangle_dimensions(vertices)
+    warp_width, warp_height = get_quadrangle_dimensions(np.int32(np.round(corners)).reshape((4, 1, 2)))
+    if warp_width < 28 * 9 or warp_height < 28 * 9:
+        return None, None
+
+    # only the board (with a margin of a few coarse pixels) is converted to gray at full resolution
+    margin = int(np.ceil(3 * region_width / small.shape[1]))
+    left, top = np.maximum(np.floor(corners.min(axis=0)).astype(int) - margin, 0)
+    right = min(int(np.ceil(corners[:, 0].max())) + margin + 1, frame_width)
+    bottom = min(int(np.ceil(corners[:, 1].max())) + margin + 1, frame_height)
+    board_region = frame[top:bottom, left:right]
+    if len(board_region.shape) == 3:
+        board_gray = cv.cvtColor(
+            board_region, cv.COLOR_BGR2GRAY, dst=get_buffer(workspace, 'board_gray', board_region.shape[:2])
+        )
+    else:
+        board_gray = board_region
+    local_corners = corners - (left, top)
+
+    # a big board is shrunk with area averaging, so the warp doesn't alias thin strokes
+    shrink = 1.5 * warp_size / max(warp_width, warp_height)
+    if shrink < 1:
+        fine_gray = get_pyramid_level(board_gray, shrink, workspace, 'fine_board')
+    else:
+        fine_gray = board_gray
+    fine_scale_x = board_gray.shape[1] / fine_gray.shape[1]
+    fine_scale_y = board_gray.shape[0] / fine_gray.shape[0]
+
+    # the coarse corners are a few full resolution pixels off, the board is searched again at this level
+    fine_vertices = find_biggest_quadrangle(get_threshold_frame(fine_gray, workspace, 'fine_board'), convex_hulls=True)
+    if fine_vertices is not None:
+        local_corners = scale_vertices(fine_vertices, fine_scale_x, fine_scale_y)
+
+    window = int(np.clip(np.ceil(max(fine_scale_x, fine_scale_y)) + 2, 3, 15))
+    coarse_corners = local_corners.reshape((4, 1, 2))
+    refined = cv.cornerSubPix(
+        board_gray, coarse_corners.copy(), (window, window), (-1, -1),
+        (cv.TERM_CRITERIA_EPS | cv.TERM_CRITERIA_COUNT, 30, 0.01)
+    )
+    # a corner that ran away from the estimate is not the board corner
+    moved = np.linalg.norm((refined - coarse_corners).reshape((4, 2)), axis=1) > window
+    refined[moved] = coarse_corners[moved]
+    local_corners = refined.reshape((4, 2))
 
     if draw_vertices_on_frame:
         # Draw red dots at vertices
-        for pt in vertices:
-            x, y = pt[0]
-            cv.circle(frame, (x, y), radius=5, color=(0, 0, 255), thickness=-1)
+        for x, y in np.int32(np.round(local_corners + (left, top))):
+            cv.circle(frame, (int(x), int(y)), radius=5, color=(0, 0, 255), thickness=-1)
 
-    pts1 = np.float32(vertices)
-    pts2 = np.float32([[0, 0], [warp_width, 0], [0, warp_height], [warp_width, warp_height]])
+    square = np.float32([[0, 0], [warp_size, 0], [0, warp_size], [warp_size, warp_size]])
+    warp_matrix = cv.getPerspectiveTransform(np.float32(local_corners + (left, top)), square)
 
-    warp_matrix = cv.getPerspectiveTransform(pts1, pts2)
-    warp_sudoku_board = cv.warpPerspective(threshold_frame, warp_matrix, (warp_width, warp_height))
-
-    if warp_sudoku_board.shape[0] < 28 * 9 or warp_sudoku_board.shape[1] < 28 * 9:
-        return None, None
+    fine_corners = np.float32((local_corners + 0.5) / (fine_scale_x, fine_scale_y) - 0.5)
+    board_matrix = cv.getPerspectiveTransform(fine_corners, square)
+    warp_gray_board = cv.warpPerspective(
+        fine_gray, board_matrix, (warp_size, warp_size), dst=get_buffer(workspace, 'warp_gray_board', (warp_size, warp_size))
+    )
+    warp_sudoku_board = get_threshold_frame(warp_gray_board, workspace, 'warp_sudoku_board')
 
     return warp_sudoku_board, warp_matrix
 
 
+def get_pyramid_level(image, scale, workspace=None, name='pyramid'):
+    """
+    :param scale: factor smaller than 1
+    :param name: prefix of the workspace buffers of the levels
+    :return: image downscaled with area averaging, halved level by level first (halving has a fast path
+        in OpenCV, one big area resize of a 4K frame takes several times longer)
+    """
+    level = 0
+    while scale <= 0.5:
+        size = (image.shape[1] // 2, image.shape[0] // 2)
+        dst = get_buffer(workspace, '{}_{}'.format(name, level), (size[1], size[0]) + image.shape[2:])
+        image = cv.resize(image, size, dst=dst, interpolation=cv.INTER_AREA)
+        scale *= 2
+        level += 1
+    if scale < 1:
+        size = (int(round(image.shape[1] * scale)), int(round(image.shape[0] * scale)))
+        dst = get_buffer(workspace, '{}_{}'.format(name, level), (size[1], size[0]) + image.shape[2:])
+        image = cv.resize(image, size, dst=dst, interpolation=cv.INTER_AREA)
+    return image
+
+
+def get_threshold_frame(image, workspace=None, name='image'):
+    """
+    :param name: prefix of the workspace buffers
+    :return: image (BGR or gray) blurred and thresholded like in get_biggest_quadrangle
+    """
+    dimensions = image.shape[:2]
+    if len(image.shape) == 3:
+        image = cv.cvtColor(image, cv.COLOR_BGR2GRAY, dst=get_buffer(workspace, name + '_gray', dimensions))
+    blur_gray = cv.GaussianBlur(image, (7, 7), 0, dst=get_buffer(workspace, name + '_blur', dimensions))
+    return cv.adaptiveThreshold(
+        blur_gray, 255, cv.ADAPTIVE_THRESH_MEAN_C, cv.THRESH_BINARY_INV, 11, 2,
+        dst=get_buffer(workspace, name + '_threshold', dimensions)
+    )
+
+
+def scale_vertices(vertices, scale_x, scale_y):
+    """
+    :return: float32 array of shape (4, 2), vertices found on a downscaled image mapped onto the original
+        (pixel centers onto pixel centers)
+    """
+    return np.float32((vertices.reshape((4, 2)) + 0.5) * (scale_x, scale_y) - 0.5)
+
+
+def get_board_region(warp_matrix, warp_dimensions, frame_shape, margin=0.25):
+    """
+    :param warp_dimensions: shape (height, width) of the warped board
+    :param margin: part of the board size added on every side
+    :return: (x, y, width, height) of the frame around the board, for get_biggest_quadrangle_multiscale
+    """
+    height, width = warp_dimensions[:2]
+    corners = np.float32([[[0, 0]], [[width, 0]], [[0, height]], [[width, height]]])
+    corners = cv.perspectiveTransform(corners, np.linalg.inv(warp_matrix)).reshape((4, 2))
+
+    size = corners.max(axis=0) - corners.min(axis=0)
+    left, top = np.maximum(corners.min(axis=0) - margin * size, 0).astype(int)
+    right = int(min(corners[:, 0].max() + margin * size[0], frame_shape[1]))
+    bottom = int(min(corners[:, 1].max() + margin * size[1], frame_shape[0]))
+    return int(left), int(top), right - int(left), bottom - int(top)
+
 
 def reorder_quadrangle_vertices(vertices):
     vertices = vertices.reshape((4, 2))
@@ -203,21 +579,69 @@ def check_digits_occurrence(boxes):                               #preprocess th
 
             strongly_cropped_box = boxes[y][x][3 * height // 20:int(0.85 * height), 3 * width // 20:int(0.85 * width)]
 
-            contours, _ = cv.findContours(strongly_cropped_box, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
+            digits_occurrence[y, x] = box_contains_digit(strongly_cropped_box, height)
 
-            if not contours:
-                continue
+    return digits_occurrence
 
-            biggest = max(contours, key=cv.contourArea)
-            area = cv.contourArea(biggest)
-            if area < 2 * height:
-                continue
 
-            x_, y_, w_, h_ = cv.boundingRect(biggest)
-            if h_ < 0.75 * strongly_cropped_box.shape[0] and w_ < 0.75 * strongly_cropped_box.shape[1]:
-                continue
+def box_contains_digit(strongly_cropped_box, height):
+    """
+    :param strongly_cropped_box: middle of a box without the grid lines
+    :param height: height of the whole box
+    :return: True if the biggest contour of the box is big and tall (or wide) enough to be a digit
+    """
+    contours, _ = cv.findContours(strongly_cropped_box, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
 
-            digits_occurrence[y, x] = True
+    if not contours:
+        return False
+
+    biggest = max(contours, key=cv.contourArea)
+    area = cv.contourArea(biggest)
+    if area < 2 * height:
+        return False
+
+    x_, y_, w_, h_ = cv.boundingRect(biggest)
+    if h_ < 0.75 * strongly_cropped_box.shape[0] and w_ < 0.75 * strongly_cropped_box.shape[1]:
+        return False
+
+    return True
+
+
+def check_digits_occurrence_by_ink(warp_sudoku_board):
+    """
+    Same result as check_digits_occurrence(get_boxes(warp_sudoku_board)), but contours are searched only
+    in cells that have enough ink. A digit's contour is 8-connected and at least 75% of the cropped cell
+    tall or wide, so a cell with fewer non-zero pixels than that can't hold one. Counting pixels of all
+    cells is much cheaper than findContours, most cells of a sudoku are empty.
+
+    :param warp_sudoku_board: 2D numpy array, warped threshold image of the board
+    :return: bool numpy array of shape (9,9)
+    """
+    board_height, board_width = warp_sudoku_board.shape[:2]
+    indexes = np.arange(9)
+    box_top, box_left = indexes * board_height // 9, indexes * board_width // 9
+    box_height = (indexes + 1) * board_height // 9 - box_top
+    box_width = (indexes + 1) * board_width // 9 - box_left
+
+    # the strong crop of check_digits_occurrence in board coordinates
+    crop_top = (box_top + 3 * box_height // 20).tolist()
+    crop_bottom = (box_top + (0.85 * box_height).astype(int)).tolist()
+    crop_left = (box_left + 3 * box_width // 20).tolist()
+    crop_right = (box_left + (0.85 * box_width).astype(int)).tolist()
+
+    ink = np.array([
+        [cv.countNonZero(warp_sudoku_board[crop_top[y]:crop_bottom[y], crop_left[x]:crop_right[x]]) for x in range(9)]
+        for y in range(9)
+    ])
+    crop_height = np.subtract(crop_bottom, crop_top)
+    crop_width = np.subtract(crop_right, crop_left)
+    minimal_ink = np.minimum(0.75 * crop_height[:, None], 0.75 * crop_width[None, :])
+
+    digits_occurrence = np.zeros((9, 9), dtype=bool)
+    for y, x in zip(*np.nonzero(ink >= minimal_ink)):
+        digits_occurrence[y, x] = box_contains_digit(
+            warp_sudoku_board[crop_top[y]:crop_bottom[y], crop_left[x]:crop_right[x]], int(box_height[y])
+        )
 
     return digits_occurrence
 
@@ -247,6 +671,175 @@ def prepare_inputs(boxes, digits_occurrence):
     return digits
 
 
+def prepare_inputs_vectorized(warp_sudoku_board, digits_occurrence, workspace=None):
+    """
+    Same output as prepare_inputs(get_boxes(warp_sudoku_board), digits_occurrence), computed for all digits
+    at once: border trimming, bounding boxes and mass centers are array reductions over a (k, h, w) stack
+    of the cells with digits, contours of all digits come from one findContours call
+    and the result is written into one preallocated (k, 28, 28, 1) float32 tensor.
+
+    :param warp_sudoku_board: 2D numpy array, warped threshold image of the board
+    :param digits_occurrence: bool numpy array of shape (9,9)
+    :param workspace: Frame_workspace.FrameWorkspace for the stacks of cells
+    :return: float32 numpy array of shape (k, 28, 28, 1) or None
+    """
+    cells_y, cells_x = np.nonzero(digits_occurrence)
+    digits_count = len(cells_y)
+    if digits_count == 0:
+        return None
+
+    # cells of get_boxes cropped like in get_cropped_boxes_with_digits, padded to the biggest crop
+    board_height, board_width = warp_sudoku_board.shape[:2]
+    box_top, box_bottom = cells_y * board_height // 9, (cells_y + 1) * board_height // 9
+    box_left, box_right = cells_x * board_width // 9, (cells_x + 1) * board_width // 9
+    box_height, box_width = box_bottom - box_top, box_right - box_left
+
+    crop_top = box_top + (0.05 * box_height).astype(int)
+    crop_left = box_left + (0.05 * box_width).astype(int)
+    heights = box_top + (0.95 * box_height).astype(int) - crop_top
+    widths = box_left + (0.95 * box_width).astype(int) - crop_left
+    max_height, max_width = heights.max(), widths.max()
+
+    crops = get_zeros(workspace, 'digit_crops', (digits_count, max_height, max_width))
+    for i in range(digits_count):
+        crops[i, :heights[i], :widths[i]] = warp_sudoku_board[
+            crop_top[i]:crop_top[i] + heights[i], crop_left[i]:crop_left[i] + widths[i]
+        ]
+
+    binary = np.minimum(crops, 1, out=get_buffer(workspace, 'digit_crops_binary', crops.shape))
+    top, bottom, left, right = get_trimmed_borders(binary, heights, widths)
+    heights, widths = heights - top - bottom, widths - left - right
+    if (heights <= 0).any() or (widths <= 0).any():
+        # a cell has been trimmed away completely, the per-digit path decides what happens then
+        return prepare_inputs(get_boxes(warp_sudoku_board), digits_occurrence)
+
+    # trimmed cells stacked into one tall image, a zero row and column keep contours of neighbours apart
+    tile_height, tile_width = max_height + 1, max_width + 1
+    strip = get_zeros(workspace, 'digit_strip', (digits_count, tile_height, tile_width))
+    for i in range(digits_count):
+        strip[i, top[i]:top[i] + heights[i], left[i]:left[i] + widths[i]] = crops[
+            i, top[i]:top[i] + heights[i], left[i]:left[i] + widths[i]
+        ]
+    strip = strip.reshape((digits_count * tile_height, tile_width))
+
+    contours, _ = cv.findContours(strip, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
+    biggest = [None] * digits_count
+    biggest_area = [0.0] * digits_count
+    for contour in contours:
+        tile = contour[0, 0, 1] // tile_height
+        area = cv.contourArea(contour)
+        if biggest[tile] is None or area > biggest_area[tile]:
+            biggest[tile], biggest_area[tile] = contour, area
+    if any(contour is None for contour in biggest):
+        return None
+
+    mask = get_zeros(workspace, 'digit_strip_mask', strip.shape)
+    cv.drawContours(mask, biggest, -1, (255, 255, 255), -1)
+    strip = cv.bitwise_and(strip, mask, dst=strip)
+
+    digits = np.zeros((digits_count, 28, 28), dtype=np.float32)
+    for i, contour in enumerate(biggest):
+        x, y, w, h = cv.boundingRect(contour)
+        digit = strip[y:y + h, x:x + w]
+
+        # the same arithmetic as resize, so sizes round the same way
+        if h > w:
+            factor = 20.0 / h
+            w, h = int(round(w * factor)), 20
+        else:
+            factor = 20.0 / w
+            w, h = 20, int(round(h * factor))
+        top_margin, left_margin = (28 - h) // 2, (28 - w) // 2
+        digits[i, top_margin:top_margin + h, left_margin:left_margin + w] = cv.resize(
+            digit, (w, h), interpolation=cv.INTER_AREA
+        )
+
+    # mass centers computed like scipy.ndimage.center_of_mass, then every digit is shifted by whole pixels
+    flat = digits.reshape((digits_count, 28 * 28))
+    grid_y, grid_x = np.indices((28, 28), dtype=float).reshape((2, 1, 28 * 28))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        normalizer = flat.sum(axis=1)
+        center_y = (flat * grid_y).sum(axis=1) / normalizer
+        center_x = (flat * grid_x).sum(axis=1) / normalizer
+    shift_y = np.nan_to_num(np.round(28 / 2.0 - center_y)).clip(-28, 28).astype(int)
+    shift_x = np.nan_to_num(np.round(28 / 2.0 - center_x)).clip(-28, 28).astype(int)
+
+    inputs = np.zeros_like(digits)
+    for i in range(digits_count):
+        dy, dx = shift_y[i], shift_x[i]
+        inputs[i, max(dy, 0):28 + min(dy, 0), max(dx, 0):28 + min(dx, 0)] = digits[
+            i, max(-dy, 0):28 - max(dy, 0), max(-dx, 0):28 - max(dx, 0)
+        ]
+
+    inputs /= 255
+    return inputs.reshape((digits_count, 28, 28, 1))
+
+
+def get_zeros(workspace, name, shape):
+    """
+    :return: uint8 array of zeros, a workspace buffer if there is a workspace
+    """
+    if workspace is None:
+        return np.zeros(shape, dtype=np.uint8)
+    buffer = workspace.get(name, shape)
+    buffer.fill(0)
+    return buffer
+
+
+def get_trimmed_borders(binary, heights, widths):
+    """
+    Counts rows and columns that get_cropped_boxes_with_digits trims (rows / columns that are at least
+    90% white: top rows first, then left columns, bottom rows and right columns), for all cells at once.
+
+    :param binary: uint8 numpy array of shape (k, h, w) with 0 and 1, cells padded with 0
+    :param heights: int numpy array of shape (k,), real heights of the cells
+    :param widths: int numpy array of shape (k,), real widths of the cells
+    :return: (top, bottom, left, right) int numpy arrays of shape (k,)
+    """
+    max_height, max_width = binary.shape[1:]
+    rows = np.arange(max_height)[None]
+    cols = np.arange(max_width)[None]
+
+    def is_full(white_pixels, length):
+        return 255 * white_pixels >= np.floor(0.9 * 255 * length)[:, None]
+
+    def leading_run(condition):
+        return np.argmin(np.pad(condition, ((0, 0), (0, 1))), axis=1)
+
+    def count_in_rows(first_row, last_row):
+        # white pixels of every column in rows first_row..last_row - 1 (different for every cell)
+        start, stop = first_row.min(), last_row.max()
+        mask = (rows[:, start:stop] >= first_row[:, None]) & (rows[:, start:stop] < last_row[:, None])
+        return (binary[:, start:stop] * mask[:, :, None]).sum(axis=1, dtype=np.int32)
+
+    # every pixel is visited once by the full sums, the corrections only touch the few trimmed rows / columns
+    row_whites = binary.sum(axis=2, dtype=np.int32)
+    col_whites = binary.sum(axis=1, dtype=np.int32)
+
+    top = leading_run(is_full(row_whites, widths) & (rows < heights[:, None]))
+    heights_left = heights - top
+
+    col_whites -= count_in_rows(np.zeros_like(top), top)
+    left = leading_run(is_full(col_whites, heights_left) & (cols < widths[:, None]) & (heights_left > 0)[:, None])
+    widths_left = widths - left
+
+    stop = left.max()
+    mask = cols[:, :stop] < left[:, None]
+    row_whites -= (binary[:, :, :stop] * mask[:, None, :]).sum(axis=2, dtype=np.int32)
+    # rows counted from the bottom of every cell, at most up to the first row that is left
+    from_bottom = np.clip(heights[:, None] - 1 - rows, 0, max_height - 1)
+    full = np.take_along_axis(is_full(row_whites, widths_left), from_bottom, axis=1)
+    bottom = leading_run(full & (rows < heights_left[:, None]) & (widths_left > 0)[:, None])
+    heights_left -= bottom
+
+    col_whites -= count_in_rows(heights - bottom, heights)
+    from_right = np.clip(widths[:, None] - 1 - cols, 0, max_width - 1)
+    full = np.take_along_axis(is_full(col_whites, heights_left), from_right, axis=1)
+    right = leading_run(full & (cols < widths_left[:, None]) & (heights_left > 0)[:, None])
+
+    return top, bottom, left, right
+
+
 def get_cropped_boxes_with_digits(boxes, digits_occurrence):
     cropped_boxes_with_digits = list()
 
@@ -374,8 +967,9 @@ def get_best_shift(img):
 def rotate_inputs(inputs, rotation_angle):
     rotation_angle = rotation_angle % 360
 
+    # the model doesn't change its inputs, so they are passed on as they are
     if rotation_angle == 0:
-        return deepcopy(inputs)
+        return inputs
 
     rotated_inputs = np.zeros((inputs.shape[0], 28, 28))
 
@@ -392,17 +986,42 @@ def rotate_inputs(inputs, rotation_angle):
     return rotated_inputs.reshape((inputs.shape[0], 28, 28, 1))
 
 
+def get_probability_score(predictions):
+    """
+    :return: average probability of the recognized digits
+    """
+    predictions = np.asarray(predictions)
+    return float(predictions.max(axis=1).mean())
+
+
+def rotate_inputs_batch(inputs, rotation_angles):
+    """
+    :param inputs: numpy array of shape (k, 28, 28, 1)
+    :param rotation_angles: list of angles (multiples of 90, clockwise like rotate_inputs)
+    :return: numpy array of shape (len(rotation_angles) * k, 28, 28, 1), rotations one after another
+    """
+    # np.rot90 turns counterclockwise, so a clockwise angle is a negative number of turns
+    return np.concatenate([np.rot90(inputs, k=-((angle % 360) // 90), axes=(1, 2)) for angle in rotation_angles])
+
+
+def predict_batch(model, inputs):
+    """
+    Runs the model once on the whole batch.
+    Keras predict builds a dataset and a loop around every call, which costs more than the forward pass
+    for a few dozens of digits, predict_on_batch goes straight to the forward pass.
+    """
+    if hasattr(model, 'predict_on_batch'):
+        return np.asarray(model.predict_on_batch(inputs))
+    return np.asarray(model.predict(inputs))
+
+
 def probabilities_are_good(predictions):
-    average = 0
-    for prediction in predictions:
-        average += prediction[np.argmax(prediction)]
-    average = average / len(predictions)
-    if average < 0.9:
+    if get_probability_score(predictions) < 0.9:
         return False
     return True
 
 
-def get_digits_grid(predictions, digits_occurrence, rotation_angle):
+def get_digits_grid(predictions, digits_occurrence, rotation_angle, record=Metrics.NULL_RECORD):
     digits_grid = np.zeros((9, 9), np.uint8)
 
     rotation_angle = rotation_angle % 360
@@ -414,7 +1033,7 @@ def get_digits_grid(predictions, digits_occurrence, rotation_angle):
                 if predictions[i][np.argmax(predictions[i])] > 0.5:
                     digits_grid[y, x] = np.argmax(predictions[i])
                 else:
-                    print('A digit is strange, its probability =', predictions[i][np.argmax(predictions[i])])
+                    record.event('strange_digit', y=y, x=x, probability=float(predictions[i][np.argmax(predictions[i])]))
                     digits_grid[y, x] = 0
                 i += 1
 
@@ -424,64 +1043,103 @@ def get_digits_grid(predictions, digits_occurrence, rotation_angle):
     return digits_grid
 
 
-def inverse_warp_digits_on_frame(digits_grid, solution_digits_grid, frame, warp_dimensions, warp_matrix, rotation_angle):
-    only_digits = get_only_digits_img(digits_grid, solution_digits_grid, warp_dimensions, rotation_angle)
-
-    inverted_warped_only_digits = cv.warpPerspective(
-        only_digits, warp_matrix, (frame.shape[1], frame.shape[0]), flags=cv.WARP_INVERSE_MAP
-    )
-
-    result = np.where(inverted_warped_only_digits.sum(axis=-1, keepdims=True) == 200, inverted_warped_only_digits, frame)
+def get_confidence_grid(predictions, digits_occurrence, rotation_angle):
+    """
+    :return: float32 numpy array of shape (9,9), probability of the recognized digit in every cell with a digit
+        (0 in empty cells), turned like the grid of get_digits_grid
+    """
+    confidences = np.zeros((9, 9), np.float32)
+    confidences[digits_occurrence] = np.asarray(predictions).max(axis=1)
 
-    return result
+    rotation_angle = rotation_angle % 360
+    if rotation_angle != 0:
+        confidences = np.rot90(confidences, k=int((360 - rotation_angle) // 90))
 
+    return confidences
 
-def get_only_digits_img(digits_grid, solution_digits_grid, warp_dimensions, rotation_angle):
-    blank = np.zeros((warp_dimensions[0], warp_dimensions[1], 3), dtype='uint8')
 
+def recover_digits_grid(predictions, digits_occurrence, rotation_angle, solve, known_solution=None,
+                        max_cells=RECOVERY_MAX_CELLS, max_changes=RECOVERY_MAX_CHANGES, top_k=RECOVERY_TOP_K,
+                        min_probability=RECOVERY_MIN_PROBABILITY, blank_probability=RECOVERY_BLANK_PROBABILITY,
+                        time_limit=RECOVERY_TIME_LIMIT):
+    """
+    Looks for the most likely solvable grid when the grid of get_digits_grid can't be solved (a misread digit).
+    Only the least confident digits are changed (digits repeated in a row, column or box first),
+    to their 2nd .. top_k-th most probable digits or to an empty cell. Grids are tried in the order of their
+    joint probability (the product of the probabilities of the chosen digits), grids with a repeated digit
+    aren't solved at all.
+
+    :param predictions: (k, 10) probabilities of the crops, like for get_digits_grid
+    :param solve: function that takes a (9,9) grid and returns its solution or None
+    :param known_solution: solution of the last board, a grid that agrees with it is taken without solving
+    :param min_probability: 2nd .. top_k-th choices less probable than this are left out
+    :param blank_probability: least probability of an empty cell, the model itself rarely predicts 0 for a blob
+    :param time_limit: seconds after which the search gives up
+    :return: (digits_grid, solution, changed_cells) or None, digits_grid is turned like the one of get_digits_grid
+        and changed_cells is the number of digits that differ from it
+    """
+    deadline = time.perf_counter() + time_limit
+    predictions = np.asarray(predictions, dtype=np.float64)
     rotation_angle = rotation_angle % 360
-    digits_grid = np.rot90(digits_grid, k=int(rotation_angle // 90))
-    solution_digits_grid = np.rot90(solution_digits_grid, k=int(rotation_angle // 90))
 
-    box_height, box_width = warp_dimensions[0] // 9, warp_dimensions[1] // 9
-    dimension = min(box_width, box_height)
-
-    digits = np.zeros((9, 9, dimension, dimension, 3), dtype='uint8')
+    # the grid as the crops lie on the board, turned back only at the end
+    base_grid = get_digits_grid(predictions, digits_occurrence, 0).ravel()
+    cells = np.flatnonzero(digits_occurrence)
+    if known_solution is not None:
+        known_solution = np.rot90(known_solution, k=int(rotation_angle // 90)).ravel()
+
+    confidences = predictions.max(axis=1)
+    conflicts = Backtrack.get_conflicting_cells(base_grid.reshape((1, 9, 9))).ravel()[cells]
+    suspects = np.lexsort((confidences, ~conflicts))[:max_cells]
+
+    # digits 1..9 of every suspect from the most probable one, then the empty cell
+    choices = np.argsort(-predictions[suspects, 1:], axis=1, kind='stable')[:, :top_k] + 1
+    probabilities = np.take_along_axis(predictions[suspects], choices, axis=1)
+    choices = np.concatenate((choices, np.zeros((len(suspects), 1), dtype=choices.dtype)), axis=1)
+    probabilities = np.concatenate(
+        (probabilities, np.maximum(predictions[suspects, :1], blank_probability)), axis=1
+    )
+    log_probabilities = np.log(np.maximum(probabilities, 1e-12))
+
+    # every combination of choices (index into the row of choices of every suspect), in itertools.product order
+    combinations = np.indices((choices.shape[1],) * len(suspects), dtype=np.intp).reshape((len(suspects), -1)).T
+    rows = np.arange(len(suspects))
+    values = choices[rows, combinations]
+    changed_cells = np.count_nonzero(values != base_grid[cells[suspects]], axis=1)
+    costs = -log_probabilities[rows, combinations].sum(axis=1)
+
+    # the grid without changes has failed already
+    allowed = ((probabilities[rows, combinations] >= min_probability) | (combinations == 0)).all(axis=1)
+    candidates = np.flatnonzero(allowed & (changed_cells > 0) & (changed_cells <= max_changes))
+    if len(candidates) == 0:
+        return None
+    candidates = candidates[np.argsort(costs[candidates], kind='stable')]
 
-    font = cv.FONT_HERSHEY_DUPLEX
+    grids = np.repeat(base_grid[None], len(candidates), axis=0)
+    grids[:, cells[suspects]] = values[candidates]
+    grids = grids.reshape((-1, 9, 9))
+    consistent = Backtrack.grids_are_consistent(grids)
 
-    for y in range(9):
-        for x in range(9):
-            if digits_grid[y, x] != 0:
-                continue
-            text = str(solution_digits_grid[y, x])
+    for candidate, digits_grid in zip(candidates[consistent], grids[consistent]):
+        if time.perf_counter() > deadline:
+            return None
 
-            scale = dimension / 41
+        if known_solution is not None and np.all((digits_grid.ravel() == 0) | (digits_grid.ravel() == known_solution)):
+            solution = np.rot90(known_solution.reshape((9, 9)), k=int((360 - rotation_angle) // 90))
+            digits_grid = np.rot90(digits_grid, k=int((360 - rotation_angle) // 90))
+            return digits_grid, solution, int(changed_cells[candidate])
 
-            (text_height, text_width), _ = cv.getTextSize(text, font, fontScale=scale, thickness=3)
+        digits_grid = np.rot90(digits_grid, k=int((360 - rotation_angle) // 90))
+        solution = solve(digits_grid)
+        if solution is not None:
+            return digits_grid, solution, int(changed_cells[candidate])
 
-            bottom_left_x = box_width // 2 - text_width // 2
-            bottom_left_y = box_height // 2 + text_height // 2
+    return None
 
-            digits[y, x] = cv.putText(
-                digits[y, x], text, (bottom_left_x, bottom_left_y), font, scale, (0, 200, 0),
-                thickness=3, lineType=cv.LINE_AA
-            )
 
-            start_y = y * box_height
-            start_x = x * box_width
-
-            if rotation_angle == 0:
-                temp = digits[y, x]
-                blank[start_y:start_y + dimension, start_x:start_x + dimension] = temp
-            elif rotation_angle == 90:
-                temp = cv.rotate(digits[y, x], cv.ROTATE_90_COUNTERCLOCKWISE)
-                blank[start_y:start_y + dimension, start_x:start_x + dimension] = temp
-            elif rotation_angle == 180:
-                temp = cv.rotate(digits[y, x], cv.ROTATE_180)
-                blank[start_y:start_y + dimension, start_x:start_x + dimension] = temp
-            elif rotation_angle == 270:
-                temp = cv.rotate(digits[y, x], cv.ROTATE_90_CLOCKWISE)
-                blank[start_y:start_y + dimension, start_x:start_x + dimension] = temp
-
-    return blank
+def inverse_warp_digits_on_frame(digits_grid, solution_digits_grid, frame, warp_dimensions, warp_matrix, rotation_angle):
+    """
+    :return: copy of frame with the digits of the solution drawn in the empty cells of the board
+    """
+    digits_mask = get_digits_mask(digits_grid, solution_digits_grid, warp_dimensions, rotation_angle)
+    return draw_digits_mask(frame.copy(), digits_mask, warp_matrix)
@@ -0,0 +1,158 @@
+# The bitmask engine (solve_sudoku / solve_with_bitmasks) must give the same solutions as the
+# Dancing Links backend (solve_unique) and return None for puzzles without a solution.
+
+import numpy as np
+import pytest
+
+import Backtrack
+from Benchmark import EASY_PUZZLES, HARD_PUZZLES, SEVENTEEN_CLUE_PUZZLES, parse_puzzle
+
+PUZZLES = EASY_PUZZLES + HARD_PUZZLES + SEVENTEEN_CLUE_PUZZLES
+
+
+@pytest.mark.parametrize('puzzle', PUZZLES)
+@pytest.mark.parametrize('solve', [Backtrack.solve_sudoku, Backtrack.solve_with_bitmasks])
+def test_solution_matches_solve_unique(solve, puzzle):
+    digits_grid = parse_puzzle(puzzle)
+    solution = solve(digits_grid)
+
+    assert solution is not None
+    assert solution.shape == (9, 9) and solution.dtype == digits_grid.dtype
+    assert np.array_equal(solution, Backtrack.solve_unique(digits_grid))
+    assert np.array_equal(solution[digits_grid != 0], digits_grid[digits_grid != 0])
+
+
+@pytest.mark.parametrize('puzzle', PUZZLES)
+def test_input_is_not_changed(puzzle):
+    digits_grid = parse_puzzle(puzzle)
+    Backtrack.solve_with_bitmasks(digits_grid)
+    assert np.array_equal(digits_grid, parse_puzzle(puzzle))
+
+
+def test_duplicate_digit_in_row():
+    digits_grid = parse_puzzle(EASY_PUZZLES[0])
+    digits_grid[0, 0] = digits_grid[0, 2]
+    assert Backtrack.solve_sudoku(digits_grid) is None
+    assert Backtrack.solve_with_bitmasks(digits_grid) is None
+
+
+def test_duplicate_digit_in_box():
+    digits_grid = np.zeros((9, 9), dtype=np.uint8)
+    digits_grid[0, 0] = digits_grid[2, 2] = 5
+    assert Backtrack.solve_sudoku(digits_grid) is None
+
+
+def test_digit_out_of_range():
+    digits_grid = parse_puzzle(EASY_PUZZLES[0])
+    digits_grid[0, 0] = 10
+    assert Backtrack.solve_sudoku(digits_grid) is None
+
+
+def test_cell_without_candidates():
+    # the clues don't repeat, but nothing fits into the top right cell
+    digits_grid = np.zeros((9, 9), dtype=np.uint8)
+    digits_grid[0, :8] = np.arange(1, 9)
+    digits_grid[4, 8] = 9
+    assert Backtrack.solve_sudoku(digits_grid) is None
+    assert Backtrack.solve_unique(digits_grid) is None
+
+
+def test_unsolvable_without_contradiction_in_the_clues():
+    # every cell has candidates, but the 9 of the first row can't go anywhere
+    digits_grid = np.zeros((9, 9), dtype=np.uint8)
+    digits_grid[0, :6] = np.arange(1, 7)
+    digits_grid[1, 6] = 9
+    digits_grid[5, 7] = 9
+    digits_grid[7, 8] = 9
+    assert Backtrack.solve_sudoku(digits_grid) is None
+    assert Backtrack.solve_unique(digits_grid) is None
+
+
+def test_bigger_grids():
+    rng = np.random.default_rng(0)
+    for box_size in (2, 4):
+        size = box_size * box_size
+        y, x = np.indices((size, size))
+        solution = ((box_size * (y % box_size) + y // box_size + x) % size + 1).astype(np.uint8)
+        digits_grid = np.where(rng.random((size, size)) < 0.5, 0, solution).astype(np.uint8)
+
+        result = Backtrack.solve_sudoku(digits_grid)
+        assert result is not None
+        assert np.array_equal(result[digits_grid != 0], digits_grid[digits_grid != 0])
+        assert Backtrack.count_solutions(result) == 1
+
+
+@pytest.mark.parametrize('puzzle', PUZZLES)
+def test_solve_unique_with_bitmasks(puzzle):
+    digits_grid = parse_puzzle(puzzle)
+    assert np.array_equal(Backtrack.solve_unique_with_bitmasks(digits_grid), Backtrack.solve_unique(digits_grid))
+
+
+@pytest.mark.parametrize('puzzle', SEVENTEEN_CLUE_PUZZLES)
+def test_solve_unique_with_bitmasks_rejects_ambiguous_grid(puzzle):
+    digits_grid = parse_puzzle(puzzle)
+    digits_grid.ravel()[np.flatnonzero(digits_grid)[-1]] = 0
+    assert Backtrack.solve_unique_with_bitmasks(digits_grid) is None
+
+
+def test_solve_unique_with_bitmasks_rejects_contradictory_grid():
+    digits_grid = parse_puzzle(EASY_PUZZLES[0])
+    digits_grid[0, 0] = digits_grid[0, 2]
+    assert Backtrack.solve_unique_with_bitmasks(digits_grid) is None
+    assert Backtrack.solve_unique_with_bitmasks(np.zeros((9, 9), dtype=np.uint8)) is None
+
+
+def get_unsolvable_grid():
+    # every cell has candidates, but the 9 of the first row can't go anywhere
+    digits_grid = np.zeros((9, 9), dtype=np.uint8)
+    digits_grid[0, :6] = np.arange(1, 7)
+    digits_grid[1, 6] = digits_grid[5, 7] = digits_grid[7, 8] = 9
+    return digits_grid
+
+
+def test_solve_many_mixed_stack():
+    ambiguous = parse_puzzle(SEVENTEEN_CLUE_PUZZLES[0])
+    ambiguous.ravel()[np.flatnonzero(ambiguous)[0]] = 0
+    duplicate = parse_puzzle(EASY_PUZZLES[0])
+    duplicate[0, 0] = duplicate[0, 2]
+    out_of_range = parse_puzzle(EASY_PUZZLES[1])
+    out_of_range[4, 4] = 10
+
+    unique = [parse_puzzle(puzzle) for puzzle in PUZZLES]
+    grids = np.stack(unique + [ambiguous, get_unsolvable_grid(), duplicate, out_of_range])
+    solved, status = Backtrack.solve_many(grids)
+
+    assert solved.shape == grids.shape and status.shape == (len(grids),)
+    for digits_grid, solution in zip(unique, solved):
+        assert np.array_equal(solution, Backtrack.solve_unique_with_bitmasks(digits_grid))
+    assert (status[:len(unique)] == Backtrack.SOLVED).all()
+
+    # several solutions: solve_many returns one of them, solve_unique_with_bitmasks none
+    assert status[len(unique)] == Backtrack.SOLVED
+    assert Backtrack.is_solved_correctly(solved[len(unique)])
+    assert np.array_equal(solved[len(unique)][ambiguous != 0], ambiguous[ambiguous != 0])
+    assert Backtrack.solve_unique_with_bitmasks(ambiguous) is None
+
+    assert list(status[len(unique) + 1:]) == [Backtrack.UNSOLVABLE, Backtrack.INVALID, Backtrack.INVALID]
+    assert np.array_equal(solved[len(unique) + 1], get_unsolvable_grid())
+    assert np.array_equal(solved[len(unique) + 2], duplicate)
+    for digits_grid in grids[len(unique) + 1:]:
+        assert Backtrack.solve_unique_with_bitmasks(digits_grid) is None
+
+
+def test_solve_many_empty_stack():
+    grids = np.zeros((0, 9, 9), dtype=np.uint8)
+    solved, status = Backtrack.solve_many(grids)
+    assert solved.shape == (0, 9, 9) and status.shape == (0,)
+
+
+def test_solve_many_all_invalid():
+    duplicate = parse_puzzle(EASY_PUZZLES[0])
+    duplicate[0, 0] = duplicate[0, 2]
+
+    solved, status = Backtrack.solve_many(duplicate[None])
+    assert list(status) == [Backtrack.INVALID]
+    assert np.array_equal(solved[0], duplicate)
+
+    solved, status = Backtrack.solve_many(np.stack([duplicate, duplicate]))
+    assert list(status) == [Backtrack.INVALID, Backtrack.INVALID]
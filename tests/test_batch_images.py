@@ -0,0 +1,61 @@
+# Batch_images writes one line per image in input order, an image that makes OpenCV or the solver raise
+# gets an error line and the images after it are still solved.
+
+import io
+import json
+import os
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+import Batch_images
+import Inference
+from Benchmark import SAMPLE_IMAGE_PATH, SAMPLE_IMAGE_PUZZLE, StubModel, parse_puzzle
+
+
+@pytest.fixture
+def stub_model(monkeypatch):
+    monkeypatch.setattr(Inference, 'load_model', lambda path, backend=None: StubModel(parse_puzzle(SAMPLE_IMAGE_PUZZLE)))
+
+
+def test_error_doesnt_stop_the_batch(tmp_path, stub_model, monkeypatch):
+    not_an_image = tmp_path / 'notes.png'
+    not_an_image.write_bytes(b'not an image')
+    broken = str(tmp_path / 'broken.png')
+    cv.imwrite(broken, np.zeros((10, 10, 3), dtype=np.uint8))
+
+    imread = cv.imread
+
+    def failing_imread(path, *arguments):
+        if path == broken:
+            raise cv.error('decoder failed')
+        return imread(path, *arguments)
+
+    monkeypatch.setattr(cv, 'imread', failing_imread)
+
+    paths = [SAMPLE_IMAGE_PATH, broken, str(not_an_image), SAMPLE_IMAGE_PATH]
+    output_stream = io.StringIO()
+    stats = Batch_images.solve_images(paths, output_stream, 'model.npz', workers=0)
+    results = [json.loads(line) for line in output_stream.getvalue().splitlines()]
+
+    assert [result['path'] for result in results] == paths
+    assert [result['outcome'] for result in results] == ['solved', 'error', 'unreadable', 'solved']
+    assert 'decoder failed' in results[1]['error']
+    assert results[1]['seconds'] >= 0
+    assert results[3]['digits_grid'] == SAMPLE_IMAGE_PUZZLE
+    assert stats.outcomes == {'solved': 2, 'error': 1, 'unreadable': 1}
+
+
+def test_solver_error(stub_model, monkeypatch):
+    Batch_images.init_worker('model.npz')
+
+    def failing_solve(frame):
+        raise ValueError('no luck')
+
+    monkeypatch.setattr(Batch_images.solver, 'solve', failing_solve)
+    result = Batch_images.solve_image(0, SAMPLE_IMAGE_PATH)
+
+    assert result['outcome'] == 'error'
+    assert result['error'] == 'ValueError: no luck'
+    assert os.path.exists(result['path'])
@@ -0,0 +1,114 @@
+# BoardTracker follows a rendered board moved by a known homography and gives up when it should.
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+import Backtrack
+import Board_tracking
+import Metrics
+import Solution_cache
+import Webcam_preprocess
+from Benchmark import EASY_PUZZLES, StubModel, parse_puzzle, render_frame
+
+FRAME_SIZE = (1280, 720)
+BACKGROUND = (120, 120, 120)
+
+
+def move(frame, homography):
+    return cv.warpPerspective(frame, homography, FRAME_SIZE, borderValue=BACKGROUND)
+
+
+def get_homography(dx, dy, angle=0.0, scale=1.0):
+    center = (FRAME_SIZE[0] / 2, FRAME_SIZE[1] / 2)
+    return np.vstack((cv.getRotationMatrix2D(center, angle, scale), [0, 0, 1])) @ np.array(
+        [[1, 0, dx], [0, 1, dy], [0, 0, 1]], dtype=np.float64
+    )
+
+
+@pytest.fixture
+def started():
+    """
+    :return: (tracker, frame) with the tracker following the board of frame
+    """
+    digits_grid = parse_puzzle(EASY_PUZZLES[0])
+    frame = render_frame(digits_grid, FRAME_SIZE)
+    board, warp_matrix = Webcam_preprocess.get_biggest_quadrangle(frame, draw_vertices_on_frame=False)
+    assert board is not None
+
+    tracker = Board_tracking.BoardTracker()
+    tracker.start(
+        frame, warp_matrix, board.shape, digits_grid, Backtrack.solve_unique(digits_grid), 0,
+        np.zeros(board.shape[:2], dtype=np.uint8)
+    )
+    assert tracker.is_tracking()
+    return tracker, frame
+
+
+@pytest.mark.parametrize('dx, dy, angle, scale', [(6, -4, 0, 1), (-10, 8, 1.5, 1), (3, 3, -1, 1.04)])
+def test_corners_follow_the_homography(started, dx, dy, angle, scale):
+    tracker, frame = started
+    homography = get_homography(dx, dy, angle, scale)
+    expected = cv.perspectiveTransform(tracker.get_vertices().reshape((-1, 1, 2)), homography).reshape((4, 2))
+
+    assert tracker.track(move(frame, homography)) is not None
+    assert np.abs(tracker.get_vertices() - expected).max() < 0.5
+    assert tracker.tracked_frames == 1
+
+
+def test_corners_follow_several_frames(started):
+    tracker, frame = started
+    vertices = tracker.get_vertices()
+    homography = np.eye(3)
+    for _ in range(5):
+        homography = get_homography(4, 2) @ homography
+        assert tracker.track(move(frame, homography)) is not None
+
+    expected = cv.perspectiveTransform(vertices.reshape((-1, 1, 2)), homography).reshape((4, 2))
+    assert np.abs(tracker.get_vertices() - expected).max() < 2.0
+
+
+def test_other_board_loses_the_track(started):
+    tracker, _ = started
+    other_board = render_frame(parse_puzzle(EASY_PUZZLES[1]), FRAME_SIZE)
+    assert tracker.track(other_board) is None
+    assert not tracker.is_tracking()
+    assert tracker.track(other_board) is None
+
+
+def test_board_leaving_the_frame_loses_the_track(started):
+    tracker, frame = started
+    assert tracker.track(move(frame, get_homography(500, 0))) is None
+    assert not tracker.is_tracking()
+
+
+def test_redetect_interval(started):
+    tracker, frame = started
+    tracker.redetect_interval = 2
+    assert tracker.track(frame) is not None
+    assert tracker.track(frame) is not None
+    assert tracker.track(frame) is None
+    assert not tracker.is_tracking()
+
+
+def test_solver_falls_back_to_detection():
+    digits_grid = parse_puzzle(EASY_PUZZLES[0])
+    other_grid = parse_puzzle(EASY_PUZZLES[1])
+    records = list()
+    solver = Webcam_preprocess.WebcamSudokuSolver(
+        StubModel(digits_grid), solution_cache=Solution_cache.SolutionCache(),
+        metrics=Metrics.SolverMetrics([records.append]), tracker=Board_tracking.BoardTracker()
+    )
+    frame = render_frame(digits_grid, FRAME_SIZE)
+
+    solver.solve(frame)
+    solver.solve(move(frame, get_homography(5, 5)))
+    # another board: the tracker gives up and the full detection runs on the same frame
+    solver.model = StubModel(other_grid)
+    solver.solve(render_frame(other_grid, FRAME_SIZE))
+
+    assert [record.outcome for record in records] == ['solved', 'tracked', 'solved']
+    assert records[1].counters.get('tracked_frames') == 1
+    assert records[2].counters.get('tracking_lost') == 1
+    assert np.array_equal(solver.last_sudoku_solution, Backtrack.solve_unique(other_grid))
+    assert solver.tracker.is_tracking()
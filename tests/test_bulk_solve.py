@@ -0,0 +1,111 @@
+# Bulk_solve writes one line per puzzle in input order, with and without the process pool,
+# and keeps at most max_pending chunks in flight.
+
+import io
+
+import numpy as np
+import pytest
+
+import Backtrack
+import Bulk_solve
+from Benchmark import EASY_PUZZLES, HARD_PUZZLES, SEVENTEEN_CLUE_PUZZLES, parse_puzzle
+
+
+def get_lines():
+    """
+    :return: (input lines, expected output lines), '' for lines that are not puzzles or have no solution
+    """
+    unsolvable = parse_puzzle(EASY_PUZZLES[0])
+    unsolvable[0, 0] = unsolvable[0, 2]
+    lines = list()
+    for puzzle in EASY_PUZZLES + HARD_PUZZLES + SEVENTEEN_CLUE_PUZZLES:
+        lines.append(puzzle)
+        lines.append(puzzle.replace('0', '.'))
+    lines[3:3] = [''.join(map(str, unsolvable.ravel())), 'not a puzzle', '1' * 80]
+
+    expected = list()
+    for line in lines:
+        digits_grid = Bulk_solve.parse_puzzle(line)
+        solution = Backtrack.solve_unique(digits_grid) if digits_grid is not None else None
+        expected.append(''.join(map(str, solution.ravel())) if solution is not None else '')
+    return lines, expected
+
+
+class CountingLines:
+    """
+    Input stream that remembers how many lines have been read.
+    """
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.read = 0
+
+    def __iter__(self):
+        for line in self.lines:
+            self.read += 1
+            yield line + '\n'
+
+
+class RecordingOutput(io.StringIO):
+    """
+    Output stream that remembers how many input lines had been read at every write.
+    """
+
+    def __init__(self, input_stream):
+        super().__init__()
+        self.input_stream = input_stream
+        self.read_at_write = list()
+
+    def write(self, text):
+        self.read_at_write.append(self.input_stream.read)
+        return super().write(text)
+
+
+@pytest.mark.parametrize('workers', [0, 2])
+@pytest.mark.parametrize('chunk_size', [1, 4, 100])
+def test_output_order(workers, chunk_size):
+    lines, expected = get_lines()
+    output_stream = io.StringIO()
+    stats = Bulk_solve.solve_stream(io.StringIO('\n'.join(lines) + '\n\n'), output_stream, workers, chunk_size)
+
+    assert output_stream.getvalue().split('\n')[:-1] == expected
+    assert stats.puzzles == len(lines)
+    assert stats.invalid == 2
+    assert stats.unsolved == 3
+
+
+def test_bounded_pending_chunks():
+    lines, expected = get_lines()
+    input_stream = CountingLines(lines * 4)
+    output_stream = RecordingOutput(input_stream)
+    chunk_size, max_pending = 3, 2
+
+    Bulk_solve.solve_stream(input_stream, output_stream, workers=2, chunk_size=chunk_size, max_pending=max_pending)
+
+    assert output_stream.getvalue().split('\n')[:-1] == expected * 4
+    # chunk i is written before more than max_pending chunks after it have been read
+    for i, read in enumerate(output_stream.read_at_write):
+        assert read <= (i + max_pending + 1) * chunk_size + 1
+
+
+def test_main_with_files(tmp_path):
+    lines, expected = get_lines()
+    input_path = tmp_path / 'puzzles.txt'
+    input_path.write_text('\n'.join(lines) + '\n')
+
+    outputs = list()
+    for workers in (0, 2):
+        output_path = tmp_path / 'solutions-{}.txt'.format(workers)
+        assert Bulk_solve.main([str(input_path), '-o', str(output_path), '--workers', str(workers),
+                                '--chunk-size', '5']) == 0
+        outputs.append(output_path.read_text())
+
+    assert outputs[0] == outputs[1]
+    assert outputs[0].split('\n')[:-1] == expected
+
+
+def test_parse_puzzle():
+    assert Bulk_solve.parse_puzzle('.' * 81).sum() == 0
+    assert np.array_equal(Bulk_solve.parse_puzzle(EASY_PUZZLES[0]), parse_puzzle(EASY_PUZZLES[0]))
+    assert Bulk_solve.parse_puzzle('1' * 82) is None
+    assert Bulk_solve.parse_puzzle('x' * 81) is None
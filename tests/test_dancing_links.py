@@ -0,0 +1,65 @@
+# count_solutions and solve_unique (Dancing Links) on worst-case 17-clue puzzles, ambiguous and contradictory grids.
+
+import numpy as np
+import pytest
+
+import Backtrack
+from Benchmark import SEVENTEEN_CLUE_PUZZLES, parse_puzzle
+
+
+@pytest.mark.parametrize('puzzle', SEVENTEEN_CLUE_PUZZLES)
+def test_seventeen_clue_puzzles_are_unique(puzzle):
+    digits_grid = parse_puzzle(puzzle)
+    assert np.count_nonzero(digits_grid) == 17
+    assert Backtrack.count_solutions(digits_grid) == 1
+
+
+@pytest.mark.parametrize('puzzle', SEVENTEEN_CLUE_PUZZLES)
+def test_solve_unique_agrees_with_solve_sudoku(puzzle):
+    digits_grid = parse_puzzle(puzzle)
+    solution = Backtrack.solve_unique(digits_grid)
+
+    assert solution is not None
+    assert Backtrack.is_solved_correctly(solution)
+    assert np.array_equal(solution, Backtrack.solve_sudoku(digits_grid))
+    assert np.array_equal(solution[digits_grid != 0], digits_grid[digits_grid != 0])
+
+
+@pytest.mark.parametrize('puzzle', SEVENTEEN_CLUE_PUZZLES)
+def test_ambiguous_grid(puzzle):
+    # no sudoku with 16 clues has a unique solution
+    digits_grid = parse_puzzle(puzzle)
+    digits_grid.ravel()[np.flatnonzero(digits_grid)[0]] = 0
+
+    assert Backtrack.count_solutions(digits_grid) >= 2
+    assert Backtrack.solve_unique(digits_grid) is None
+    assert Backtrack.solve_sudoku(digits_grid) is not None
+
+
+def test_empty_grid():
+    digits_grid = np.zeros((9, 9), dtype=np.uint8)
+    assert Backtrack.count_solutions(digits_grid, limit=5) == 5
+    assert Backtrack.solve_unique(digits_grid) is None
+
+
+def test_contradictory_grid():
+    digits_grid = parse_puzzle(SEVENTEEN_CLUE_PUZZLES[0])
+    column = np.flatnonzero(digits_grid[0])[0]
+    digits_grid[0, (column + 1) % 9] = digits_grid[0, column]
+
+    assert Backtrack.count_solutions(digits_grid) == 0
+    assert Backtrack.solve_unique(digits_grid) is None
+
+
+@pytest.mark.parametrize('limit', [0, -1])
+def test_limit_below_one(limit):
+    digits_grid = parse_puzzle(SEVENTEEN_CLUE_PUZZLES[0])
+    with pytest.raises(ValueError):
+        Backtrack.count_solutions(digits_grid, limit=limit)
+
+
+def test_grid_with_wrong_shape():
+    with pytest.raises(ValueError):
+        Backtrack.count_solutions(np.zeros((9, 8), dtype=np.uint8))
+    with pytest.raises(ValueError):
+        Backtrack.count_solutions(np.zeros((8, 8), dtype=np.uint8))
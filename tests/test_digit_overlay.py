@@ -0,0 +1,142 @@
+# The glyph-atlas overlay of Digit_overlay paints the same pixels as the original full-frame renderer,
+# except for a few pixels on the edges of the glyphs where the fixed-point rounding of the warp differs.
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+import Backtrack
+import Digit_overlay
+import Frame_workspace
+import Webcam_preprocess
+from Benchmark import EASY_PUZZLES, HARD_PUZZLES, SAMPLE_IMAGE_PATH, parse_puzzle, render_frame
+
+MAX_DIFFERENT_PIXELS = 10
+
+
+def get_only_digits_img(digits_grid, solution_digits_grid, warp_dimensions, rotation_angle):
+    """
+    The original renderer: every digit is drawn in color into its own cell image, then rotated.
+    """
+    blank = np.zeros((warp_dimensions[0], warp_dimensions[1], 3), dtype=np.uint8)
+
+    rotation_angle = rotation_angle % 360
+    digits_grid = np.rot90(digits_grid, k=int(rotation_angle // 90))
+    solution_digits_grid = np.rot90(solution_digits_grid, k=int(rotation_angle // 90))
+
+    box_height, box_width = warp_dimensions[0] // 9, warp_dimensions[1] // 9
+    dimension = min(box_width, box_height)
+    font = cv.FONT_HERSHEY_DUPLEX
+    scale = dimension / 41
+
+    for y, x in zip(*np.nonzero(digits_grid == 0)):
+        text = str(solution_digits_grid[y, x])
+        (text_height, text_width), _ = cv.getTextSize(text, font, fontScale=scale, thickness=3)
+        bottom_left = (box_width // 2 - text_width // 2, box_height // 2 + text_height // 2)
+
+        digit = np.zeros((dimension, dimension, 3), dtype=np.uint8)
+        cv.putText(digit, text, bottom_left, font, scale, (0, 200, 0), thickness=3, lineType=cv.LINE_AA)
+        if rotation_angle in Digit_overlay.ROTATIONS:
+            digit = cv.rotate(digit, Digit_overlay.ROTATIONS[rotation_angle])
+        blank[y * box_height:y * box_height + dimension, x * box_width:x * box_width + dimension] = digit
+    return blank
+
+
+def warp_digits_on_frame(only_digits, frame, warp_matrix):
+    warped = cv.warpPerspective(only_digits, warp_matrix, (frame.shape[1], frame.shape[0]), flags=cv.WARP_INVERSE_MAP)
+    return np.where(warped.sum(axis=-1, keepdims=True) == 200, warped, frame)
+
+
+def get_painted(result, frame):
+    return np.any(result != frame, axis=-1)
+
+
+def get_boards():
+    """
+    :return: list of (name, frame, digits_grid, solution_digits_grid)
+    """
+    boards = list()
+    for name, puzzle in (('easy', EASY_PUZZLES[0]), ('hard', HARD_PUZZLES[0])):
+        digits_grid = parse_puzzle(puzzle)
+        solution = Backtrack.solve_unique(digits_grid)
+        for frame_size in ((1280, 720), (1920, 1080)):
+            boards.append(('{}-{}x{}'.format(name, *frame_size), render_frame(digits_grid, frame_size),
+                           digits_grid, solution))
+
+    # the board of the sample photo is not solved, any digits do for the overlay
+    rng = np.random.default_rng(0)
+    digits_grid = np.where(rng.random((9, 9)) < 0.3, 1, 0)
+    boards.append(('2.jpg', cv.imread(SAMPLE_IMAGE_PATH), digits_grid, rng.integers(1, 10, (9, 9))))
+    return boards
+
+
+BOARDS = get_boards()
+
+
+@pytest.fixture(params=BOARDS, ids=[board[0] for board in BOARDS])
+def board(request):
+    _, frame, digits_grid, solution = request.param
+    warp_sudoku_board, warp_matrix = Webcam_preprocess.get_biggest_quadrangle(frame, draw_vertices_on_frame=False)
+    assert warp_sudoku_board is not None
+    return frame, digits_grid, solution, warp_sudoku_board.shape, warp_matrix
+
+
+@pytest.mark.parametrize('rotation_angle', [0, 90, 180, 270, -90])
+def test_overlay_matches_the_original_renderer(board, rotation_angle):
+    frame, digits_grid, solution, warp_dimensions, warp_matrix = board
+
+    only_digits = get_only_digits_img(digits_grid, solution, warp_dimensions, rotation_angle)
+    expected = warp_digits_on_frame(only_digits, frame, warp_matrix)
+    result = Webcam_preprocess.inverse_warp_digits_on_frame(
+        digits_grid, solution, frame, warp_dimensions, warp_matrix, rotation_angle
+    )
+
+    assert result.shape == frame.shape and result.dtype == frame.dtype
+    expected_painted = get_painted(expected, frame)
+    painted = get_painted(result, frame)
+    assert expected_painted.sum() > 1000
+
+    different = painted != expected_painted
+    assert different.sum() <= MAX_DIFFERENT_PIXELS
+    # every differing pixel is next to a pixel painted by both
+    both = (painted & expected_painted).astype(np.uint8)
+    assert np.all(cv.dilate(both, np.ones((3, 3), dtype=np.uint8))[different])
+    assert np.all(result[painted] == Digit_overlay.OVERLAY_COLOR)
+    assert np.array_equal(result[~painted], frame[~painted])
+
+
+def test_overlay_with_workspace(board):
+    frame, digits_grid, solution, warp_dimensions, warp_matrix = board
+    expected = Webcam_preprocess.inverse_warp_digits_on_frame(
+        digits_grid, solution, frame, warp_dimensions, warp_matrix, 0
+    )
+
+    workspace = Frame_workspace.FrameWorkspace(frame.shape)
+    mask = Digit_overlay.get_digits_mask(
+        digits_grid, solution, warp_dimensions, 0, out=workspace.get('digits_mask', warp_dimensions[:2])
+    )
+    for _ in range(2):
+        result = Digit_overlay.draw_digits_mask(frame.copy(), mask, warp_matrix, workspace=workspace)
+        assert np.array_equal(result, expected)
+
+
+def test_board_outside_of_the_frame():
+    frame = np.full((100, 100, 3), 50, dtype=np.uint8)
+    mask = np.full((90, 90), 255, dtype=np.uint8)
+    # the board is 1000 pixels to the right of the frame
+    warp_matrix = np.array([[1, 0, -1000], [0, 1, 0], [0, 0, 1]], dtype=np.float64)
+    assert Digit_overlay.get_board_rectangle(warp_matrix, mask.shape, frame.shape) is None
+    assert np.array_equal(Digit_overlay.draw_digits_mask(frame.copy(), mask, warp_matrix), frame)
+
+
+def test_glyph_atlas_evicts_the_least_recently_used():
+    atlas = Digit_overlay.GlyphAtlas(max_size=2)
+    glyphs = atlas.get_glyphs(50, 50, 0)
+    assert glyphs.shape == (10, 50, 50)
+    assert not glyphs[0].any() and all(glyphs[digit].max() == 255 for digit in range(1, 10))
+
+    atlas.get_glyphs(40, 50, 90)
+    assert atlas.get_glyphs(50, 50, 360) is glyphs
+    atlas.get_glyphs(30, 30, 0)
+    assert list(atlas.entries) == [(50, 50, 0), (30, 30, 0)]
+    assert np.array_equal(atlas.get_glyphs(40, 50, 90), Digit_overlay.render_glyphs(40, 50, 90))
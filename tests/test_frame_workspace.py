@@ -0,0 +1,103 @@
+# solve_into with a FrameWorkspace draws the same frames as solve without one and reuses its buffers.
+
+import numpy as np
+import pytest
+
+import Backtrack
+import Frame_workspace
+import Metrics
+import Solution_cache
+import Webcam_preprocess
+from Benchmark import EASY_PUZZLES, HARD_PUZZLES, StubModel, parse_puzzle, render_frame
+
+FRAME_SIZE = (1280, 720)
+
+
+def get_solver(digits_grid, workspace=None, multiscale_detection=False):
+    records = list()
+    solver = Webcam_preprocess.WebcamSudokuSolver(
+        StubModel(digits_grid), solution_cache=Solution_cache.SolutionCache(),
+        metrics=Metrics.SolverMetrics([records.append]), multiscale_detection=multiscale_detection,
+        workspace=workspace
+    )
+    return solver, records
+
+
+@pytest.mark.parametrize('multiscale_detection', [False, True])
+def test_solve_into_matches_solve(multiscale_detection):
+    digits_grid = parse_puzzle(EASY_PUZZLES[0])
+    frame = render_frame(digits_grid, FRAME_SIZE)
+    frames = [frame, np.full_like(frame, 120), np.roll(frame, (7, -11), axis=(0, 1)), frame]
+
+    solver, records = get_solver(digits_grid, multiscale_detection=multiscale_detection)
+    workspace_solver, workspace_records = get_solver(
+        digits_grid, Frame_workspace.FrameWorkspace(frame.shape), multiscale_detection
+    )
+    out = np.empty_like(frame)
+    for frame in frames:
+        original = frame.copy()
+        expected = solver.solve(frame)
+        assert workspace_solver.solve_into(frame, out) is out
+        assert np.array_equal(out, expected)
+        assert np.array_equal(frame, original)
+
+    assert [record.outcome for record in records] == ['solved', 'no_board', 'solved', 'solved']
+    assert [record.outcome for record in workspace_records] == [record.outcome for record in records]
+
+
+@pytest.mark.parametrize('multiscale_detection', [False, True])
+def test_solve_into_reuses_the_buffers(multiscale_detection):
+    digits_grid = parse_puzzle(EASY_PUZZLES[0])
+    frame = render_frame(digits_grid, FRAME_SIZE)
+    workspace = Frame_workspace.FrameWorkspace(frame.shape)
+    solver, records = get_solver(digits_grid, workspace, multiscale_detection)
+    reference_solver, _ = get_solver(digits_grid, multiscale_detection=multiscale_detection)
+    out = np.empty_like(frame)
+
+    # the first frame of the multiscale detection searches the whole frame, the next ones around the board
+    for shift in range(2):
+        solver.solve_into(np.roll(frame, shift, axis=1), out)
+        reference_solver.solve(np.roll(frame, shift, axis=1))
+    buffers = dict(workspace.buffers)
+    allocations = workspace.allocations
+
+    for shift in range(2, 6):
+        # the board moves by a pixel on every frame
+        assert solver.solve_into(np.roll(frame, shift, axis=1), out) is out
+        assert np.array_equal(out, reference_solver.solve(np.roll(frame, shift, axis=1)))
+
+    assert workspace.allocations == allocations
+    assert all(workspace.buffers[name] is buffer for name, buffer in buffers.items())
+    assert 'digits_mask' in buffers and 'overlay_color' in buffers
+    assert [record.outcome for record in records] == ['solved'] * 6
+
+
+def test_workspace_follows_a_new_board_size():
+    digits_grid = parse_puzzle(HARD_PUZZLES[0])
+    workspace = Frame_workspace.FrameWorkspace()
+    solver, records = get_solver(digits_grid, workspace)
+
+    for frame_size in (FRAME_SIZE, (1000, 800), (1000, 800)):
+        frame = render_frame(digits_grid, frame_size)
+        expected = get_solver(digits_grid)[0].solve(frame)
+        assert np.array_equal(solver.solve_into(frame, np.empty_like(frame)), expected)
+    assert [record.outcome for record in records] == ['solved'] * 3
+    assert np.array_equal(solver.last_sudoku_solution, Backtrack.solve_unique(digits_grid))
+    assert workspace.buffers['gray_frame'].shape == (800, 1000)
+
+
+def test_solve_into_without_frame():
+    solver, records = get_solver(parse_puzzle(EASY_PUZZLES[0]), Frame_workspace.FrameWorkspace())
+    assert solver.solve_into(None, None) is None
+    assert records[0].outcome == 'no_frame'
+
+
+def test_workspace_get():
+    workspace = Frame_workspace.FrameWorkspace((4, 5, 3))
+    assert workspace.allocations == 3
+    gray = workspace.get('gray_frame', (4, 5))
+    assert workspace.get('gray_frame', (4, 5)) is gray and workspace.allocations == 3
+    assert workspace.get('gray_frame', (4, 5), np.float32).dtype == np.float32
+    assert workspace.get('gray_frame', (6, 5)).shape == (6, 5)
+    assert workspace.allocations == 5
+    assert Frame_workspace.get_buffer(None, 'gray_frame', (4, 5)) is None
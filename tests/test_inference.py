@@ -0,0 +1,114 @@
+# The numpy backend (export_keras_weights + NumpyModel) against a direct forward pass of a tiny random model.
+# The layers only mimic what export_keras_weights reads from Keras layers, so TensorFlow is not needed.
+
+import numpy as np
+import pytest
+
+import Inference
+
+
+class Layer:
+    def __init__(self, config, weights=()):
+        self.config = dict(config, name='{}_{}'.format(self.__class__.__name__.lower(), id(self)))
+        self.weights = list(weights)
+
+    def get_config(self):
+        return self.config
+
+    def get_weights(self):
+        return self.weights
+
+
+class Conv2D(Layer):
+    pass
+
+
+class MaxPooling2D(Layer):
+    pass
+
+
+class Dropout(Layer):
+    pass
+
+
+class Flatten(Layer):
+    pass
+
+
+class Dense(Layer):
+    pass
+
+
+class Model:
+    def __init__(self, layers):
+        self.layers = layers
+
+
+def get_model(rng, use_bias=True, activation='relu'):
+    conv_weights = [rng.normal(size=(3, 3, 1, 4)), rng.normal(size=4)]
+    dense_weights = [rng.normal(size=(13 * 13 * 4, 10)) * 0.1, rng.normal(size=10)]
+    if not use_bias:
+        conv_weights, dense_weights = conv_weights[:1], dense_weights[:1]
+
+    return Model([
+        Conv2D({'strides': (1, 1), 'padding': 'valid', 'dilation_rate': (1, 1), 'activation': activation}, conv_weights),
+        MaxPooling2D({'pool_size': (2, 2), 'strides': (2, 2), 'padding': 'valid'}),
+        Dropout({'rate': 0.5}),
+        Flatten({}),
+        Dense({'activation': 'softmax'}, dense_weights),
+    ])
+
+
+def forward(model, inputs):
+    """
+    Reference forward pass with plain loops over the output pixels.
+    """
+    x = inputs.astype(np.float64)
+    for layer in model.layers:
+        weights = layer.get_weights()
+        if isinstance(layer, Conv2D):
+            kernel = weights[0]
+            bias = weights[1] if len(weights) > 1 else np.zeros(kernel.shape[-1])
+            height, width = x.shape[1] - kernel.shape[0] + 1, x.shape[2] - kernel.shape[1] + 1
+            outputs = np.zeros((len(x), height, width, kernel.shape[-1]))
+            for y in range(height):
+                for x_ in range(width):
+                    window = x[:, y:y + kernel.shape[0], x_:x_ + kernel.shape[1], :]
+                    outputs[:, y, x_] = np.einsum('nhwc,hwcf->nf', window, kernel) + bias
+            x = outputs if layer.config['activation'] == 'linear' else np.maximum(outputs, 0)
+        elif isinstance(layer, MaxPooling2D):
+            height, width = x.shape[1] // 2, x.shape[2] // 2
+            outputs = np.zeros((len(x), height, width, x.shape[3]))
+            for y in range(height):
+                for x_ in range(width):
+                    outputs[:, y, x_] = x[:, 2 * y:2 * y + 2, 2 * x_:2 * x_ + 2].max(axis=(1, 2))
+            x = outputs
+        elif isinstance(layer, Flatten):
+            x = x.reshape((len(x), -1))
+        elif isinstance(layer, Dense):
+            x = x @ weights[0] + (weights[1] if len(weights) > 1 else 0)
+            x = np.exp(x - x.max(axis=1, keepdims=True))
+            x /= x.sum(axis=1, keepdims=True)
+    return x
+
+
+@pytest.mark.parametrize('use_bias', [True, False])
+@pytest.mark.parametrize('activation', ['relu', 'linear'])
+def test_numpy_model_matches_forward_pass(tmp_path, use_bias, activation):
+    rng = np.random.default_rng(0)
+    model = get_model(rng, use_bias, activation)
+    path = str(tmp_path / 'model.npz')
+    Inference.export_keras_weights(model, path)
+
+    inputs = rng.random((5, 28, 28, 1), dtype=np.float32)
+    predictions = Inference.load_model(path).predict(inputs)
+
+    assert predictions.shape == (5, 10)
+    np.testing.assert_allclose(predictions, forward(model, inputs), rtol=1e-4, atol=1e-6)
+
+
+def test_unknown_activation_is_rejected_at_export(tmp_path):
+    model = get_model(np.random.default_rng(0), activation='gelu')
+    with pytest.raises(ValueError):
+        Inference.export_keras_weights(model, str(tmp_path / 'model.npz'))
+    assert not (tmp_path / 'model.npz').exists()
@@ -0,0 +1,158 @@
+# Sinks of Metrics: percentiles of RollingHistogram, the Prometheus text file and the disabled record.
+
+import threading
+
+import numpy as np
+import pytest
+
+import Live_pipeline
+import Metrics
+import Solution_cache
+import Webcam_preprocess
+from Benchmark import EASY_PUZZLES, StubModel, parse_puzzle, render_frame
+
+
+def get_record(total, stages=None, counters=None, events=(), outcome='solved'):
+    record = Metrics.FrameRecord()
+    record.total = total
+    record.stages = dict(stages or {})
+    record.counters = dict(counters or {})
+    record.events = [(name, {}) for name in events]
+    record.outcome = outcome
+    return record
+
+
+def parse_text(text):
+    """
+    :return: dict sample name with labels -> value, and dict metric name -> type
+    """
+    samples, types = dict(), dict()
+    for line in text.splitlines():
+        if line.startswith('# TYPE '):
+            _, _, name, kind = line.split(' ')
+            types[name] = kind
+        else:
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+    return samples, types
+
+
+def test_rolling_histogram_percentiles():
+    histogram = Metrics.RollingHistogram(window_size=100)
+    rng = np.random.default_rng(0)
+    totals = rng.random(250)
+    for total in totals:
+        histogram(get_record(total, {'predict': total / 2}))
+
+    # only the last 100 frames are kept
+    for percentile in (0, 50, 90, 99, 100):
+        assert histogram.get_percentile(percentile) == pytest.approx(np.percentile(totals[-100:], percentile))
+        assert histogram.get_percentile(percentile, 'predict') == pytest.approx(np.percentile(totals[-100:] / 2, percentile))
+    assert histogram.get_percentile(50, 'solve_sudoku') == 0.0
+
+    summary = histogram.get_summary((50, 99))
+    assert set(summary) == {'total', 'predict'}
+    assert summary['total'][99] == pytest.approx(np.percentile(totals[-100:], 99))
+
+
+def test_rolling_histogram_known_values():
+    histogram = Metrics.RollingHistogram(window_size=5)
+    for total in (0.5, 0.1, 0.4, 0.2, 0.3):
+        histogram(get_record(total))
+    assert histogram.get_percentile(50) == pytest.approx(0.3)
+    assert histogram.get_percentile(0) == pytest.approx(0.1)
+    assert histogram.get_percentile(100) == pytest.approx(0.5)
+
+
+def test_prometheus_text_format(tmp_path):
+    path = str(tmp_path / 'sudoku.prom')
+    sink = Metrics.PrometheusTextFile(path, interval=0)
+    sink(get_record(0.004, {'predict': 0.003}, {'model_calls': 1}, ['strange_digit'], 'solved'))
+    sink(get_record(0.2, {'predict': 0.06}, {'model_calls': 4, 'solve_failures': 1}, (), 'unsolved'))
+
+    with open(path) as file:
+        text = file.read()
+    assert text.endswith('\n')
+    assert not (tmp_path / 'sudoku.prom.tmp').exists()
+    samples, types = parse_text(text)
+
+    assert types['sudoku_solver_frames_total'] == 'counter'
+    assert types['sudoku_solver_stage_seconds'] == 'histogram'
+    assert samples['sudoku_solver_frames_total'] == 2
+    assert samples['sudoku_solver_model_calls_total'] == 5
+    assert samples['sudoku_solver_solve_failures_total'] == 1
+    # counters that haven't happened yet are written as 0
+    assert samples['sudoku_solver_cache_hits_total'] == 0
+    assert samples['sudoku_solver_outcomes_total{outcome="solved"}'] == 1
+    assert samples['sudoku_solver_outcomes_total{outcome="unsolved"}'] == 1
+    assert samples['sudoku_solver_events_total{event="strange_digit"}'] == 1
+
+    # buckets are cumulative and end with +Inf equal to the count
+    for stage, values in (('total', (0.004, 0.2)), ('predict', (0.003, 0.06))):
+        previous = 0
+        for bound in Metrics.PROMETHEUS_BUCKETS:
+            count = samples['sudoku_solver_stage_seconds_bucket{{stage="{}",le="{}"}}'.format(stage, bound)]
+            assert count == sum(value <= bound for value in values)
+            assert count >= previous
+            previous = count
+        assert samples['sudoku_solver_stage_seconds_bucket{{stage="{}",le="+Inf"}}'.format(stage)] == 2
+        assert samples['sudoku_solver_stage_seconds_count{{stage="{}"}}'.format(stage)] == 2
+        assert samples['sudoku_solver_stage_seconds_sum{{stage="{}"}}'.format(stage)] == pytest.approx(sum(values))
+
+
+def test_close_writes_the_last_interval(tmp_path):
+    path = str(tmp_path / 'sudoku.prom')
+    sink = Metrics.PrometheusTextFile(path, interval=3600)
+    metrics = Metrics.SolverMetrics([sink])
+    for _ in range(3):
+        record = metrics.start_frame()
+        record.outcome = 'no_board'
+        metrics.finish_frame(record)
+
+    # only the first frame has been written, the others came within the interval
+    with open(path) as file:
+        assert parse_text(file.read())[0]['sudoku_solver_frames_total'] == 1
+
+    metrics.close()
+    with open(path) as file:
+        assert parse_text(file.read())[0]['sudoku_solver_frames_total'] == 3
+
+
+def test_pipeline_closes_the_metrics(tmp_path):
+    path = str(tmp_path / 'sudoku.prom')
+    digits_grid = parse_puzzle(EASY_PUZZLES[0])
+    solver = Webcam_preprocess.WebcamSudokuSolver(
+        StubModel(digits_grid), solution_cache=Solution_cache.SolutionCache(),
+        metrics=Metrics.SolverMetrics([Metrics.PrometheusTextFile(path, interval=3600)])
+    )
+    frames = [render_frame(digits_grid, (640, 480))] * 3
+
+    # queues big enough to keep every frame
+    stats = Live_pipeline.LivePipeline(solver, queue_size=len(frames)).run(frames)
+
+    assert stats.processed == 3
+    with open(path) as file:
+        samples, _ = parse_text(file.read())
+    assert samples['sudoku_solver_frames_total'] == 3
+
+
+def test_null_record_has_no_state():
+    record = Metrics.DISABLED.start_frame()
+    assert record is Metrics.NULL_RECORD
+
+    def set_outcome():
+        for _ in range(1000):
+            record.outcome = 'solved'
+            record.count('model_calls')
+
+    threads = [threading.Thread(target=set_outcome) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert Metrics.NULL_RECORD.outcome is None
+    with pytest.raises(AttributeError):
+        record.stages = dict()
+    Metrics.DISABLED.finish_frame(record)
+    assert Metrics.DISABLED.get_stats() == {'frames': 0, 'counters': {}, 'outcomes': {}}
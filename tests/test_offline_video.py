@@ -0,0 +1,99 @@
+# Offline_video writes every frame of a video once and in order, with the same outcomes in this process
+# and in a pool of workers, also when the frame count is an exact multiple of chunk_size.
+
+import multiprocessing
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+import Inference
+import Offline_video
+from Benchmark import EASY_PUZZLES, StubModel, parse_puzzle, render_frame
+
+FRAME_SIZE = (640, 480)
+FRAME_RATE = 10.0
+
+
+@pytest.fixture
+def stub_model(monkeypatch):
+    # the worker processes are forked, so they load the stub too
+    monkeypatch.setattr(Inference, 'load_model', lambda path, backend=None: StubModel(parse_puzzle(EASY_PUZZLES[0])))
+
+
+def write_video(path, frame_count):
+    """
+    Writes a video of the board moving to the right, every fifth frame is empty.
+
+    :return: number of empty frames
+    """
+    board = render_frame(parse_puzzle(EASY_PUZZLES[0]), FRAME_SIZE)
+    writer = cv.VideoWriter(str(path), cv.VideoWriter_fourcc(*'MJPG'), FRAME_RATE, FRAME_SIZE)
+    assert writer.isOpened()
+    empty_frames = 0
+    for index in range(frame_count):
+        if index % 5 == 4:
+            writer.write(np.full_like(board, 120))
+            empty_frames += 1
+        else:
+            writer.write(np.roll(board, 2 * index, axis=1))
+    writer.release()
+    return empty_frames
+
+
+def read_video(path):
+    capture = cv.VideoCapture(str(path))
+    frames = list()
+    while True:
+        successful_frame_read, frame = capture.read()
+        if not successful_frame_read:
+            break
+        frames.append(frame)
+    capture.release()
+    return frames
+
+
+@pytest.mark.parametrize('frame_count, chunk_size', [(12, 4), (11, 4), (3, 8)])
+def test_workers_give_the_same_video(tmp_path, stub_model, frame_count, chunk_size):
+    if multiprocessing.get_start_method() != 'fork':
+        pytest.skip('the workers have to inherit the stub model')
+
+    input_path = tmp_path / 'session.avi'
+    empty_frames = write_video(input_path, frame_count)
+    assert Offline_video.get_video_properties(str(input_path)) == (FRAME_RATE, FRAME_SIZE, frame_count)
+
+    results = list()
+    for workers in (0, 2):
+        output_path = tmp_path / 'annotated-{}.avi'.format(workers)
+        stats = Offline_video.process_video(
+            str(input_path), str(output_path), 'model.npz', fourcc='MJPG', workers=workers, chunk_size=chunk_size,
+            max_pending=3
+        )
+        results.append((stats, read_video(output_path)))
+
+    (stats, frames), (pool_stats, pool_frames) = results
+    assert stats.frames == pool_stats.frames == frame_count
+    assert stats.outcomes == pool_stats.outcomes
+    assert sum(stats.outcomes.values()) == frame_count
+    assert stats.outcomes.get('no_board', 0) == empty_frames
+    assert stats.counters == pool_stats.counters
+
+    assert len(frames) == len(pool_frames) == frame_count
+    assert all(np.array_equal(frame, pool_frame) for frame, pool_frame in zip(frames, pool_frames))
+    # the solution is drawn on the frames with the board
+    inputs = read_video(input_path)
+    assert not np.array_equal(frames[0], inputs[0])
+
+
+def test_warm_up_matches_a_sequential_run(tmp_path, stub_model):
+    input_path = tmp_path / 'session.avi'
+    write_video(input_path, 9)
+
+    outputs = list()
+    for chunk_size in (3, 9):
+        output_path = tmp_path / 'annotated-{}.avi'.format(chunk_size)
+        Offline_video.process_video(
+            str(input_path), str(output_path), 'model.npz', fourcc='MJPG', workers=0, chunk_size=chunk_size
+        )
+        outputs.append(read_video(output_path))
+    assert all(np.array_equal(frame, other_frame) for frame, other_frame in zip(*outputs))
@@ -0,0 +1,113 @@
+# Puzzle_corpus round trip (CorpusWriter -> Corpus) and writers that fail half way.
+
+import numpy as np
+import pytest
+
+import Puzzle_corpus
+
+
+def get_grids(rng, count):
+    return rng.integers(0, 10, (count, 9, 9), dtype=np.uint8)
+
+
+@pytest.mark.parametrize('count', [0, 1, 7, 64])
+@pytest.mark.parametrize('with_solutions', [False, True])
+@pytest.mark.parametrize('with_difficulties', [False, True])
+def test_round_trip(tmp_path, count, with_solutions, with_difficulties):
+    rng = np.random.default_rng(count)
+    path = str(tmp_path / 'puzzles.sdk')
+    puzzles = get_grids(rng, count)
+    solutions = get_grids(rng, count) if with_solutions else None
+    difficulties = rng.integers(0, 256, count, dtype=np.uint8) if with_difficulties else None
+
+    # odd chunks, so chunks don't line up with anything
+    with Puzzle_corpus.CorpusWriter(path, with_solutions, with_difficulties) as writer:
+        for start in range(0, count, 3):
+            writer.write(
+                puzzles[start:start + 3],
+                solutions[start:start + 3] if with_solutions else None,
+                difficulties[start:start + 3] if with_difficulties else None,
+            )
+
+    corpus = Puzzle_corpus.Corpus(path)
+    assert len(corpus) == count
+    assert np.array_equal(corpus[:], puzzles)
+    if count:
+        assert np.array_equal(corpus[count - 1], puzzles[-1])
+        assert np.array_equal(corpus[-1], puzzles[-1])
+        assert np.array_equal(corpus[1:count:2], puzzles[1:count:2])
+
+    if with_solutions:
+        assert np.array_equal(corpus.get_solutions(slice(None)), solutions)
+    else:
+        with pytest.raises(ValueError):
+            corpus.get_solutions(0)
+
+    if with_difficulties:
+        assert np.array_equal(corpus.difficulties, difficulties)
+    else:
+        assert corpus.difficulties is None
+
+    chunks = list(corpus.iter_chunks(chunk_size=5))
+    assert [start for start, _ in chunks] == list(range(0, count, 5))
+    if chunks:
+        assert np.array_equal(np.concatenate([chunk for _, chunk in chunks]), puzzles)
+
+
+def test_pack_grids():
+    # 81 cells are an odd number of nibbles, the last one is padding
+    grids = np.arange(81, dtype=np.uint8).reshape((1, 9, 9)) % 10
+    packed = Puzzle_corpus.pack_grids(grids)
+    assert packed.shape == (1, Puzzle_corpus.PACKED_SIZE)
+    assert packed[0, 0] == 0x01
+    assert packed[0, -1] == (grids[0, 8, 8] << 4)
+    assert np.array_equal(Puzzle_corpus.unpack_grids(packed), grids)
+
+
+def test_write_corpus(tmp_path):
+    path = str(tmp_path / 'puzzles.sdk')
+    puzzles = get_grids(np.random.default_rng(0), 5)
+    Puzzle_corpus.write_corpus(path, puzzles)
+    assert np.array_equal(Puzzle_corpus.Corpus(path)[:], puzzles)
+
+
+def test_failed_writer_leaves_no_corpus(tmp_path):
+    path = tmp_path / 'puzzles.sdk'
+    rng = np.random.default_rng(0)
+
+    with pytest.raises(RuntimeError):
+        with Puzzle_corpus.CorpusWriter(str(path), with_solutions=True) as writer:
+            writer.write(get_grids(rng, 5), get_grids(rng, 5))
+            raise RuntimeError('generator failed')
+
+    assert not path.exists()
+
+
+def test_bad_chunk_writes_nothing(tmp_path):
+    path = str(tmp_path / 'puzzles.sdk')
+    rng = np.random.default_rng(0)
+    puzzles = get_grids(rng, 4)
+    solutions = get_grids(rng, 4)
+
+    with Puzzle_corpus.CorpusWriter(path, with_solutions=True) as writer:
+        writer.write(puzzles[:2], solutions[:2])
+        with pytest.raises(ValueError):
+            # 3 puzzles and 2 solutions
+            writer.write(puzzles[:3], solutions[:2])
+        writer.write(puzzles[2:], solutions[2:])
+
+    corpus = Puzzle_corpus.Corpus(path)
+    assert np.array_equal(corpus[:], puzzles)
+    assert np.array_equal(corpus.get_solutions(slice(None)), solutions)
+
+
+def test_unfinished_corpus_is_rejected(tmp_path):
+    # a process killed before close leaves the header with count 0 and the puzzles after it
+    path = str(tmp_path / 'puzzles.sdk')
+    writer = Puzzle_corpus.CorpusWriter(path)
+    writer.write(get_grids(np.random.default_rng(0), 3))
+    writer.file.flush()
+
+    with pytest.raises(ValueError):
+        Puzzle_corpus.Corpus(path)
+    writer.abort()
@@ -0,0 +1,67 @@
+# Generated puzzles are unique and minimal, grade_puzzle is monotone on the benchmark puzzles.
+
+import numpy as np
+import pytest
+
+import Backtrack
+import Puzzle_generator
+from Benchmark import EASY_PUZZLES, HARD_PUZZLES, PUZZLE_SETS, parse_puzzle
+
+
+@pytest.fixture(scope='module')
+def chunk():
+    return Puzzle_generator.generate_chunk(seed=1, chunk_index=0, start=0, stop=8)
+
+
+def test_generated_puzzles_are_unique(chunk):
+    puzzles, solutions, levels, attempts = chunk
+    assert attempts == len(puzzles) == 8
+    for puzzle, solution, level in zip(puzzles, solutions, levels):
+        assert Backtrack.count_solutions(puzzle, limit=2) == 1
+        assert Backtrack.is_solved_correctly(solution)
+        assert np.array_equal(Backtrack.solve_unique(puzzle), solution)
+        assert level == Puzzle_generator.grade_puzzle(puzzle)
+
+
+def test_generated_puzzles_are_minimal(chunk):
+    puzzles, _, _, _ = chunk
+    for puzzle in puzzles[:2]:
+        for index in np.flatnonzero(puzzle):
+            fewer_clues = puzzle.copy()
+            fewer_clues.ravel()[index] = 0
+            assert Backtrack.count_solutions(fewer_clues, limit=2) == 2
+
+
+def test_generated_class_follows_the_mix():
+    mix = {'easy': 0.5, 'expert': 0.5}
+    puzzles, _, levels, _ = Puzzle_generator.generate_chunk(2, 0, 0, 6, mix)
+    classes = [Puzzle_generator.get_difficulty_class(level) for level in levels]
+    assert classes == Puzzle_generator.get_target_classes(0, 6, mix)
+    for puzzle in puzzles:
+        assert Backtrack.count_solutions(puzzle, limit=2) == 1
+
+
+def test_grades_of_benchmark_puzzles():
+    names = Puzzle_generator.get_difficulty_names()
+    easy = [Puzzle_generator.grade_puzzle(parse_puzzle(puzzle)) for puzzle in EASY_PUZZLES]
+    hard = [Puzzle_generator.grade_puzzle(parse_puzzle(puzzle)) for puzzle in HARD_PUZZLES]
+
+    assert max(easy) < min(hard)
+    assert all(Puzzle_generator.get_difficulty_class(level) == 'expert' for level in hard)
+    assert names[max(hard)] == 'search'
+    assert Puzzle_generator.grade_puzzle(Backtrack.solve_unique(parse_puzzle(EASY_PUZZLES[0]))) == 0
+
+
+@pytest.mark.parametrize('puzzle', [puzzle for puzzles in PUZZLE_SETS.values() for puzzle in puzzles])
+def test_more_clues_never_make_a_puzzle_harder(puzzle):
+    rng = np.random.default_rng(0)
+    digits_grid = parse_puzzle(puzzle)
+    solution = Backtrack.solve_unique(digits_grid)
+
+    level = Puzzle_generator.grade_puzzle(digits_grid)
+    for index in rng.permutation(np.flatnonzero(digits_grid == 0)):
+        digits_grid.ravel()[index] = solution.ravel()[index]
+        next_level = Puzzle_generator.grade_puzzle(digits_grid)
+        assert next_level <= level
+        level = next_level
+    assert level == 0
@@ -0,0 +1,112 @@
+# recover_digits_grid finds the board behind misread digits and noise read as a digit,
+# and WebcamSudokuSolver tries it once per frame.
+
+import numpy as np
+import pytest
+
+import Backtrack
+import Solution_cache
+import Webcam_preprocess
+from Benchmark import EASY_PUZZLES, HARD_PUZZLES, SEVENTEEN_CLUE_PUZZLES, StubModel, get_misread_predictions, \
+    parse_puzzle, render_frame
+
+PUZZLES = EASY_PUZZLES + SEVENTEEN_CLUE_PUZZLES
+
+
+def get_predictions(digits_grid):
+    """
+    :return: (predictions, digits_occurrence) of a sure model that reads every clue of digits_grid right
+    """
+    digits_occurrence = digits_grid != 0
+    predictions = np.full((np.count_nonzero(digits_occurrence), 10), 0.002)
+    predictions[np.arange(len(predictions)), digits_grid[digits_occurrence]] = 0.982
+    return predictions, digits_occurrence
+
+
+@pytest.mark.parametrize('puzzle', PUZZLES)
+def test_flipped_digit_is_recovered(puzzle):
+    rng = np.random.default_rng(0)
+    digits_grid = parse_puzzle(puzzle)
+    predictions, digits_occurrence = get_misread_predictions(digits_grid, 1, rng)
+    read_grid = Webcam_preprocess.get_digits_grid(predictions, digits_occurrence, 0)
+    assert np.count_nonzero(read_grid != digits_grid) == 1
+
+    result = Webcam_preprocess.recover_digits_grid(
+        predictions, digits_occurrence, 0, Backtrack.solve_unique_with_bitmasks, time_limit=1.0
+    )
+
+    assert result is not None
+    recovered_grid, solution, changed_cells = result
+    assert np.array_equal(recovered_grid, digits_grid)
+    assert np.array_equal(solution, Backtrack.solve_unique(digits_grid))
+    assert changed_cells == 1
+
+
+@pytest.mark.parametrize('rotation_angle', [90, 180, 270])
+def test_flipped_digit_in_turned_board(rotation_angle):
+    rng = np.random.default_rng(1)
+    digits_grid = parse_puzzle(EASY_PUZZLES[0])
+    # the crops lie on the turned board, get_digits_grid turns the grid back
+    turned_grid = np.rot90(digits_grid, k=rotation_angle // 90)
+    predictions, digits_occurrence = get_misread_predictions(turned_grid, 1, rng)
+
+    result = Webcam_preprocess.recover_digits_grid(
+        predictions, digits_occurrence, rotation_angle, Backtrack.solve_unique_with_bitmasks, time_limit=1.0
+    )
+
+    assert result is not None
+    assert np.array_equal(result[0], digits_grid)
+    assert np.array_equal(result[1], Backtrack.solve_unique(digits_grid))
+
+
+def test_noise_read_as_digit_is_recovered():
+    digits_grid = parse_puzzle(EASY_PUZZLES[1])
+    solution = Backtrack.solve_unique(digits_grid)
+    # a blob in an empty cell is read as a digit that repeats in its row, with little confidence
+    y, x = np.argwhere(digits_grid == 0)[0]
+    noisy_grid = digits_grid.copy()
+    noisy_grid[y, x] = digits_grid[y][digits_grid[y] != 0][0]
+    assert Backtrack.solve_unique(noisy_grid) is None
+
+    predictions, digits_occurrence = get_predictions(noisy_grid)
+    blob = np.flatnonzero(digits_occurrence)
+    blob = np.flatnonzero(blob == y * 9 + x)[0]
+    predictions[blob] = 0.04
+    predictions[blob, noisy_grid[y, x]] = 0.64
+
+    result = Webcam_preprocess.recover_digits_grid(
+        predictions, digits_occurrence, 0, Backtrack.solve_unique_with_bitmasks, time_limit=1.0
+    )
+
+    assert result is not None
+    recovered_grid, recovered_solution, changed_cells = result
+    assert np.array_equal(recovered_grid, digits_grid)
+    assert np.array_equal(recovered_solution, solution)
+    assert changed_cells == 1
+
+
+def test_solvable_board_is_not_changed_again():
+    # the grid as read is the only candidate without changes, so there is nothing left to try
+    predictions, digits_occurrence = get_predictions(parse_puzzle(HARD_PUZZLES[0]))
+    assert Webcam_preprocess.recover_digits_grid(
+        predictions, digits_occurrence, 0, lambda digits_grid: None, max_changes=0
+    ) is None
+
+
+@pytest.mark.parametrize('batch_rotations', [False, True])
+def test_recovery_runs_once_per_frame(monkeypatch, batch_rotations):
+    digits_grid = parse_puzzle(EASY_PUZZLES[0])
+    digits_grid[0, 0] = digits_grid[0, 2]
+    calls = list()
+
+    def recover_digits_grid(predictions, digits_occurrence, rotation_angle, solve, known_solution=None):
+        calls.append(rotation_angle)
+        return None
+
+    monkeypatch.setattr(Webcam_preprocess, 'recover_digits_grid', recover_digits_grid)
+    solver = Webcam_preprocess.WebcamSudokuSolver(
+        StubModel(digits_grid), solution_cache=Solution_cache.SolutionCache(), batch_rotations=batch_rotations
+    )
+    solver.solve(render_frame(digits_grid, (1280, 720)))
+
+    assert len(calls) == 1
@@ -0,0 +1,109 @@
+# SolutionCache maps cached solutions back to equivalent boards and stays consistent when threads share it.
+
+import threading
+
+import numpy as np
+
+import Backtrack
+import Solution_cache
+from Benchmark import EASY_PUZZLES, HARD_PUZZLES, SEVENTEEN_CLUE_PUZZLES, parse_puzzle
+
+
+def transform(digits_grid, transformation, labels):
+    """
+    :return: digits_grid moved by a row of Solution_cache.TRANSFORMATIONS with its digits relabeled
+    """
+    return labels[np.asarray(digits_grid).ravel()[transformation]].reshape((9, 9))
+
+
+def test_equivalent_board_is_a_hit():
+    rng = np.random.default_rng(0)
+    cache = Solution_cache.SolutionCache()
+    digits_grid = parse_puzzle(HARD_PUZZLES[0])
+    cache.solve(digits_grid)
+
+    for transformation in rng.choice(Solution_cache.TRANSFORMATIONS, 5):
+        labels = np.concatenate(([0], rng.permutation(9) + 1)).astype(np.uint8)
+        equivalent = transform(digits_grid, transformation, labels)
+        assert np.array_equal(cache.solve(equivalent), Backtrack.solve_unique(equivalent))
+
+    assert cache.get_stats() == {'hits': 5, 'misses': 1, 'evictions': 0, 'size': 1}
+
+
+def test_unsolvable_board_is_cached():
+    cache = Solution_cache.SolutionCache()
+    digits_grid = parse_puzzle(EASY_PUZZLES[0])
+    digits_grid[0, 0] = digits_grid[0, 2]
+
+    assert cache.solve(digits_grid) is None
+    assert cache.solve(digits_grid) is None
+    assert cache.get_stats()['hits'] == 1
+
+
+def test_solve_with_status():
+    cache = Solution_cache.SolutionCache()
+    digits_grid = parse_puzzle(EASY_PUZZLES[0])
+
+    solution, cached = cache.solve_with_status(digits_grid)
+    assert not cached and np.array_equal(solution, Backtrack.solve_unique(digits_grid))
+    solution, cached = cache.solve_with_status(digits_grid)
+    assert cached and np.array_equal(solution, Backtrack.solve_unique(digits_grid))
+
+
+def test_digit_out_of_range_is_not_cached():
+    cache = Solution_cache.SolutionCache()
+    digits_grid = parse_puzzle(EASY_PUZZLES[0])
+    digits_grid[0, 0] = 10
+
+    assert Backtrack.solve_sudoku(digits_grid) is None
+    assert cache.solve(digits_grid) is None
+    assert cache.solve(digits_grid.astype(np.int64) - 20) is None
+    assert cache.get_stats() == {'hits': 0, 'misses': 0, 'evictions': 0, 'size': 0}
+
+
+def test_other_box_sizes_go_to_the_solver():
+    cache = Solution_cache.SolutionCache()
+    digits_grid = np.array([[0, 2, 3, 4], [3, 0, 1, 2], [2, 1, 0, 3], [4, 3, 2, 0]], dtype=np.uint8)
+    solution = cache.solve(digits_grid)
+    assert solution is not None
+    assert np.array_equal(solution, Backtrack.solve_unique_with_bitmasks(digits_grid))
+    assert cache.get_stats()['size'] == 0
+
+
+def test_shared_between_threads():
+    rng = np.random.default_rng(1)
+    boards = list()
+    for puzzle in EASY_PUZZLES + HARD_PUZZLES + SEVENTEEN_CLUE_PUZZLES:
+        digits_grid = parse_puzzle(puzzle)
+        solution = Backtrack.solve_unique(digits_grid)
+        for transformation in rng.choice(Solution_cache.TRANSFORMATIONS, 3):
+            labels = np.concatenate(([0], rng.permutation(9) + 1)).astype(np.uint8)
+            boards.append((transform(digits_grid, transformation, labels), transform(solution, transformation, labels)))
+
+    # fewer entries than boards, so threads evict each other's entries
+    cache = Solution_cache.SolutionCache(max_size=4)
+    failures = list()
+    hits = list()
+
+    def solve_boards(seed):
+        order = np.random.default_rng(seed).permutation(len(boards))
+        for index in np.tile(order, 4):
+            digits_grid, solution = boards[index]
+            result, cached = cache.solve_with_status(digits_grid)
+            if not np.array_equal(result, solution):
+                failures.append(index)
+            hits.append(cached)
+
+    threads = [threading.Thread(target=solve_boards, args=(seed,)) for seed in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = cache.get_stats()
+    assert not failures
+    assert stats['hits'] + stats['misses'] == 6 * 4 * len(boards)
+    assert sum(hits) == stats['hits']
+    assert stats['size'] <= 4
+    # two threads missing the same board at once both solve it, the second one only refreshes the entry
+    assert stats['size'] + stats['evictions'] <= stats['misses']
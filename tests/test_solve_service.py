@@ -0,0 +1,122 @@
+# The HTTP front end of Solve_service: oversized requests get an answer instead of a dropped connection,
+# failed requests are counted in /metrics and stop closes idle connections cleanly.
+
+import asyncio
+import logging
+
+import pytest
+
+import Solve_service
+from Benchmark import SAMPLE_IMAGE_PUZZLE, StubModel, parse_puzzle
+
+
+async def start_service():
+    service = Solve_service.SolveService(StubModel(parse_puzzle(SAMPLE_IMAGE_PUZZLE)), workers=0)
+    await service.start(Solve_service.HOST, 0)
+    return service
+
+
+async def send_raw(port, data):
+    """
+    :return: (status, raw response) of a request sent as bytes
+    """
+    reader, writer = await asyncio.open_connection(Solve_service.HOST, port)
+    writer.write(data)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    await writer.wait_closed()
+    return int(response.split()[1]), response
+
+
+async def get_metrics(port):
+    reader, writer = await asyncio.open_connection(Solve_service.HOST, port)
+    _, metrics = await Solve_service.send_request(reader, writer, 'GET', '/metrics')
+    writer.close()
+    await writer.wait_closed()
+    return metrics
+
+
+def test_solve_grid():
+    async def run():
+        service = await start_service()
+        try:
+            reader, writer = await asyncio.open_connection(Solve_service.HOST, service.port)
+            status, response = await Solve_service.send_request(
+                reader, writer, 'POST', '/solve/grid', SAMPLE_IMAGE_PUZZLE.encode()
+            )
+            writer.close()
+            await writer.wait_closed()
+        finally:
+            await service.stop()
+        return status, response
+
+    status, response = asyncio.run(run())
+    assert status == 200 and response['outcome'] == 'solved'
+
+
+@pytest.mark.parametrize('data, status', [
+    (b'GET /' + b'x' * (Solve_service.MAX_LINE_SIZE + 10) + b' HTTP/1.1\r\n\r\n', 400),
+    (b'GET /metrics HTTP/1.1\r\nX-Big: ' + b'x' * (Solve_service.MAX_LINE_SIZE + 10) + b'\r\n\r\n', 431),
+    (b'GET /metrics HTTP/1.1\r\n' + b'X-Header: 1\r\n' * (Solve_service.MAX_HEADERS + 1) + b'\r\n', 431),
+])
+def test_oversized_request(data, status):
+    async def run():
+        service = await start_service()
+        try:
+            result = await send_raw(service.port, data)
+            metrics = await get_metrics(service.port)
+        finally:
+            await service.stop()
+        return result, metrics
+
+    (response_status, response), metrics = asyncio.run(run())
+    assert response_status == status
+    assert b'Connection: close' in response
+    assert metrics['statuses'][str(status)] == 1
+
+
+def test_internal_error_is_counted(monkeypatch):
+    async def failing_solve_grid(self, body):
+        raise RuntimeError('solver failed')
+
+    monkeypatch.setattr(Solve_service.SolveService, 'solve_grid', failing_solve_grid)
+
+    async def run():
+        service = await start_service()
+        try:
+            reader, writer = await asyncio.open_connection(Solve_service.HOST, service.port)
+            status, response = await Solve_service.send_request(
+                reader, writer, 'POST', '/solve/grid', SAMPLE_IMAGE_PUZZLE.encode()
+            )
+            writer.close()
+            await writer.wait_closed()
+            metrics = await get_metrics(service.port)
+        finally:
+            await service.stop()
+        return status, response, metrics
+
+    status, response, metrics = asyncio.run(run())
+    assert status == 500
+    assert response['outcome'] == 'error' and 'solver failed' in response['error']
+    assert metrics['requests'] == {'/solve/grid': 1}
+    assert metrics['outcomes'] == {'error': 1}
+    assert metrics['statuses']['500'] == 1
+
+
+def test_stop_with_idle_connection(caplog):
+    async def run():
+        service = await start_service()
+        reader, writer = await asyncio.open_connection(Solve_service.HOST, service.port)
+        await Solve_service.send_request(reader, writer, 'GET', '/metrics')
+        connections = set(service.connections)
+        # the connection waits for the next request while the service stops
+        await asyncio.wait_for(service.stop(), 5)
+        writer.close()
+        return connections
+
+    with caplog.at_level(logging.ERROR, logger='asyncio'):
+        connections = asyncio.run(run())
+    assert len(connections) == 1
+    assert all(connection.cancelled() for connection in connections)
+    assert not caplog.records
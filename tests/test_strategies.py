@@ -0,0 +1,112 @@
+# Techniques of Strategies on hand-made candidate positions: exactly the expected candidates are removed.
+
+import numpy as np
+import pytest
+
+import Backtrack
+import Strategies
+
+
+def get_state(removed):
+    """
+    :param removed: list of (y, x, digit), candidates taken away from an empty 9x9 grid
+    :return: Backtrack.SolverState with all other candidates left
+    """
+    state = Backtrack.SolverState.from_grid(np.zeros((9, 9), dtype=np.uint8))
+    for y, x, digit in removed:
+        state.candidates[y * 9 + x] &= ~(1 << (digit - 1))
+    return state
+
+
+def get_removed(before, state):
+    """
+    :return: set of (y, x, digit) that are candidates in before but not in state
+    """
+    removed = set()
+    for index, (old, new) in enumerate(zip(before, state.candidates)):
+        for digit in range(1, 10):
+            if old & ~new & (1 << (digit - 1)):
+                removed.add((index // 9, index % 9, digit))
+    return removed
+
+
+def test_pointing_pair():
+    # in the top left box 5 fits only into (0, 0) and (0, 1)
+    state = get_state([(y, x, 5) for y in range(3) for x in range(3) if (y, x) not in ((0, 0), (0, 1))])
+    before = list(state.candidates)
+    stats = Strategies.StrategyStats()
+
+    assert Strategies.run_strategies(state, [Strategies.LockedCandidates()], stats)
+    assert get_removed(before, state) == {(0, x, 5) for x in range(3, 9)}
+    assert stats.get_eliminations('locked_candidates') == 6
+    assert stats.get_placements('locked_candidates') == 0
+
+
+def test_claiming():
+    # in the first row 7 fits only into the top left box
+    state = get_state([(0, x, 7) for x in range(3, 9)])
+    before = list(state.candidates)
+
+    assert Strategies.LockedCandidates().apply(state)
+    assert get_removed(before, state) == {(y, x, 7) for y in (1, 2) for x in range(3)}
+
+
+def test_x_wing():
+    # in rows 1 and 5 the 3 fits only into columns 2 and 7
+    state = get_state([(y, x, 3) for y in (1, 5) for x in range(9) if x not in (2, 7)])
+    before = list(state.candidates)
+    stats = Strategies.StrategyStats()
+
+    assert Strategies.run_strategies(state, [Strategies.XWing()], stats)
+    assert get_removed(before, state) == {(y, x, 3) for y in range(9) if y not in (1, 5) for x in (2, 7)}
+    assert stats.get_eliminations('x_wing') == 14
+
+
+def test_naked_pair():
+    # (4, 0) and (4, 1) both have only 1 and 2 left
+    state = get_state([(4, x, digit) for x in (0, 1) for digit in range(3, 10)])
+    before = list(state.candidates)
+
+    assert Strategies.NakedSubset(2).apply(state)
+    removed = get_removed(before, state)
+    # the first unit with the pair (the row) is cleaned, the next call would clean the box
+    assert removed == {(4, x, digit) for x in range(2, 9) for digit in (1, 2)}
+
+
+def test_hidden_pair():
+    # in row 0 the digits 8 and 9 fit only into (0, 3) and (0, 4)
+    state = get_state([(0, x, digit) for x in range(9) if x not in (3, 4) for digit in (8, 9)])
+    before = list(state.candidates)
+
+    assert Strategies.HiddenSubset(2).apply(state)
+    assert get_removed(before, state) == {(0, x, digit) for x in (3, 4) for digit in range(1, 8)}
+
+
+def test_nothing_to_do():
+    state = get_state([])
+    before = list(state.candidates)
+    for strategy in Strategies.STRATEGIES:
+        assert not strategy.apply(state)
+    assert state.candidates == before
+
+
+def test_eliminations_do_not_count_naked_singles():
+    # the same pointing pair, (0, 8) has only 4 and 5 left, so it becomes a naked single
+    state = get_state(
+        [(y, x, 5) for y in range(3) for x in range(3) if (y, x) not in ((0, 0), (0, 1))]
+        + [(0, 8, digit) for digit in range(1, 10) if digit not in (4, 5)]
+    )
+    candidates_before = state.count_candidates()
+    stats = Strategies.StrategyStats()
+
+    assert Strategies.run_strategies(state, [Strategies.LockedCandidates()], stats)
+    # 4 is placed in (0, 8) and removed from its 20 peers, those removals are not the technique's
+    assert state.cells[8] == 4
+    assert stats.get_eliminations('locked_candidates') == 6
+    assert stats.get_placements('locked_candidates') == 1
+    assert candidates_before - state.count_candidates() > 6
+
+
+def test_strategy_is_abstract():
+    with pytest.raises(TypeError):
+        Strategies.Strategy()
@@ -0,0 +1,100 @@
+# Faster replacements of vision stages of Webcam_preprocess must give exactly the same results as the original
+# stages on images/2.jpg, renders of all benchmark puzzles at two sizes and noisy copies of some of them.
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+import Frame_workspace
+import Webcam_preprocess
+from Benchmark import PUZZLE_SETS, SAMPLE_IMAGE_PATH, parse_puzzle, render_frame
+
+
+def get_frames():
+    """
+    :return: list of (name, frame)
+    """
+    rng = np.random.default_rng(0)
+    frames = [('2.jpg', cv.imread(SAMPLE_IMAGE_PATH))]
+    for set_name, puzzles in PUZZLE_SETS.items():
+        for position, puzzle in enumerate(puzzles):
+            for frame_size in ((1280, 720), (1000, 800)):
+                name = '{}-{}-{}x{}'.format(set_name, position, *frame_size)
+                frames.append((name, render_frame(parse_puzzle(puzzle), frame_size)))
+    for name, frame in frames[:8]:
+        noise = rng.normal(0, 25, frame.shape)
+        frames.append((name + '-noisy', np.clip(frame + noise, 0, 255).astype(np.uint8)))
+    return frames
+
+
+FRAMES = get_frames()
+WORKSPACE = Frame_workspace.FrameWorkspace()
+
+
+@pytest.fixture(params=[frame for _, frame in FRAMES], ids=[name for name, _ in FRAMES])
+def board(request):
+    board, _ = Webcam_preprocess.get_biggest_quadrangle(request.param, draw_vertices_on_frame=False)
+    assert board is not None
+    return board
+
+
+def test_prepare_inputs_vectorized(board):
+    digits_occurrence = Webcam_preprocess.check_digits_occurrence(Webcam_preprocess.get_boxes(board))
+    inputs = Webcam_preprocess.prepare_inputs(Webcam_preprocess.get_boxes(board), digits_occurrence)
+    vectorized_inputs = Webcam_preprocess.prepare_inputs_vectorized(board, digits_occurrence)
+
+    assert inputs is not None and vectorized_inputs is not None
+    assert vectorized_inputs.shape == inputs.shape
+    assert vectorized_inputs.dtype == inputs.dtype
+    assert np.array_equal(vectorized_inputs, inputs)
+
+
+def test_prepare_inputs_vectorized_with_workspace(board):
+    # the buffers of the workspace are left over from the previous frames
+    digits_occurrence = Webcam_preprocess.check_digits_occurrence(Webcam_preprocess.get_boxes(board))
+    inputs = Webcam_preprocess.prepare_inputs(Webcam_preprocess.get_boxes(board), digits_occurrence)
+    assert np.array_equal(Webcam_preprocess.prepare_inputs_vectorized(board, digits_occurrence, WORKSPACE), inputs)
+
+
+def test_prepare_inputs_vectorized_without_digits(board):
+    digits_occurrence = np.zeros((9, 9), dtype=bool)
+    assert Webcam_preprocess.prepare_inputs_vectorized(board, digits_occurrence) is None
+
+
+def test_check_digits_occurrence_by_ink(board):
+    digits_occurrence = Webcam_preprocess.check_digits_occurrence(Webcam_preprocess.get_boxes(board))
+    ink_occurrence = Webcam_preprocess.check_digits_occurrence_by_ink(board)
+
+    assert ink_occurrence.shape == (9, 9) and ink_occurrence.dtype == bool
+    assert np.array_equal(ink_occurrence, digits_occurrence)
+
+
+def get_stroke_board(side, rng):
+    """
+    :return: threshold image of a board with a stroke in about half of the cells, 40 .. 95% of the cell tall,
+        so some of them are tall enough for a digit and some aren't
+    """
+    board = np.zeros((side, side), dtype=np.uint8)
+    cell = side / 9
+    for y in range(9):
+        for x in range(9):
+            if rng.random() < 0.5:
+                continue
+            length = rng.uniform(0.4, 0.95) * cell
+            top = int(y * cell + rng.uniform(0, cell - length))
+            left = int(x * cell + rng.uniform(0.2, 0.8) * cell)
+            bottom = (left + int(rng.integers(-3, 4)), int(top + length))
+            cv.line(board, (left, top), bottom, 255, int(rng.integers(1, 4)))
+    return board
+
+
+@pytest.mark.parametrize('side', [450, 451, 640])
+def test_check_digits_occurrence_by_ink_on_strokes(side):
+    # boards whose side isn't always a multiple of 9, with cells close to the ink threshold
+    rng = np.random.default_rng(side)
+    for _ in range(5):
+        board = get_stroke_board(side, rng)
+        assert np.array_equal(
+            Webcam_preprocess.check_digits_occurrence_by_ink(board),
+            Webcam_preprocess.check_digits_occurrence(Webcam_preprocess.get_boxes(board))
+        )